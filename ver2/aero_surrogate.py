@@ -0,0 +1,160 @@
+"""Per-airfoil response surfaces over (span, AR, taper, twist) fitted to VSP results"""
+import numpy as np
+import os.path
+from dataclasses import dataclass, field
+from itertools import combinations_with_replacement
+from setup_dataclass import AerodynamicSetup, PresetValues
+from internal_dataclass import Aircraft, AircraftAnalysisResults
+
+# Prediction std that counts as one unit of uncertainty
+CL_TOLERANCE = 0.01
+CD_TOLERANCE = 0.0005
+
+# Scalar outputs fitted next to the CL / CD curves
+SCALAR_TARGETS = ['m_empty', 'm_boom', 'm_wing', 'Lw', 'Lh', 'span', 'AR', 'taper', 'twist', 'Sref',
+                  'CL_flap_max', 'CL_flap_zero', 'CD_flap_max_wing', 'CD_flap_zero_wing']
+
+
+def airfoilName(aircraft: Aircraft) -> str:
+    return os.path.splitext(os.path.basename(aircraft.mainwing_airfoil_datapath))[0]
+
+def designVector(aircraft: Aircraft) -> np.ndarray:
+    return np.array([aircraft.mainwing_span, aircraft.mainwing_AR,
+                     aircraft.mainwing_taper, aircraft.mainwing_twist], float)
+
+def _basis(z: np.ndarray, degree: int) -> np.ndarray:
+    """[1, z_i, z_i*z_j] columns of the normalized design variables"""
+    columns = [np.ones(len(z))] + [z[:, i] for i in range(z.shape[1])]
+    if degree == 2:
+        columns += [z[:, i] * z[:, j] for i, j in combinations_with_replacement(range(z.shape[1]), 2)]
+    return np.column_stack(columns)
+
+
+@dataclass
+class AirfoilSurface:
+    """Ordinary least squares fit of every target on a linear or quadratic basis"""
+    mean: np.ndarray            # design variable normalization (varying variables only)
+    scale: np.ndarray
+    active: np.ndarray          # design variables that vary in the training set
+    fixed: np.ndarray           # training value of the others
+    lower: np.ndarray           # sampled box of the varying variables, no extrapolation outside
+    upper: np.ndarray
+    degree: int
+    coeffs: np.ndarray          # basis x targets
+    XtX_inv: np.ndarray
+    sigma: np.ndarray           # residual std per target
+
+    def predict(self, x: np.ndarray):
+        """(mean, std) of every target at the design point x"""
+        if not np.allclose(x[~self.active], self.fixed):
+            return None, None
+        if np.any(x[self.active] < self.lower) or np.any(x[self.active] > self.upper):
+            return None, None
+        z = ((x[self.active] - self.mean) / self.scale)[np.newaxis, :]
+        b = _basis(z, self.degree)[0]
+        mean = b @ self.coeffs
+        std = self.sigma * np.sqrt(1 + b @ self.XtX_inv @ b)
+        return mean, std
+
+
+def fitAirfoilSurface(X: np.ndarray, Y: np.ndarray):
+    active = X.std(axis=0) > 0
+    fixed = X[0, ~active]
+    mean, scale = X[:, active].mean(axis=0), X[:, active].std(axis=0)
+    z = (X[:, active] - mean) / scale
+
+    # Quadratic when there are enough samples to estimate the residual, otherwise linear
+    for degree in (2, 1):
+        B = _basis(z, degree)
+        if len(X) > 2 * B.shape[1] and np.linalg.matrix_rank(B) == B.shape[1]:
+            break
+    else:
+        return None
+
+    coeffs, *_ = np.linalg.lstsq(B, Y, rcond=None)
+    residual = Y - B @ coeffs
+    sigma = np.sqrt((residual ** 2).sum(axis=0) / (len(X) - B.shape[1]))
+    return AirfoilSurface(mean=mean, scale=scale, active=active, fixed=fixed,
+                          lower=X[:, active].min(axis=0), upper=X[:, active].max(axis=0), degree=degree,
+                          coeffs=coeffs, XtX_inv=np.linalg.pinv(B.T @ B), sigma=sigma)
+
+
+@dataclass
+class AeroSurrogate:
+    alpha_list: np.ndarray
+    surfaces: dict = field(default_factory=dict)      # airfoil -> AirfoilSurface
+
+    def predict(self, aircraft: Aircraft, CD_fuse: np.ndarray, aerodynamicSetup: AerodynamicSetup,
+                presetValues: PresetValues, fuselage_cross_section_area: float):
+        """Predicted AircraftAnalysisResults and its uncertainty in units of CL_TOLERANCE / CD_TOLERANCE.
+        Returns (None, inf) where the airfoil has no surface or x is outside the sampled design box."""
+        surface = self.surfaces.get(airfoilName(aircraft))
+        if surface is None:
+            return None, np.inf
+        mean, std = surface.predict(designVector(aircraft))
+        if mean is None:
+            return None, np.inf
+
+        n = len(self.alpha_list)
+        CL, CD_wing = mean[:n], mean[n:2*n]
+        scalars = dict(zip(SCALAR_TARGETS, mean[2*n:]))
+        scalar_std = dict(zip(SCALAR_TARGETS, std[2*n:]))
+        uncertainty = max(std[:n].max() / CL_TOLERANCE, std[n:2*n].max() / CD_TOLERANCE,
+                          scalar_std['CL_flap_max'] / CL_TOLERANCE, scalar_std['CD_flap_max_wing'] / CD_TOLERANCE)
+
+        # Same fuselage drag scaling as VSPAnalyzer.calculateCoefficients
+        CD_fuse = CD_fuse * (fuselage_cross_section_area / scalars['Sref'])
+        CD_fuse_zero = np.interp(0, self.alpha_list, CD_fuse)
+
+        results = AircraftAnalysisResults(
+                aircraft=aircraft,
+                alpha_list=self.alpha_list.copy(),
+                m_empty=scalars['m_empty'],
+                m_boom=scalars['m_boom'],
+                m_wing=scalars['m_wing'],
+                span=scalars['span'],
+                AR=scalars['AR'],
+                taper=scalars['taper'],
+                twist=scalars['twist'],
+                Sref=scalars['Sref'],
+                Lw=scalars['Lw'],
+                Lh=scalars['Lh'],
+                CL=CL,
+                CD_wing=CD_wing,
+                CD_fuse=CD_fuse,
+                CD_total=CD_wing + CD_fuse,
+                AOA_stall=aerodynamicSetup.AOA_stall,
+                AOA_takeoff_max=aerodynamicSetup.AOA_takeoff_max,
+                AOA_climb_max=aerodynamicSetup.AOA_climb_max,
+                AOA_turn_max=aerodynamicSetup.AOA_turn_max,
+                CL_flap_max=scalars['CL_flap_max'],
+                CL_flap_zero=scalars['CL_flap_zero'],
+                CD_flap_max=scalars['CD_flap_max_wing'] + CD_fuse[-1],
+                CD_flap_zero=scalars['CD_flap_zero_wing'] + CD_fuse_zero,
+                max_load=presetValues.max_load,
+                fidelity="surrogate"
+        )
+        return results, uncertainty
+
+
+def fitAeroSurrogate(resultsList: list, fidelity: str, alpha_list: np.ndarray) -> AeroSurrogate:
+    """Fits one surface per airfoil to VSP results of the given fidelity evaluated on alpha_list"""
+    surrogate = AeroSurrogate(alpha_list=np.asarray(alpha_list, float))
+
+    samples = {}
+    for r in resultsList:
+        if r.fidelity != fidelity or len(r.alpha_list) != len(alpha_list) or not np.allclose(r.alpha_list, alpha_list):
+            continue
+        CD_fuse = np.asarray(r.CD_fuse, float)
+        scalars = [r.m_empty, r.m_boom, r.m_wing, r.Lw, r.Lh, r.span, r.AR, r.taper, r.twist, r.Sref,
+                   r.CL_flap_max, r.CL_flap_zero,
+                   r.CD_flap_max - CD_fuse[-1], r.CD_flap_zero - np.interp(0, r.alpha_list, CD_fuse)]
+        X, Y = samples.setdefault(airfoilName(r.aircraft), ([], []))
+        X.append(designVector(r.aircraft))
+        Y.append(np.concatenate((r.CL, r.CD_wing, scalars)))
+
+    for airfoil, (X, Y) in samples.items():
+        surface = fitAirfoilSurface(np.array(X), np.array(Y))
+        if surface is not None:
+            surrogate.surfaces[airfoil] = surface
+    return surrogate
@@ -0,0 +1,461 @@
+"""Benchmarks of the propulsion / mission hot paths, written to a JSON baseline and compared against it
+
+    python benchmark.py run --out data/benchmark.json
+    python benchmark.py compare data/benchmark.json data/benchmark_new.json --threshold 0.1
+    python benchmark.py sweeps          # VSPAERO runs, points and wall time of the nominal and adaptive sweeps
+    python benchmark.py kernels         # scalar RK4 kernels against RK4_step, non-zero exit on a mismatch
+
+Runs offline: when OpenVSP is not installed, the stand-in module in stubs/ is imported instead.
+Times are seconds per call (median over --repeat runs after one warm-up run).
+"""
+import os
+import os.path
+import sys
+import json
+import time
+import platform
+import tempfile
+import contextlib
+import io
+import subprocess
+import pickle
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STUB_DIR = os.path.join(HERE, "stubs")
+try:
+    import openvsp
+except ImportError:
+    sys.path.append(STUB_DIR)
+    import openvsp
+
+import numpy as np
+import pandas as pd
+from dataclasses import replace
+from setup_dataclass import *
+from internal_dataclass import *
+from results_store import loadAnalysisResults
+from mission_analysis import MissionAnalyzer, RK4_step, RK4_level, RK4_climb, calculate_acceleration_level, calculate_acceleration_climb
+from mission_grid import runMissionGridSearch
+from propulsion import determine_max_thrust, thrust_reverse_solve, thrust_analysis, SoC2Vol
+
+DEFAULT_OUT = "data/benchmark.json"
+DEFAULT_THRESHOLD = 0.10
+# Modules a mission / score worker should start without (scipy.optimize comes with scipy.interpolate anyway)
+HEAVY_MODULES = ('openvsp', 'matplotlib', 'vsp_analysis', 'vsp_grid')
+
+BENCHMARKS = {}
+
+
+def benchmark(name: str, calls: int = 1):
+    """Registers fn(context) -> None; calls is the number of calls one fn run stands for"""
+    def register(fn):
+        BENCHMARKS[name] = (fn, calls)
+        return fn
+    return register
+
+
+def makeContext(csvPath: str = "data/aircraft.csv") -> dict:
+    """Sample aircraft and the smallest mission combination of main.get_config"""
+    from main import get_config
+    (presetValues, propulsionSpecs, _, aerodynamicSetup, _, missionParamConstraints) = get_config()
+    hashVal = pd.read_csv(csvPath, sep='|', encoding='utf-8', usecols=['hash'])['hash'].iloc[0]
+    analysisResults = loadAnalysisResults(hashVal, csvPath)
+
+    c = missionParamConstraints
+    mission2Params = MissionParameters(
+        m_takeoff=c.MTOW_min, max_speed=c.M2_max_speed_min, max_load_factor=presetValues.max_load / c.MTOW_min,
+        climb_thrust_ratio=c.M2_climb_thrust_ratio_min, level_thrust_ratio=c.M2_level_thrust_ratio_min,
+        turn_thrust_ratio=c.M2_turn_thrust_ratio_min, propeller_data_path=propulsionSpecs.M2_propeller_data_path)
+    mission3Params = MissionParameters(
+        m_takeoff=analysisResults.m_empty / 1000, max_speed=c.M3_max_speed_min,
+        max_load_factor=presetValues.max_load * 1000 / analysisResults.m_empty,
+        climb_thrust_ratio=c.M3_climb_thrust_ratio_min, level_thrust_ratio=c.M3_level_thrust_ratio_min,
+        turn_thrust_ratio=c.M3_turn_thrust_ratio_min, propeller_data_path=propulsionSpecs.M3_propeller_data_path)
+
+    analyzer = MissionAnalyzer(analysisResults, mission2Params, presetValues, propulsionSpecs)
+    return {
+        'csvPath': csvPath, 'hash': hashVal, 'analysisResults': analysisResults,
+        'presetValues': presetValues, 'propulsionSpecs': propulsionSpecs, 'aerodynamicSetup': aerodynamicSetup,
+        'missionParamConstraints': missionParamConstraints,
+        'mission2Params': mission2Params, 'mission3Params': mission3Params,
+        'propeller_array': analyzer.propeller_array, 'battery_array': analyzer.battery_array,
+        'voltage': 4.2 * propulsionSpecs.n_cell,
+        'speeds': np.linspace(0, analyzer.propeller_array[:, 1].max(), 50, endpoint=False),
+    }
+
+
+## Propulsion
+
+@benchmark("propulsion.determine_max_thrust", calls=50)
+def bench_determine_max_thrust(ctx):
+    for v in ctx['speeds']:
+        determine_max_thrust(v, ctx['voltage'], ctx['propulsionSpecs'], ctx['propeller_array'], 0)
+
+@benchmark("propulsion.thrust_reverse_solve", calls=50)
+def bench_thrust_reverse_solve(ctx):
+    # Cold cache, every call solves
+    thrust_reverse_solve._cache = {}
+    for k, v in enumerate(ctx['speeds']):
+        thrust_reverse_solve(0.5 + 0.02 * k, v, ctx['voltage'], ctx['propulsionSpecs'].Kv, ctx['propulsionSpecs'].R,
+                             ctx['propeller_array'])
+
+@benchmark("propulsion.thrust_analysis", calls=50)
+def bench_thrust_analysis(ctx):
+    for v in ctx['speeds']:
+        thrust_analysis(0.9, v, ctx['voltage'], ctx['propulsionSpecs'], ctx['propeller_array'], 0)
+
+@benchmark("propulsion.SoC2Vol", calls=100)
+def bench_SoC2Vol(ctx):
+    for SoC in np.linspace(100, 1, 100):
+        SoC2Vol(SoC, ctx['battery_array'])
+
+
+## Mission
+
+def _analyzer(ctx, mission: int = 2) -> MissionAnalyzer:
+    params = ctx['mission2Params'] if mission == 2 else ctx['mission3Params']
+    return MissionAnalyzer(ctx['analysisResults'], params, ctx['presetValues'], ctx['propulsionSpecs'])
+
+@benchmark("mission.MissionAnalyzer.__init__")
+def bench_analyzer_init(ctx):
+    _analyzer(ctx)
+
+@benchmark("mission.MissionAnalyzer.rehydrate", calls=10)
+def bench_analyzer_rehydrate(ctx):
+    analyzer = ctx.setdefault('prepared_analyzer', _analyzer(ctx))
+    for _ in range(10):
+        analyzer.rehydrate(ctx['mission2Params'])
+
+@benchmark("mission.MissionAnalyzer.pickle_roundtrip")
+def bench_analyzer_pickle(ctx):
+    pickle.loads(pickle.dumps(ctx.setdefault('prepared_analyzer', _analyzer(ctx))))
+
+PHASES = ('takeoff_simulation', 'climb_simulation', 'level_flight_simulation', 'turn_simulation')
+
+def _phases(ctx) -> dict:
+    """Seconds of each phase of the first mission 2 leg: takeoff, climb, level flight, turn"""
+    analyzer = _analyzer(ctx)
+    analyzer.clearState()
+    seconds = {}
+    for phase, run in (('takeoff_simulation', lambda: analyzer.takeoff_simulation()),
+                       ('climb_simulation', lambda: analyzer.climb_simulation(30, -140, "left")),
+                       ('level_flight_simulation', lambda: analyzer.level_flight_simulation(-152, "left")),
+                       ('turn_simulation', lambda: analyzer.turn_simulation(180, "CW"))):
+        t_start = time.perf_counter()
+        run()
+        seconds[phase] = time.perf_counter() - t_start
+    return seconds
+
+@benchmark("mission.run_mission2")
+def bench_run_mission2(ctx):
+    _analyzer(ctx, 2).run_mission2()
+
+@benchmark("mission.run_mission3")
+def bench_run_mission3(ctx):
+    _analyzer(ctx, 3).run_mission3()
+
+@benchmark("mission.runMissionGridSearch")
+def bench_runMissionGridSearch(ctx):
+    # 2 M2 speeds x 1 M3 speed of the sample aircraft, no memo
+    c = ctx['missionParamConstraints']
+    constraints = replace(c, M2_max_speed_max=c.M2_max_speed_min + c.max_speed_analysis_interval,
+                          M3_max_speed_max=c.M3_max_speed_min)
+    with tempfile.TemporaryDirectory() as tmpDir:
+        runMissionGridSearch(ctx['hash'], ctx['presetValues'], constraints, ctx['propulsionSpecs'],
+                             csvPath=ctx['csvPath'],
+                             mission2Out=os.path.join(tmpDir, "mission2.csv"),
+                             mission3Out=os.path.join(tmpDir, "mission3.csv"))
+
+
+## Integrator kernels
+
+KERNEL_RTOL = 1e-9
+KERNEL_DT = 0.1     # time step of the climb / level flight phases
+
+def kernelSamples(ctx, n: int = 100, seed: int = 0) -> list:
+    """(v, alpha_deg, gamma_rad, T, flap) states over the climb / level flight envelope of the sample aircraft"""
+    rng = np.random.default_rng(seed)
+    v_max = ctx['propeller_array'][:, 1].max()
+    samples = []
+    for _ in range(n):
+        speed, heading, gamma_rad = rng.uniform(1, v_max), rng.uniform(0, 2*np.pi), rng.uniform(0, np.radians(30))
+        v = np.array([speed*np.cos(gamma_rad)*np.cos(heading), speed*np.cos(gamma_rad)*np.sin(heading),
+                      speed*np.sin(gamma_rad)])
+        samples.append((v, float(rng.uniform(-5, 13)), float(gamma_rad), float(rng.uniform(0, 60)),
+                        bool(rng.integers(2))))
+    return samples
+
+def _kernelSamples(ctx) -> list:
+    if 'kernel_samples' not in ctx:
+        ctx['kernel_samples'] = kernelSamples(ctx)
+    return ctx['kernel_samples']
+
+def _kernelArgs(ctx):
+    if 'prepared_analyzer' not in ctx:
+        ctx['prepared_analyzer'] = _analyzer(ctx)
+    analyzer = ctx['prepared_analyzer']
+    return analyzer, ctx['mission2Params'].m_takeoff, analyzer.weight, ctx['analysisResults'].Sref
+
+def _levelReference(ctx, v, dt, alpha_deg, T):
+    analyzer, m, _, Sref = _kernelArgs(ctx)
+    return RK4_step(v, dt, lambda v: calculate_acceleration_level(v, m, Sref, analyzer.CD_func, alpha_deg, T))
+
+def _level(ctx, v, dt, alpha_deg, T):
+    analyzer, m, _, Sref = _kernelArgs(ctx)
+    vx, vy, vz = v.tolist()
+    return np.array([RK4_level(vx, vy, vz, dt, m, Sref, float(analyzer.CD_func(alpha_deg)), alpha_deg, T), 0, 0])
+
+def _climbReference(ctx, v, dt, alpha_deg, gamma_rad, T, flap):
+    analyzer, m, Weight, Sref = _kernelArgs(ctx)
+    r = ctx['analysisResults']
+    return RK4_step(v, dt, lambda v: calculate_acceleration_climb(v, m, Weight, Sref, analyzer.CL_func, analyzer.CD_func,
+                                                                  r.CL_flap_max, r.CD_flap_max,
+                                                                  alpha_deg, gamma_rad, T, not flap))
+
+def _climb(ctx, v, dt, alpha_deg, gamma_rad, T, flap):
+    analyzer, m, Weight, Sref = _kernelArgs(ctx)
+    r = ctx['analysisResults']
+    if flap:
+        CL, CD = r.CL_flap_max, r.CD_flap_max
+    else:
+        CL, CD = float(analyzer.CL_func(alpha_deg)), float(analyzer.CD_func(alpha_deg))
+    vx, vy, vz = v.tolist()
+    a_x, a_z = RK4_climb(vx, vy, vz, dt, m, Weight, Sref, CL, CD, alpha_deg, gamma_rad, T)
+    return np.array([a_x, 0, a_z])
+
+def checkKernels(ctx, n: int = 2000, rtol: float = KERNEL_RTOL) -> dict:
+    """Largest difference of RK4_level / RK4_climb from RK4_step over calculate_acceleration_level / _climb,
+    relative to max(1, |a|); mismatches lists the states beyond rtol"""
+    dt = KERNEL_DT
+    errors = {'level': 0.0, 'climb': 0.0}
+    mismatches = []
+    for v, alpha_deg, gamma_rad, T, flap in kernelSamples(ctx, n):
+        for kernel, reference, new in (
+                ('level', _levelReference(ctx, v, dt, alpha_deg, T), _level(ctx, v, dt, alpha_deg, T)),
+                ('climb', _climbReference(ctx, v, dt, alpha_deg, gamma_rad, T, flap),
+                 _climb(ctx, v, dt, alpha_deg, gamma_rad, T, flap))):
+            error = float(np.max(np.abs(new - reference)) / max(1.0, float(np.max(np.abs(reference)))))
+            errors[kernel] = max(errors[kernel], error)
+            if error > rtol:
+                mismatches.append((kernel, v.tolist(), alpha_deg, gamma_rad, T, flap, error))
+    return {'errors': errors, 'mismatches': mismatches, 'samples': n}
+
+@benchmark("mission.kernel.RK4_level", calls=100)
+def bench_RK4_level(ctx):
+    for v, alpha_deg, _, T, _ in _kernelSamples(ctx):
+        _level(ctx, v, KERNEL_DT, alpha_deg, T)
+
+@benchmark("mission.kernel.RK4_step_level", calls=100)
+def bench_RK4_step_level(ctx):
+    for v, alpha_deg, _, T, _ in _kernelSamples(ctx):
+        _levelReference(ctx, v, KERNEL_DT, alpha_deg, T)
+
+@benchmark("mission.kernel.RK4_climb", calls=100)
+def bench_RK4_climb(ctx):
+    for v, alpha_deg, gamma_rad, T, flap in _kernelSamples(ctx):
+        _climb(ctx, v, KERNEL_DT, alpha_deg, gamma_rad, T, flap)
+
+@benchmark("mission.kernel.RK4_step_climb", calls=100)
+def bench_RK4_step_climb(ctx):
+    for v, alpha_deg, gamma_rad, T, flap in _kernelSamples(ctx):
+        _climbReference(ctx, v, KERNEL_DT, alpha_deg, gamma_rad, T, flap)
+
+
+## VSP sweeps
+
+SWEEP_TIERS = ('production', 'adaptive')
+
+def sweepStats(ctx, fidelity: str) -> dict:
+    """calculateCoefficients of the sample aircraft at a fidelity tier: VSPAERO runs, alpha points,
+    ExecAnalysis seconds and total seconds (the stand-in openvsp only counts, it has no solver cost)"""
+    from vsp_analysis import VSPAnalyzer
+    from vsp_grid import analyzeVSPConfiguration, get_fuselageCD_list
+    a = ctx['aerodynamicSetup']
+    if 'vsp_analyzer' not in ctx:
+        ctx['vsp_analyzer'] = VSPAnalyzer(ctx['presetValues'])
+    vspAnalyzer = ctx['vsp_analyzer']
+    CD_fuse = get_fuselageCD_list(a.alpha_start, a.alpha_end, a.alpha_step, a.fuselage_Cd_datapath,
+                                  fidelityTier=a.fidelity_tiers[fidelity])
+    vspAnalyzer.clean()
+    vspAnalyzer.sweep_stats = {'runs': 0, 'points': 0, 'seconds': 0.0}
+    t_start = time.perf_counter()
+    analyzeVSPConfiguration(vspAnalyzer, ctx['analysisResults'].aircraft, a, CD_fuse, "benchmark.vsp3", fidelity)
+    return {**vspAnalyzer.sweep_stats, 'total_seconds': time.perf_counter() - t_start}
+
+@benchmark("vsp.calculateCoefficients.production")
+def bench_sweep_production(ctx):
+    sweepStats(ctx, 'production')
+
+@benchmark("vsp.calculateCoefficients.adaptive")
+def bench_sweep_adaptive(ctx):
+    sweepStats(ctx, 'adaptive')
+
+
+## Worker start-up
+
+def startupImport(module: str) -> tuple:
+    """(wall seconds of a fresh interpreter importing module, heavy modules it loaded)"""
+    code = (f"import sys; import {module}; "
+            f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    path = [HERE] + ([STUB_DIR] if os.path.dirname(os.path.abspath(openvsp.__file__)) == STUB_DIR else [])
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(path + [os.environ.get('PYTHONPATH', '')]))
+    t_start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", code], cwd=HERE, env=env, capture_output=True, text=True, check=True)
+    seconds = time.perf_counter() - t_start
+    return seconds, [m for m in out.stdout.strip().split(',') if m]
+
+@benchmark("startup.import_mission_grid")
+def bench_import_mission_grid(ctx):
+    startupImport("mission_grid")
+
+@benchmark("startup.import_main")
+def bench_import_main(ctx):
+    startupImport("main")
+
+
+def _summary(samples: list, calls: int) -> dict:
+    samples = np.array(samples) / calls
+    return {'median': float(np.median(samples)), 'min': float(samples.min()),
+            'mean': float(samples.mean()), 'repeat': len(samples), 'calls': calls}
+
+def runBenchmarks(repeat: int = 5, pattern: str = "", csvPath: str = "data/aircraft.csv") -> dict:
+    ctx = makeContext(csvPath)
+    results = {}
+    for name, (fn, calls) in BENCHMARKS.items():
+        if pattern not in name:
+            continue
+        samples = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn(ctx)         # warm-up: lookup tables and propeller caches
+            for _ in range(repeat):
+                t_start = time.perf_counter()
+                fn(ctx)
+                samples.append(time.perf_counter() - t_start)
+        results[name] = _summary(samples, calls)
+        print(f"{name:45s} {results[name]['median']*1000:10.3f} ms")
+
+    # Phases are timed inside one sequence, so each one starts from the state the previous one left
+    if any(pattern in f"mission.phase.{phase}" for phase in PHASES):
+        phase_samples = {}
+        with contextlib.redirect_stdout(io.StringIO()):
+            _phases(ctx)
+            for _ in range(repeat):
+                for phase, seconds in _phases(ctx).items():
+                    phase_samples.setdefault(phase, []).append(seconds)
+        for phase, samples in phase_samples.items():
+            name = f"mission.phase.{phase}"
+            results[name] = _summary(samples, 1)
+            print(f"{name:45s} {results[name]['median']*1000:10.3f} ms")
+
+    return {
+        'meta': {
+            'time': time.strftime("%Y-%m-%d %X"),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'openvsp_stub': os.path.dirname(os.path.abspath(openvsp.__file__)) == STUB_DIR,
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+def compareBenchmarks(baseline: dict, current: dict, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """Names whose median is more than threshold slower than the baseline"""
+    regressions = []
+    for name in sorted(set(baseline['results']) | set(current['results'])):
+        base = baseline['results'].get(name)
+        new = current['results'].get(name)
+        if base is None or new is None:
+            print(f"{name:45s} {'(only in ' + ('current' if base is None else 'baseline') + ')':>32s}")
+            continue
+        ratio = new['median'] / base['median'] if base['median'] > 0 else np.inf
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = "faster"
+        print(f"{name:45s} {base['median']*1000:10.3f} -> {new['median']*1000:10.3f} ms  x{ratio:5.2f}  {flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the propulsion and mission hot paths.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="run the benchmarks and write a JSON baseline")
+    run_parser.add_argument("--out", type=str, default=DEFAULT_OUT)
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--filter", type=str, default="", help="only benchmarks whose name contains this")
+    run_parser.add_argument("--csv", type=str, default="data/aircraft.csv", help="aircraft results store with the sample row")
+    run_parser.add_argument("--compare", type=str, default="", help="baseline JSON to compare the new results against")
+    run_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    compare_parser = subparsers.add_parser("compare", help="flag regressions of CURRENT against BASELINE")
+    compare_parser.add_argument("baseline", type=str)
+    compare_parser.add_argument("current", type=str)
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                help="relative slowdown of the median that counts as a regression")
+    imports_parser = subparsers.add_parser("imports", help="start-up time and heavy modules loaded by mission worker imports")
+    imports_parser.add_argument("modules", nargs='*', default=['mission_grid', 'main'])
+    kernels_parser = subparsers.add_parser("kernels", help="check the scalar RK4 kernels against RK4_step")
+    kernels_parser.add_argument("--samples", type=int, default=2000)
+    kernels_parser.add_argument("--rtol", type=float, default=KERNEL_RTOL)
+    kernels_parser.add_argument("--csv", type=str, default="data/aircraft.csv", help="aircraft results store with the sample row")
+    sweeps_parser = subparsers.add_parser("sweeps", help="VSPAERO runs, points and wall time per fidelity tier")
+    sweeps_parser.add_argument("tiers", nargs='*', default=list(SWEEP_TIERS))
+    sweeps_parser.add_argument("--repeat", type=int, default=3)
+    sweeps_parser.add_argument("--csv", type=str, default="data/aircraft.csv", help="aircraft results store with the sample row")
+    args = parser.parse_args()
+
+    if args.command == "sweeps":
+        with contextlib.redirect_stdout(io.StringIO()):
+            ctx = makeContext(args.csv)
+        print(f"{'tier':15s} {'runs':>5s} {'points':>7s} {'VSPAERO s':>10s} {'total s':>9s}")
+        for tier in args.tiers:
+            runs = [sweepStats(ctx, tier) for _ in range(args.repeat)]
+            median = lambda key: float(np.median([r[key] for r in runs]))
+            print(f"{tier:15s} {runs[0]['runs']:5d} {runs[0]['points']:7d} {median('seconds'):10.3f} {median('total_seconds'):9.3f}")
+        sys.exit(0)
+
+    if args.command == "kernels":
+        with contextlib.redirect_stdout(io.StringIO()):
+            ctx = makeContext(args.csv)
+        check = checkKernels(ctx, args.samples, args.rtol)
+        for kernel, error in check['errors'].items():
+            print(f"RK4_{kernel:6s} max relative error {error:.3e} over {check['samples']} states")
+        for mismatch in check['mismatches'][:10]:
+            print("mismatch:", mismatch)
+        sys.exit(1 if check['mismatches'] else 0)
+
+    if args.command == "imports":
+        heavy = False
+        for module in args.modules:
+            seconds, loaded = startupImport(module)
+            heavy |= bool(loaded)
+            print(f"import {module:20s} {seconds*1000:8.1f} ms  {'loads ' + ', '.join(loaded) if loaded else 'no heavy modules'}")
+        sys.exit(1 if heavy else 0)
+
+    if args.command == "run":
+        report = runBenchmarks(args.repeat, args.filter, args.csv)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1)
+        print(f"Benchmark results saved: {args.out}")
+        if not args.compare:
+            sys.exit(0)
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        current = report
+    else:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        with open(args.current, 'r', encoding='utf-8') as f:
+            current = json.load(f)
+
+    regressions = compareBenchmarks(baseline, current, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold*100:.0f}%: {', '.join(regressions)}")
+        sys.exit(1)
+    print(f"No regressions beyond {args.threshold*100:.0f}%")
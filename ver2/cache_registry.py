@@ -0,0 +1,112 @@
+"""Hit / miss / eviction counters and approximate sizes of the in-process memoization caches
+
+    counter = registerCache("propulsion.thrust_reverse_solve", lambda: thrust_reverse_solve._cache)
+    counter.hits += 1
+
+Counters live for the whole process; cacheReport() can be called at any time and
+writeCacheReport() dumps it at the end of a worker run, e.g. to compare rounding keys.
+"""
+import sys
+import json
+import os
+import os.path
+import time
+import numpy as np
+
+CACHES = {}
+
+
+class CacheCounter:
+    """Counters of one cache; entries() returns the current dict (or None) for the size estimate"""
+    def __init__(self, name: str, entries=None):
+        self.name = name
+        self.entries = entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def evict(self, cache: dict):
+        """Count the entries of a cache dict that is about to be dropped or replaced"""
+        if cache:
+            self.evictions += len(cache)
+
+    def reset(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self) -> dict:
+        cache = self.entries() if self.entries is not None else None
+        lookups = self.hits + self.misses
+        return {'name': self.name, 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(cache) if cache is not None else 0,
+                'bytes': approxBytes(cache) if cache is not None else 0}
+
+
+def registerCache(name: str, entries=None) -> CacheCounter:
+    """Counter registered under name; registering the same name again keeps its counts and,
+    when entries now returns another dict (a new MissionAnalyzer), counts the old one as evicted"""
+    counter = CACHES.get(name)
+    if counter is None:
+        counter = CACHES[name] = CacheCounter(name, entries)
+    elif entries is not None:
+        old = counter.entries() if counter.entries is not None else None
+        if old is not entries():
+            counter.evict(old)
+        counter.entries = entries
+    return counter
+
+
+def approxBytes(value) -> int:
+    """Rough deep size: containers, their items and the buffers of numpy arrays"""
+    if isinstance(value, np.ndarray):
+        return sys.getsizeof(value) + (0 if value.base is None else value.nbytes)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(approxBytes(k) + approxBytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(approxBytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def cacheReport() -> list:
+    return [counter.stats() for counter in CACHES.values()]
+
+def resetCacheStats():
+    for counter in CACHES.values():
+        counter.reset()
+
+def printCacheReport(report: list = None):
+    print(f"\n{'cache':40s} {'hits':>10s} {'misses':>10s} {'hit rate':>9s} {'evicted':>9s} {'entries':>9s} {'MB':>8s}")
+    for stats in (cacheReport() if report is None else report):
+        print(f"{stats['name']:40s} {stats['hits']:10d} {stats['misses']:10d} {stats['hit_rate']*100:8.1f}% "
+              f"{stats['evictions']:9d} {stats['entries']:9d} {stats['bytes']/1024/1024:8.2f}")
+
+def writeCacheReport(path: str, worker: str = ""):
+    """Overwrites path with this process's report as JSON"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'time': time.strftime("%Y-%m-%d %X"), 'worker': worker, 'caches': cacheReport()}, f, indent=1)
+
+
+if __name__ == "__main__":
+    import argparse
+    import glob
+
+    parser = argparse.ArgumentParser(description="Sum the cache reports written by the mission workers.")
+    parser.add_argument("pattern", type=str, nargs='?', default="data/cache_report_*.json")
+    args = parser.parse_args()
+
+    totals = {}
+    for path in sorted(glob.glob(args.pattern)):
+        with open(path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+        for stats in report['caches']:
+            total = totals.setdefault(stats['name'], dict.fromkeys(
+                ('hits', 'misses', 'evictions', 'entries', 'bytes'), 0) | {'name': stats['name']})
+            for k in ('hits', 'misses', 'evictions', 'entries', 'bytes'):
+                total[k] += stats[k]
+    for total in totals.values():
+        lookups = total['hits'] + total['misses']
+        total['hit_rate'] = total['hits'] / lookups if lookups else 0.0
+    printCacheReport(list(totals.values()))
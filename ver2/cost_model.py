@@ -0,0 +1,216 @@
+"""Cost model for planning VSP / mission sweeps from measured worker timings"""
+import numpy as np
+import pandas as pd
+import glob
+import heapq
+import json
+import os
+import os.path
+from dataclasses import dataclass, field, replace
+from setup_dataclass import AircraftParamConstraints, MissionParamConstraints
+from internal_dataclass import Aircraft
+
+# Fallbacks used until timings have been recorded (same numbers as runtime_estimator.py)
+DEFAULT_VSP_SECONDS = 15
+DEFAULT_MISSION_SECONDS = {'mission2': 0.18, 'mission3': 1.0}
+
+# Minimum samples per airfoil before fitting seconds = a + b*span + c*AR
+MIN_FIT_SAMPLES = 4
+
+
+def writeTimingRecords(records: list, csvPath: str):
+    if not records:
+        return
+    df = pd.DataFrame(records)
+    df.to_csv(csvPath, sep='|', encoding='utf-8', index=False,
+              mode='a', header=not os.path.isfile(csvPath))
+
+def loadTimings(pattern: str) -> pd.DataFrame:
+    df_list = []
+    for csv_file in sorted(glob.glob(pattern)):
+        if os.path.getsize(csv_file) == 0:
+            continue
+        df_list.append(pd.read_csv(csv_file, sep='|', encoding='utf-8'))
+    if not df_list:
+        return pd.DataFrame()
+    return pd.concat(df_list, ignore_index=True)
+
+
+@dataclass
+class CostModel:
+    # airfoil -> [a, b, c] of seconds = a + b*span + c*AR
+    vsp_coeffs: dict = field(default_factory=dict)
+    vsp_default: float = DEFAULT_VSP_SECONDS
+
+    # (stage, MTOW, max_speed) / (stage, max_speed) / stage -> seconds per combination
+    mission_cell: dict = field(default_factory=dict)
+    mission_speed: dict = field(default_factory=dict)
+    mission_default: dict = field(default_factory=lambda: dict(DEFAULT_MISSION_SECONDS))
+
+    def predictVSP(self, span: float, AR: float, airfoil: str) -> float:
+        coeffs = self.vsp_coeffs.get(airfoil)
+        if coeffs is None:
+            return self.vsp_default
+        return max(coeffs[0] + coeffs[1]*span + coeffs[2]*AR, 0.0)
+
+    def predictMission(self, stage: str, MTOW: float, max_speed: float) -> float:
+        MTOW, max_speed = round(float(MTOW), 3), round(float(max_speed), 3)
+        if (stage, MTOW, max_speed) in self.mission_cell:
+            return self.mission_cell[(stage, MTOW, max_speed)]
+        if (stage, max_speed) in self.mission_speed:
+            return self.mission_speed[(stage, max_speed)]
+        return self.mission_default[stage]
+
+
+def fitCostModel(vspTimings: pd.DataFrame, missionTimings: pd.DataFrame) -> CostModel:
+    model = CostModel()
+
+    if not vspTimings.empty:
+        model.vsp_default = float(vspTimings['seconds'].mean())
+        for airfoil, df in vspTimings.groupby('airfoil'):
+            seconds = df['seconds'].to_numpy(float)
+            X = np.column_stack((np.ones(len(df)), df['span'].to_numpy(float), df['AR'].to_numpy(float)))
+            if len(df) >= MIN_FIT_SAMPLES and np.linalg.matrix_rank(X) == 3:
+                coeffs, *_ = np.linalg.lstsq(X, seconds, rcond=None)
+            else:
+                coeffs = np.array([seconds.mean(), 0.0, 0.0])
+            model.vsp_coeffs[airfoil] = coeffs.tolist()
+
+    # Hashes rejected before any combination ran (e.g. no MTOW within the wing loading limits) carry no per-combination cost
+    if not missionTimings.empty:
+        missionTimings = missionTimings[missionTimings['combinations'] > 0]
+    if not missionTimings.empty:
+        df = missionTimings.assign(MTOW=missionTimings['MTOW'].round(3),
+                                   max_speed=missionTimings['max_speed'].round(3))
+        for (stage, MTOW, max_speed), g in df.groupby(['stage', 'MTOW', 'max_speed']):
+            model.mission_cell[(stage, MTOW, max_speed)] = g['seconds'].sum() / g['combinations'].sum()
+        for (stage, max_speed), g in df.groupby(['stage', 'max_speed']):
+            model.mission_speed[(stage, max_speed)] = g['seconds'].sum() / g['combinations'].sum()
+        for stage, g in df.groupby('stage'):
+            model.mission_default[stage] = g['seconds'].sum() / g['combinations'].sum()
+
+    return model
+
+
+def balanceShards(costs, total_server: int):
+    """Longest-processing-time assignment: returns (item indices, predicted seconds) per shard"""
+    shards = [[] for _ in range(total_server)]
+    loads = [0.0] * total_server
+    heap = [(0.0, k) for k in range(total_server)]
+    for i in sorted(range(len(costs)), key=lambda i: costs[i], reverse=True):
+        load, k = heapq.heappop(heap)
+        shards[k].append(i)
+        loads[k] = load + costs[i]
+        heapq.heappush(heap, (loads[k], k))
+    # keep the original sweep order inside each shard
+    return [sorted(shard) for shard in shards], loads
+
+def buildVSPManifest(aircraftParamConstraints: AircraftParamConstraints, baseAircraft: Aircraft,
+                     model: CostModel, total_server: int, grid_combinations: list = None) -> dict:
+    if grid_combinations is None:
+        from vsp_grid import getVSPGridCombinations
+        grid_combinations = getVSPGridCombinations(aircraftParamConstraints)
+
+    costs = [model.predictVSP(span, AR, airfoil) for span, AR, _, _, airfoil in grid_combinations]
+    shards, loads = balanceShards(costs, total_server)
+
+    manifest = {'mode': 'vsp', 'total_server': total_server, 'shards': {}}
+    for k, (shard, load) in enumerate(zip(shards, loads)):
+        configs = []
+        for i in shard:
+            span, AR, taper, twist, airfoil = grid_combinations[i]
+            aircraft = replace(baseAircraft, mainwing_span=span, mainwing_AR=AR, mainwing_taper=taper,
+                               mainwing_twist=twist, mainwing_airfoil_datapath="data/airfoilDAT/" + airfoil + ".dat")
+            configs.append({'span': float(span), 'AR': float(AR), 'taper': float(taper), 'twist': float(twist),
+                            'airfoil': airfoil, 'hash': "'" + str(hash(aircraft)) + "'",
+                            'predicted_seconds': costs[i]})
+        manifest['shards'][str(k+1)] = {'predicted_seconds': load, 'configs': configs}
+    return manifest
+
+def predictMissionHashCost(Sref: float, m_empty: float,
+                           missionParamConstraints: MissionParamConstraints, model: CostModel) -> float:
+    from mission_grid import getMTOWList
+    c = missionParamConstraints
+
+    def count(v_min, v_max, interval):
+        return len(np.arange(v_min, v_max + interval/2, interval))
+
+    M2_thrust_combinations = (count(c.M2_climb_thrust_ratio_min, c.M2_climb_thrust_ratio_max, c.M2_thrust_analysis_interval)
+                              * count(c.M2_turn_thrust_ratio_min, c.M2_turn_thrust_ratio_max, c.M2_thrust_analysis_interval)
+                              * count(c.M2_level_thrust_ratio_min, c.M2_level_thrust_ratio_max, c.M2_thrust_analysis_interval))
+    M3_thrust_combinations = (count(c.M3_climb_thrust_ratio_min, c.M3_climb_thrust_ratio_max, c.M3_thrust_analysis_interval)
+                              * count(c.M3_turn_thrust_ratio_min, c.M3_turn_thrust_ratio_max, c.M3_thrust_analysis_interval)
+                              * count(c.M3_level_thrust_ratio_min, c.M3_level_thrust_ratio_max, c.M3_thrust_analysis_interval))
+    M2_speeds = np.arange(c.M2_max_speed_min, c.M2_max_speed_max + c.max_speed_analysis_interval/2, c.max_speed_analysis_interval)
+    M3_speeds = np.arange(c.M3_max_speed_min, c.M3_max_speed_max + c.max_speed_analysis_interval/2, c.max_speed_analysis_interval)
+
+    MTOW_list = getMTOWList(c, Sref, m_empty)
+    if len(MTOW_list) == 0:
+        return 0.0
+
+    cost = sum(model.predictMission('mission2', MTOW, v) for MTOW in MTOW_list for v in M2_speeds) * M2_thrust_combinations
+    cost += sum(model.predictMission('mission3', m_empty/1000, v) for v in M3_speeds) * M3_thrust_combinations
+    return cost
+
+def buildMissionManifest(csvPath: str, missionParamConstraints: MissionParamConstraints,
+                         model: CostModel, total_server: int) -> dict:
+    df = pd.read_csv(csvPath, sep='|', encoding='utf-8', usecols=['hash', 'Sref', 'm_empty'])
+    costs = [predictMissionHashCost(Sref, m_empty, missionParamConstraints, model)
+             for Sref, m_empty in zip(df['Sref'], df['m_empty'])]
+    shards, loads = balanceShards(costs, total_server)
+
+    manifest = {'mode': 'mission', 'total_server': total_server, 'shards': {}}
+    for k, (shard, load) in enumerate(zip(shards, loads)):
+        manifest['shards'][str(k+1)] = {
+            'predicted_seconds': load,
+            'hashes': [{'hash': df['hash'].iloc[i], 'predicted_seconds': costs[i]} for i in shard]
+        }
+    return manifest
+
+
+def writeShardManifest(manifest: dict, jsonPath: str):
+    with open(jsonPath, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+
+def loadShardManifest(jsonPath: str, server_id: int) -> dict:
+    with open(jsonPath, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    return manifest['shards'][str(server_id)]
+
+def printManifestSummary(manifest: dict):
+    loads = np.array([shard['predicted_seconds'] for shard in manifest['shards'].values()])
+    imbalance = loads.max() / loads.mean() - 1 if loads.mean() > 0 else 0.0
+    print(f"\n{manifest['mode']} manifest for {manifest['total_server']} servers")
+    print(f"predicted running time = {loads.max()/3600:.3f} hour (mean {loads.mean()/3600:.3f} hour, imbalance {imbalance*100:.2f}%)")
+
+
+if __name__ == "__main__":
+    import argparse
+    from main import get_config
+
+    parser = argparse.ArgumentParser(description="Build a balanced shard manifest from measured worker timings.")
+    parser.add_argument("--mode", choices=['vsp', 'mission'], required=True)
+    parser.add_argument("--total_server", type=int, required=True, help="total server number")
+    parser.add_argument("--out", type=str, default="", help="manifest path (default: data/{mode}_manifest.json)")
+    parser.add_argument("--configs", type=str, default="", help="pruned configuration list(s) from main.py --mode prepass (vsp mode)")
+    parser.add_argument("--aircraft_csv", type=str, default="data/aircraft.csv", help="aircraft results store (mission mode)")
+    args = parser.parse_args()
+
+    (presetValues, propulsionSpecs, aircraftParamConstraints,
+     aerodynamicSetup, baseAircraft, missionParamConstraints) = get_config()
+
+    model = fitCostModel(loadTimings("data/vsp_timing_*.csv"), loadTimings("data/mission_timing_*.csv"))
+
+    if args.mode == 'vsp':
+        grid_combinations = None
+        if args.configs:
+            from vsp_grid import loadPrepassConfigs
+            grid_combinations = loadPrepassConfigs(args.configs)
+        manifest = buildVSPManifest(aircraftParamConstraints, baseAircraft, model, args.total_server, grid_combinations)
+    else:
+        manifest = buildMissionManifest(args.aircraft_csv, missionParamConstraints, model, args.total_server)
+
+    outPath = args.out or f"data/{args.mode}_manifest.json"
+    writeShardManifest(manifest, outPath)
+    printManifestSummary(manifest)
+    print(f"Shard manifest saved: {outPath}")
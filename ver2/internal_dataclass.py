@@ -142,12 +142,25 @@ class AircraftAnalysisResults:
 
     max_load: float
 
+    # VSPAERO fidelity tier that produced the coefficients
+    fidelity: str = "production"
+
     @classmethod
     def fromDict(cls, datadict):
         aircraft = Aircraft(**{k.replace('aircraft.',''):v for k,v in datadict.items() if  ('aircraft.' in k)})
         datadict = {k:v for k,v in datadict.items() if not ('aircraft.' in k)}
         return  cls(**datadict,aircraft=aircraft)
 
+@dataclass
+class AdaptiveAlphaSweep:
+    """Alpha set of a flap case sampled adaptively between alpha_start and alpha_end"""
+    alpha_start: float
+    alpha_end: float
+    max_npts: int               # points of the nominal grid; only its alphas are evaluated
+    CL_tolerance: float
+    CD_tolerance: float
+    initial_npts: int = 4
+
 @dataclass
 class MissionParameters:
     """Additional Parameters for running the mission(s)"""
@@ -204,3 +217,33 @@ class MissionConfig:
     numargs: list[float]
     direction: str=""
 
+
+@dataclass
+class PhaseStats:
+    """Cost of one PhaseType summed over the phases of that type that were run"""
+    calls: int=0
+    seconds: float=0
+    steps: int=0                    # integration steps (logged states)
+    propulsion_calls: int=0         # thrust_analysis / determine_max_thrust / thrust_reverse_solve
+    failures: int=0
+
+    def add(self, other: "PhaseStats"):
+        self.calls += other.calls
+        self.seconds += other.seconds
+        self.steps += other.steps
+        self.propulsion_calls += other.propulsion_calls
+        self.failures += other.failures
+
+@dataclass
+class MissionStats:
+    """Per-phase cost of MissionAnalyzer.run_mission2 / run_mission3, reset by clearState"""
+    phases: dict=field(default_factory=lambda: {phaseType.name: PhaseStats() for phaseType in PhaseType})
+    failure_reason: str=""
+    laps: int=0
+    lap_seconds: list=field(default_factory=list)
+
+    def add(self, other: "MissionStats"):
+        for name, phaseStats in other.phases.items():
+            self.phases[name].add(phaseStats)
+        self.laps += other.laps
+        self.lap_seconds += other.lap_seconds
@@ -1,22 +1,23 @@
 import pandas as pd
-from vsp_grid import runVSPGridAnalysis
 from mission_grid import runMissionGridSearch, ResultAnalysis
 from mission_analysis import MissionAnalyzer
-from vsp_analysis import removeAnalysisResults, loadAnalysisResults
+from results_store import removeAnalysisResults, loadAnalysisResults
 from internal_dataclass import *
 from setup_dataclass import *
 import argparse
 
-import cProfile
-import pstats
-from pstats import SortKey
-
 import pandas as pd
-from vsp_grid import runVSPGridAnalysis
-from mission_grid import runMissionGridSearch, ResultAnalysis
-from vsp_analysis import removeAnalysisResults
+from mission_grid import runMissionGridSearch, ResultAnalysis, updateResultAnalysis
 from internal_dataclass import *
 from setup_dataclass import *
+from cost_model import loadShardManifest
+from vsp_cache import DEFAULT_CACHE_DIR
+from mission_memo import MissionMemo
+from pipeline import vspQueue, markDone, doneCount, ShardFollower, POLL_SECONDS
+from profiling import profiled, profilingEnabled, enableProfiling, clearProfiles, mergeProfiles
+from cache_registry import printCacheReport, writeCacheReport
+from telemetry import WorkerTelemetry
+from shared_tables import enableSharedTables
 import argparse
 import os
 import glob, time
@@ -156,20 +157,53 @@ def get_config():
     return (presetValues, propulsionSpecs, aircraftParamConstraints, 
             aerodynamicSetup, baseAircraft, missionParamConstraints)
 
-def run_vsp_analysis(server_id: int, total_servers: int):
+def run_vsp_analysis(server_id: int, total_servers: int, manifest_path: str = "", vsp_jobs: int = 1, fidelity: str = None,
+                     vsp_session: bool = True, write_vsp: bool = False, use_cache: bool = True,
+                     surrogate_threshold: float = None, configs_path: str = "", pipeline: bool = False):
+    # OpenVSP is only imported by the modes that run it, so mission and score workers start without it
+    from vsp_grid import runVSPGridAnalysis, loadPrepassConfigs, split_into_chunks
     (presetValues, propulsionSpecs, aircraftParamConstraints, 
      aerodynamicSetup, baseAircraft, _) = get_config()
     
     # Use server-specific output path
     output_path = f"data/aircraft_{server_id}.csv"
     vsp_path = f"aircraft_{server_id}.vsp3"
+    timing_path = f"data/vsp_timing_{server_id}.csv"
     if os.path.exists(output_path):
         os.remove(output_path)
+
+    # Cost-balanced assignment from cost_model.py, otherwise an even split of the grid
+    grid_combinations = None
+    if manifest_path:
+        shard = loadShardManifest(manifest_path, server_id)
+        grid_combinations = [(c['span'], c['AR'], c['taper'], c['twist'], c['airfoil']) for c in shard['configs']]
+        print(f"Worker {server_id} predicted VSP time from manifest: {shard['predicted_seconds']/3600:.3f} hour")
+    elif configs_path:
+        # Pruned list from --mode prepass, split like the full grid
+        grid_combinations = list(split_into_chunks(loadPrepassConfigs(configs_path), total_servers))[server_id-1]
         
+    telemetry = WorkerTelemetry('vsp', f"server{server_id}")
     runVSPGridAnalysis(aircraftParamConstraints, aerodynamicSetup, presetValues, 
-                      baseAircraft, server_id, total_servers, csvPath=output_path,vspPath=vsp_path)
+                      baseAircraft, server_id, total_servers, csvPath=output_path,vspPath=vsp_path,
+                      grid_combinations=grid_combinations, timingPath=timing_path, vsp_jobs=vsp_jobs,
+                      fidelity=fidelity, vsp_session=vsp_session, writeVSPFile=write_vsp,
+                      cacheDir=DEFAULT_CACHE_DIR if use_cache else "",
+                      surrogateData="data/aircraft.csv" if surrogate_threshold is not None else "",
+                      surrogate_threshold=surrogate_threshold,
+                      commitQueue=vspQueue() if pipeline else None,
+                      telemetry=telemetry)
+    telemetry.close()
+    if pipeline:
+        markDone('vsp', server_id)
+
+def run_prepass(server_id: int, total_servers: int):
+    from vsp_grid import runVSPPrepass
+    (presetValues, _, aircraftParamConstraints, 
+     _, baseAircraft, missionParamConstraints) = get_config()
+    runVSPPrepass(aircraftParamConstraints, missionParamConstraints, presetValues, baseAircraft,
+                  server_id, total_servers, outPath=f"data/prepass_{server_id}.csv")
 
-def run_mission_analysis(server_id: int, total_servers: int):
+def run_mission_analysis(server_id: int, total_servers: int, manifest_path: str = "", use_memo: bool = True):
     (presetValues, propulsionSpecs, _, _, _, missionParamConstraints) = get_config()
     
     #final_hash_list = []
@@ -195,35 +229,180 @@ def run_mission_analysis(server_id: int, total_servers: int):
     results = df_saved
 
     # Divide hash values among servers
-    all_hashes = results["hash"].tolist()
-    worker_hashes = all_hashes[server_id-1::total_servers]
+    if manifest_path:
+        shard = loadShardManifest(manifest_path, server_id)
+        worker_hashes = [h['hash'] for h in shard['hashes']]
+        print(f"Worker {server_id} predicted mission time from manifest: {shard['predicted_seconds']/3600:.3f} hour")
+    else:
+        all_hashes = results["hash"].tolist()
+        worker_hashes = all_hashes[server_id-1::total_servers]
     
     # Use server-specific output path for mission results
     output2_path = f"data/mission2_results_{server_id}.csv"
     output3_path = f"data/mission3_results_{server_id}.csv"
+    timing_path = f"data/mission_timing_{server_id}.csv"
+    metrics_path = f"data/mission_metrics_{server_id}.csv"
+    memo = MissionMemo() if use_memo else None
+    telemetry = WorkerTelemetry('mission', f"server{server_id}", total=len(worker_hashes), unit="hashes")
 
     # Run mission analysis for this worker's hashes
     for hashVal in worker_hashes:
         print(f"\nWorker {server_id} analyzing hash {hashVal}")
-        runMissionGridSearch(hashVal, presetValues, missionParamConstraints, 
-                             propulsionSpecs, 
-                             mission2Out=output2_path,
-                             mission3Out=output3_path)
+        with profiled('mission', f"server{server_id}", hashVal):
+            runMissionGridSearch(hashVal, presetValues, missionParamConstraints, 
+                                 propulsionSpecs, 
+                                 mission2Out=output2_path,
+                                 mission3Out=output3_path,
+                                 timingPath=timing_path,
+                                 memo=memo,
+                                 metricsPath=metrics_path,
+                                 telemetry=telemetry)
+        telemetry.count()
+    telemetry.close()
+    if memo is not None:
+        print(memo.summary())
+    printCacheReport()
+    writeCacheReport(f"data/cache_report_{server_id}.json", f"server{server_id}")
+
+def run_mission_pipeline(server_id: int, total_servers: int, vsp_servers: int, use_memo: bool = True):
+    """Mission worker that starts on every hash as soon as a VSP server commits it, until all VSP servers are done"""
+    (presetValues, propulsionSpecs, _, _, _, missionParamConstraints) = get_config()
+
+    output2_path = f"data/mission2_results_{server_id}.csv"
+    output3_path = f"data/mission3_results_{server_id}.csv"
+    timing_path = f"data/mission_timing_{server_id}.csv"
+    metrics_path = f"data/mission_metrics_{server_id}.csv"
+    for path in (output2_path, output3_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+    queue = vspQueue()
+    memo = MissionMemo() if use_memo else None
+    # The number of hashes is unknown until VSP is done, so pipeline workers report no ETA
+    telemetry = WorkerTelemetry('mission', f"server{server_id}", unit="hashes")
+    analyzed = set()
+    while True:
+        vsp_finished = doneCount('vsp') >= vsp_servers
+        records = queue.poll()
+        for record in records:
+            hashVal = record['hash']
+            # Hash-based claim, so workers agree without coordination and duplicates go to one worker
+            if hashVal in analyzed or int(hashVal.strip("'")) % total_servers != server_id - 1:
+                continue
+            analyzed.add(hashVal)
+            print(f"\nWorker {server_id} analyzing hash {hashVal} from {record['csvPath']}")
+            with profiled('mission', f"server{server_id}", hashVal):
+                runMissionGridSearch(hashVal, presetValues, missionParamConstraints, 
+                                     propulsionSpecs, 
+                                     csvPath=record['csvPath'],
+                                     mission2Out=output2_path,
+                                     mission3Out=output3_path,
+                                     timingPath=timing_path,
+                                     memo=memo,
+                                     metricsPath=metrics_path,
+                                     telemetry=telemetry)
+            telemetry.count()
+        if not records:
+            if vsp_finished:
+                break
+            time.sleep(POLL_SECONDS)
+
+    telemetry.close()
+    markDone('mission', server_id)
+    print(f"Worker {server_id} done: {len(analyzed)} hashes analyzed")
+    if memo is not None:
+        print(memo.summary())
+    printCacheReport()
+    writeCacheReport(f"data/cache_report_{server_id}.json", f"server{server_id}")
+
+def run_score_pipeline(mission_servers: int):
+    """Collects mission worker results and rescores organized_results.csv as they arrive"""
+    presetValues = get_config()[0]
+
+    M2_path, M3_path, organized_path = "data/M2_total_results.csv", "data/M3_total_results.csv", "data/organized_results.csv"
+    for path in (M2_path, M3_path, organized_path, os.path.splitext(organized_path)[0] + "_state.json"):
+        if os.path.exists(path):
+            os.remove(path)
+    followers = [ShardFollower("data/mission2_results_*.csv", M2_path),
+                 ShardFollower("data/mission3_results_*.csv", M3_path)]
+
+    while True:
+        mission_finished = doneCount('mission') >= mission_servers
+        rows = sum(follower.follow() for follower in followers)
+        if rows and os.path.isfile(M2_path) and os.path.isfile(M3_path):
+            print(f"\n[{time.strftime('%Y-%m-%d %X')}] Scoring {rows} new mission results")
+            updateResultAnalysis(presetValues, M2_path, M3_path, organized_path)
+        if not rows:
+            if mission_finished:
+                break
+            time.sleep(POLL_SECONDS)
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--server_id", type=int, required=True, help="current server ID")
     parser.add_argument("--total_server", type=int, required=True, help="total server number")
-    parser.add_argument("--mode", choices=['vsp', 'mission'], required=True, 
-                      help="Operation mode: 'vsp' for VSP analysis or 'mission' for mission analysis")
+    parser.add_argument("--mode", choices=['prepass', 'vsp', 'mission', 'score'], required=True, 
+                      help="Operation mode: 'prepass' for geometry/mass filtering, 'vsp' for VSP analysis, 'mission' for mission analysis "
+                           "or 'score' for the pipeline scoring loop")
+    parser.add_argument("--manifest", type=str, default="",
+                      help="shard manifest from cost_model.py (default: even split)")
+    parser.add_argument("--vsp-jobs", type=int, default=1,
+                      help="number of isolated VSP worker processes on this server (vsp mode)")
+    parser.add_argument("--fidelity", choices=list(default_fidelity_tiers()), default=None,
+                      help="VSPAERO fidelity tier for this stage (vsp mode, default: AerodynamicSetup.fidelity)")
+    parser.add_argument("--vsp-rebuild", action="store_true",
+                      help="rebuild and re-read the VSP model for every configuration instead of updating it in place")
+    parser.add_argument("--write-vsp", action="store_true",
+                      help="write the vsp3 file of every configuration (debugging only)")
+    parser.add_argument("--no-vsp-cache", action="store_true",
+                      help="ignore the shared VSP result cache and recompute every configuration")
+    parser.add_argument("--surrogate", type=float, default=None, metavar="THRESHOLD",
+                      help="predict configurations from a surrogate fitted to data/aircraft.csv and run VSP only where "
+                           "the uncertainty (in units of the CL/CD tolerances of aero_surrogate.py) exceeds THRESHOLD")
+    parser.add_argument("--configs", type=str, default="",
+                      help="pruned configuration list(s) from --mode prepass, e.g. 'data/prepass_*.csv' (vsp mode)")
+    parser.add_argument("--no-mission-memo", action="store_true",
+                      help="recompute every mission combination instead of reusing data/mission_memo.jsonl (mission mode)")
+    parser.add_argument("--pipeline", action="store_true",
+                      help="run the stages concurrently through the queues in data/pipeline (run 'python pipeline.py reset' first): "
+                           "vsp servers announce each stored hash, mission workers start on it right away, "
+                           "and --mode score updates organized_results.csv as mission results arrive")
+    parser.add_argument("--vsp_servers", type=int, default=None,
+                      help="number of VSP servers a pipeline mission worker waits for (default: --total_server)")
+    parser.add_argument("--profile", action="store_true",
+                      help="cProfile every analysed hash into data/profile/<mode>/server<id>/ and print a merged "
+                           "summary at exit (same as DBF_PROFILE=1)")
+    parser.add_argument("--shared-tables", action="store_true",
+                      help="share the propeller / battery tables with the other mission workers of this node through "
+                           "shared memory instead of one copy per process (same as DBF_SHARED_TABLES=1)")
     args = parser.parse_args()
+    if args.profile:
+        enableProfiling()
+    if args.shared_tables:
+        enableSharedTables()
+    if profilingEnabled() and args.mode in ('vsp', 'mission'):
+        clearProfiles(args.mode, f"server{args.server_id}")
     
     print(f"Starting worker {args.server_id} of {args.total_server} in {args.mode} mode")
 
-    if args.mode == 'vsp':
-        run_vsp_analysis(args.server_id, args.total_server)
+    if args.mode == 'prepass':
+        run_prepass(args.server_id, args.total_server)
+    elif args.mode == 'vsp':
+        run_vsp_analysis(args.server_id, args.total_server, args.manifest, args.vsp_jobs, args.fidelity,
+                         vsp_session=not args.vsp_rebuild, write_vsp=args.write_vsp,
+                         use_cache=not args.no_vsp_cache, surrogate_threshold=args.surrogate,
+                         configs_path=args.configs, pipeline=args.pipeline)
+    elif args.mode == 'score':
+        # --total_server is the number of mission workers here
+        run_score_pipeline(args.total_server)
+    elif args.pipeline:
+        run_mission_pipeline(args.server_id, args.total_server, args.vsp_servers or args.total_server,
+                             use_memo=not args.no_mission_memo)
     else:
-        run_mission_analysis(args.server_id, args.total_server)
+        run_mission_analysis(args.server_id, args.total_server, args.manifest, use_memo=not args.no_mission_memo)
+
+    if profilingEnabled() and args.mode in ('vsp', 'mission'):
+        mergeProfiles(args.mode, f"server{args.server_id}")
 
 if __name__ == "__main__":
     main()
@@ -1,21 +1,44 @@
 from typing import List
+import math
 import numpy as np
 import pandas as pd
 import time
-import concurrent.futures
-import matplotlib.pyplot as plt
-from scipy.optimize import fsolve
+import os
+import os.path
+import pickle
 from scipy.interpolate import interp1d
 from setup_dataclass import PresetValues, PropulsionSpecs
-from internal_dataclass import PhysicalConstants, MissionParameters, AircraftAnalysisResults, PlaneState, PhaseType, MissionConfig, Aircraft
-from propulsion import thrust_analysis, determine_max_thrust, thrust_reverse_solve, SoC2Vol
-from vsp_analysis import  loadAnalysisResults
+from internal_dataclass import PhysicalConstants, MissionParameters, AircraftAnalysisResults, PlaneState, PhaseType, MissionConfig, Aircraft, MissionStats, PhaseStats
+from propulsion import thrust_analysis, determine_max_thrust, thrust_reverse_solve, SoC2Vol, call_counts
+from results_store import loadAnalysisResults
+from cache_registry import registerCache
+from vsp_cache import fileDigest
+from shared_tables import lookupSharedTable, shareTable
 
 
 ## Constant values
 g = PhysicalConstants.g
 rho = PhysicalConstants.rho
 
+# Slack on the closed-form bounds of screen_feasibility for time-stepping error
+SCREEN_MARGIN = 1.05
+
+# Mission 2 has to end above this altitude (m)
+M2_MIN_FINAL_ALTITUDE = 20
+
+SNAPSHOT_TABLE_DIR = "data/snapshots/tables"
+
+# Propeller / battery tables converted in this process, keyed by the digest of their CSV (read-only,
+# shared by every MissionAnalyzer and inherited by forked workers; with --shared-tables, by the whole node)
+_tables = {}
+
+def _cachedTable(key:str):
+    if key not in _tables:
+        shared = lookupSharedTable(key)
+        if shared is not None:
+            _tables[key] = shared
+    return _tables.get(key)
+
 class MissionAnalyzer():
     def __init__(self, 
                  analResult:AircraftAnalysisResults, 
@@ -32,6 +55,7 @@ class MissionAnalyzer():
         self.dt = dt
         self.m_fuel = max(self.missionParam.m_takeoff - self.analResult.m_empty,0) 
 
+        self.table_keys = {}
         self.convert_propellerCSV_to_ndarray(self.missionParam.propeller_data_path)
         self.convert_batteryCSV_to_ndarray(self.propulsionSpecs.battery_data_path)
         self.clearState()
@@ -122,10 +146,16 @@ class MissionAnalyzer():
             CD_flap_max=results.CD_flap_max,
             CD_flap_zero=results.CD_flap_zero,
 
-            max_load=presetValues.max_load
+            max_load=presetValues.max_load,
+            fidelity=results.fidelity
         )
 
     def convert_propellerCSV_to_ndarray(self, csvPath):
+        key = "propeller_" + fileDigest(csvPath)
+        self.table_keys['propeller_array'] = key
+        if _cachedTable(key) is not None:
+            self.propeller_array = _tables[key]
+            return
 
         propeller_df = pd.read_csv(csvPath)
         propeller_df.dropna(how='any',inplace=True)
@@ -135,11 +165,18 @@ class MissionAnalyzer():
         v_speed_array = propeller_df['V(speed) (m/s)'].to_numpy()
         torque_array = propeller_df['Torque (N-m)'].to_numpy()
         thrust_array = propeller_df['Thrust (kg)'].to_numpy()
-        self.propeller_array = np.column_stack((rpm_array, v_speed_array, torque_array, thrust_array))
-    
+        self.propeller_array = shareTable(key, np.column_stack((rpm_array, v_speed_array, torque_array, thrust_array)))
+        self.propeller_array.setflags(write=False)
+        _tables[key] = self.propeller_array
         return
     
     def convert_batteryCSV_to_ndarray(self, csvPath):
+        # SoC depends on the pack, so the key includes it
+        key = f"battery_{fileDigest(csvPath)}_{self.propulsionSpecs.n_cell}_{self.propulsionSpecs.battery_Wh}"
+        self.table_keys['battery_array'] = key
+        if _cachedTable(key) is not None:
+            self.battery_array = _tables[key]
+            return
 
         df = pd.read_csv(csvPath,skiprows=[1]) 
         time_array = df['Time'].to_numpy()
@@ -154,41 +191,90 @@ class MissionAnalyzer():
         current_array = current_array[mask]
         SoC_array = SoC_array[mask]
         battery_array = np.column_stack((time_array, voltage_array, current_array, SoC_array))
-        self.battery_array = battery_array[battery_array[:, 3].argsort()]
+        self.battery_array = shareTable(key, battery_array[battery_array[:, 3].argsort()])
+        self.battery_array.setflags(write=False)
+        _tables[key] = self.battery_array
         return
     
     def clearState(self):
         self.state = PlaneState()
         self.stateLog = []
+        self.stats = MissionStats()
     
     def setAuxVals(self) -> None:
         
-        self.weight = self.missionParam.m_takeoff * g
-        
-        self.v_takeoff = (np.sqrt((2*self.weight) / (rho*self.analResult.Sref*self.analResult.CL_flap_max)))
+        self.setWeightVals()
 
         # Create focused alpha range from -10 to 10 degrees
-        alpha_extended = np.linspace(-5, 15, 2000)  # 0.01 degree resolution
+        self.alpha_extended = np.linspace(-5, 15, 2000)  # 0.01 degree resolution
     
         CL_interp1d = interp1d(self.analResult.alpha_list, self.analResult.CL, kind="linear", fill_value="extrapolate")
         CD_interp1d = interp1d(self.analResult.alpha_list, self.analResult.CD_total, kind="quadratic", fill_value="extrapolate")
-        # Create lookup tables
-        CL_table = CL_interp1d(alpha_extended)
-        CD_table = CD_interp1d(alpha_extended)
+        # Create lookup tables; plain arrays, so the analyzer pickles
+        self.CL_table = CL_interp1d(self.alpha_extended)
+        self.CD_table = CD_interp1d(self.alpha_extended)
         
         self._cl_cache = {}
         self._cd_cache = {}
-
-        # Create lambda functions for faster lookup
-        self._cl_func_original = lambda alpha: np.interp(alpha, alpha_extended, CL_table)
-        self._cd_func_original = lambda alpha: np.interp(alpha, alpha_extended, CD_table)
-        self.alpha_func = lambda CL: np.interp(CL, CL_table, alpha_extended)
+        self._registerCaches()
         return
 
+    def setWeightVals(self) -> None:
+        self.weight = self.missionParam.m_takeoff * g
+        
+        self.v_takeoff = (np.sqrt((2*self.weight) / (rho*self.analResult.Sref*self.analResult.CL_flap_max)))
+
+    def _registerCaches(self):
+        self._cl_counter = registerCache("mission.CL_func", lambda: self._cl_cache)
+        self._cd_counter = registerCache("mission.CD_func", lambda: self._cd_cache)
+
+    def _cl_func_original(self, alpha):
+        return np.interp(alpha, self.alpha_extended, self.CL_table)
+
+    def _cd_func_original(self, alpha):
+        return np.interp(alpha, self.alpha_extended, self.CD_table)
+
+    def alpha_func(self, CL):
+        return np.interp(CL, self.CL_table, self.alpha_extended)
+
+    def __getstate__(self):
+        # The cache counters refer to the registry through lambdas; they are registered again on unpickling
+        state = self.__dict__.copy()
+        state.pop('_cl_counter', None)
+        state.pop('_cd_counter', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        for name in ('propeller_array', 'battery_array'):
+            # Unpickled copies of a table this process already holds are replaced by the shared one
+            table = _tables.setdefault(self.table_keys[name], getattr(self, name))
+            table.setflags(write=False)
+            setattr(self, name, table)
+        self._registerCaches()
+
+    def rehydrate(self, missionParam:MissionParameters) -> "MissionAnalyzer":
+        """Copy of this prepared analyzer for another mission combination of the same aircraft.
+        Coefficient tables and their caches are shared; no CSV is read for tables already converted."""
+        analyzer = MissionAnalyzer.__new__(MissionAnalyzer)
+        analyzer.__dict__.update(self.__getstate__())
+        analyzer.table_keys = dict(self.table_keys)
+        analyzer._registerCaches()
+        analyzer.missionParam = missionParam
+        analyzer.m_fuel = max(missionParam.m_takeoff - analyzer.analResult.m_empty, 0)
+        if missionParam.propeller_data_path != self.missionParam.propeller_data_path:
+            analyzer.convert_propellerCSV_to_ndarray(missionParam.propeller_data_path)
+        analyzer.setWeightVals()
+        analyzer.clearState()
+        return analyzer
+
     def CL_func(self,alpha):
         key = int(alpha*1000+0.5)  # Reduce precision for better cache hits
         if key not in self._cl_cache:
+            self._cl_counter.misses += 1
             self._cl_cache[key] = self._cl_func_original(alpha)
+        else:
+            self._cl_counter.hits += 1
 
         #print(self._cl_cache[key] - self._cl_func_original(alpha))
         return self._cl_cache[key]
@@ -197,13 +283,64 @@ class MissionAnalyzer():
     def CD_func(self,alpha):
         key = int(alpha*1000+0.5)  # Reduce precision for better cache hits
         if key not in self._cd_cache:
+            self._cd_counter.misses += 1
             self._cd_cache[key] = self._cd_func_original(alpha)
+        else:
+            self._cd_counter.hits += 1
 
         #print(self._cl_cache[key] - self._cl_func_original(alpha))
         return self._cd_cache[key]
         #return np.interp(alpha, alpha_extended, CL_table)
 
     
+    def screen_feasibility(self, h_final: float = 0) -> str:
+        """Closed-form check for failures the simulation can not avoid, run before any time-stepping.
+        Thrust is bounded by full-throttle thrust at full battery voltage and drag from below, so every
+        screened-out combination would also fail in the simulation. h_final is the altitude the mission
+        has to end above (run_mission2) or 0.
+        Returns a reason code, or "" when the mission has to be simulated:
+            'turn_load_factor' : lift at max_speed and AOA_turn_max (or max_load_factor) can not exceed the weight
+            'takeoff_thrust'   : thrust can not overcome drag and rolling friction below v_takeoff,
+                                 or can not reach v_takeoff within the 15 s takeoff window
+            'climb_energy'     : no speed with excess power, and the kinetic energy at liftoff is below m*g*h_final
+        """
+        m = self.missionParam.m_takeoff
+        Sref = self.analResult.Sref
+        if not np.isfinite(self.v_takeoff):
+            return ""
+
+        # turn_simulation: L = min(q*CL(AOA_turn_max), max_load_factor*W) <= W at every speed up to max_speed
+        q_max = 0.5 * rho * self.missionParam.max_speed**2 * Sref
+        L_turn = min(q_max * float(self.CL_func(self.analResult.AOA_turn_max)), self.missionParam.max_load_factor * self.weight)
+        if L_turn * SCREEN_MARGIN <= self.weight:
+            return 'turn_load_factor'
+
+        voltage = 4.2 * self.propulsionSpecs.n_cell
+        def T_max(v):
+            return (determine_max_thrust(v, voltage, self.propulsionSpecs, self.propeller_array, 0)
+                    * self.presetValues.number_of_motor * g * SCREEN_MARGIN)
+
+        # takeoff_simulation: ground roll (flaps up) to 0.9 v_takeoff, rotation (flaps down) to v_takeoff
+        v_roll = np.linspace(0, self.v_takeoff, 16)
+        T_roll = np.array([T_max(v) for v in v_roll])
+        q_roll = 0.5 * rho * v_roll**2 * Sref
+        flap_down = v_roll >= 0.9 * self.v_takeoff
+        CD_roll = np.where(flap_down, self.analResult.CD_flap_max, self.analResult.CD_flap_zero)
+        CL_roll = np.where(flap_down, self.analResult.CL_flap_max, self.analResult.CL_flap_zero)
+        F_roll = T_roll - q_roll * CD_roll - 0.03 * (self.weight - q_roll * CL_roll)
+        if np.any(F_roll <= 0) or T_roll.max() / m * 15 < self.v_takeoff:
+            return 'takeoff_thrust'
+
+        # Total energy only grows with excess power (T - D) * v
+        if h_final > 0:
+            v_grid = np.linspace(0, self.propeller_array[:, 1].max(), 40, endpoint=False)
+            CD_min = max(float(np.min(self._cd_func_original(np.linspace(-5, 15, 201)))), 0)
+            P_excess = (np.array([T_max(v) for v in v_grid]) - 0.5 * rho * v_grid**2 * Sref * CD_min) * v_grid
+            if P_excess.max() <= 0 and 0.5 * (1.1 * self.v_takeoff)**2 < g * h_final:
+                return 'climb_energy'
+
+        return ""
+
     def run_mission(self, missionPlan: List[MissionConfig],clearState = True) -> int:
 
         flag = 0
@@ -211,6 +348,9 @@ class MissionAnalyzer():
         if(clearState): self.clearState()
 
         for phase in missionPlan:
+            t_start = time.perf_counter()
+            steps_start = len(self.stateLog)
+            propulsion_start = sum(call_counts.values())
             try:
                 match phase.phaseType:
                     case PhaseType.TAKEOFF:
@@ -227,20 +367,43 @@ class MissionAnalyzer():
                         # print(f"turn = {flag}")
                     case _: 
                         raise ValueError("Didn't provide a correct PhaseType!")
+                self._recordPhase(phase.phaseType, t_start, steps_start, propulsion_start, flag==-1)
                 if (self.state.time > M3_time_limit or self.state.battery_voltage < self.presetValues.min_battery_voltage):
+                    self.stats.failure_reason = 'time_limit' if self.state.time > M3_time_limit else 'battery_voltage'
                     return -2
                 self.state.phase += 1
                 
                 if flag==-1: 
+                    self.stats.failure_reason = f"{phase.phaseType.name.lower()}_failed"
                     return -1
                 
             except Exception as e:
                 print(e)
+                self._recordPhase(phase.phaseType, t_start, steps_start, propulsion_start, True)
+                self.stats.failure_reason = f"{phase.phaseType.name.lower()}_error"
                 return -1        
     
         return 0
 
-    def run_mission2(self) -> float:
+    def _recordPhase(self, phaseType: PhaseType, t_start: float, steps_start: int, propulsion_start: int, failed: bool):
+        self.stats.phases[phaseType.name].add(PhaseStats(
+            calls=1,
+            seconds=time.perf_counter() - t_start,
+            steps=len(self.stateLog) - steps_start,
+            propulsion_calls=sum(call_counts.values()) - propulsion_start,
+            failures=int(failed)))
+
+    def run_mission2(self, return_stats: bool = False):
+        """(m_fuel, phase), or (-1, -1) on failure; with return_stats, (that result, MissionStats)"""
+        result = self._run_mission2()
+        return (result, self.stats) if return_stats else result
+
+    def run_mission3(self, return_stats: bool = False):
+        """(N_laps, phase, time), or -1 on failure; with return_stats, (that result, MissionStats)"""
+        result = self._run_mission3()
+        return (result, self.stats) if return_stats else result
+
+    def _run_mission2(self):
 
         result = 0
         
@@ -276,11 +439,18 @@ class MissionAnalyzer():
         last_state.N_laps = 3   
         last_z_pos = last_state.position[2] 
         last_battery_voltage = last_state.battery_voltage 
-        if(result == -1 or last_z_pos < 20 or last_battery_voltage < self.presetValues.min_battery_voltage): return -1,-1
+        if result != -1:
+            if last_z_pos < M2_MIN_FINAL_ALTITUDE:
+                self.stats.failure_reason = 'final_altitude'
+            elif last_battery_voltage < self.presetValues.min_battery_voltage:
+                self.stats.failure_reason = 'battery_voltage'
+            else:
+                self.stats.failure_reason = ""
+        if(result == -1 or last_z_pos < M2_MIN_FINAL_ALTITUDE or last_battery_voltage < self.presetValues.min_battery_voltage): return -1,-1
         
         return self.m_fuel, self.state.phase
 
-    def run_mission3(self) -> float:
+    def _run_mission3(self):
         result = 0
         mission3 = [
                 MissionConfig(PhaseType.TAKEOFF, []),
@@ -321,9 +491,14 @@ class MissionAnalyzer():
             lap_start_index = len(self.stateLog)
             self.state.N_laps += 1
             
+            t_lap = time.perf_counter()
             result = self.run_mission(lap2,clearState=False)
+            self.stats.laps += 1
+            self.stats.lap_seconds.append(time.perf_counter() - t_lap)
             if(result == -1): return -1
             if(result == -2):
+                # time / voltage limit ends mission 3, it is not a failure
+                self.stats.failure_reason = ""
                 self.state.N_laps -= 1
                 return self.state.N_laps, self.state.phase, self.state.time
             
@@ -348,6 +523,7 @@ class MissionAnalyzer():
             L,_ = self.calculate_Lift_and_Loadfactor(CL,float(speed))
             return float(L-self.weight)
 
+        from scipy.optimize import fsolve
         alpha_solution = fsolve(equation, 5, xtol=1e-4, maxfev=1000)
 
         fast_sol = self.calculate_level_alpha_fast(v)
@@ -382,6 +558,13 @@ class MissionAnalyzer():
         L = 0.5 * rho * speed**2 * self.analResult.Sref * CL
         return L, L/self.weight 
     
+    def setAcceleration(self, a_x, a_y, a_z):
+        """Writes into the state's acceleration array instead of replacing it (logState copies it)"""
+        acceleration = self.state.acceleration
+        acceleration[0] = a_x
+        acceleration[1] = a_y
+        acceleration[2] = a_z
+
     def isBelowFlapTransition(self):
         return self.state.position[2] < self.presetValues.h_flap_transition  
     
@@ -571,8 +754,10 @@ class MissionAnalyzer():
                     
             if (self.isBelowFlapTransition()):
                 CL = self.analResult.CL_flap_max
+                CD = self.analResult.CD_flap_max
             else:
                 CL = float(self.CL_func(alpha_w_deg))
+                CD = float(self.CD_func(alpha_w_deg))
                 
             speed = fast_norm(self.state.velocity)  
 
@@ -596,20 +781,16 @@ class MissionAnalyzer():
             
             T_climb = thrust_per_motor * self.presetValues.number_of_motor * g # total N
             
-            self.state.acceleration = RK4_step(self.state.velocity,self.dt,
-                         lambda v: calculate_acceleration_climb(v, 
-                                                                self.missionParam.m_takeoff,
-                                                                self.weight,
-                                                                self.analResult.Sref,
-                                                                self.CL_func,
-                                                                self.CD_func,
-                                                                self.analResult.CL_flap_max,
-                                                                self.analResult.CD_flap_max,
-                                                                alpha_w_deg,
-                                                                gamma_rad,
-                                                                T_climb,
-                                                                not self.isBelowFlapTransition()
-                                                                ))
+            vx, vy, vz = self.state.velocity.tolist()
+            a_x, a_z = RK4_climb(vx, vy, vz, self.dt,
+                                 self.missionParam.m_takeoff,
+                                 self.weight,
+                                 self.analResult.Sref,
+                                 CL, CD,
+                                 alpha_w_deg,
+                                 float(gamma_rad),
+                                 T_climb)
+            self.setAcceleration(a_x, 0.0, a_z)
             self.state.velocity[2] += self.state.acceleration[2]*self.dt
             if direction == 'right':
                 self.state.velocity[0] += self.state.acceleration[0]*self.dt
@@ -694,11 +875,13 @@ class MissionAnalyzer():
 
                 self.updateBatteryState(self.state.battery_SoC)
     
-                self.state.acceleration = RK4_step(self.state.velocity,self.dt,
-                             lambda v: calculate_acceleration_level(v,self.missionParam.m_takeoff, 
-                                                                    self.analResult.Sref,
-                                                                    self.CD_func, alpha_w_deg,
-                                                                    T_cruise))
+                vx, vy, vz = self.state.velocity.tolist()
+                a_x = RK4_level(vx, vy, vz, self.dt,
+                                self.missionParam.m_takeoff,
+                                self.analResult.Sref,
+                                float(self.CD_func(alpha_w_deg)), alpha_w_deg,
+                                T_cruise)
+                self.setAcceleration(a_x, 0.0, 0.0)
                 if abs(self.state.acceleration[0]) > 0.1 : cruise_flag = 0
             else:
                 
@@ -716,11 +899,13 @@ class MissionAnalyzer():
                 T_climb = self.state.thrust * g # total N
                 self.updateBatteryState(self.state.battery_SoC)
 
-                self.state.acceleration =  RK4_step(self.state.velocity,self.dt,
-                             lambda v: calculate_acceleration_level(v,self.missionParam.m_takeoff, 
-                                                                    self.analResult.Sref,
-                                                                    self.CD_func, alpha_w_deg,
-                                                                    T_climb))
+                vx, vy, vz = self.state.velocity.tolist()
+                a_x = RK4_level(vx, vy, vz, self.dt,
+                                self.missionParam.m_takeoff,
+                                self.analResult.Sref,
+                                float(self.CD_func(alpha_w_deg)), alpha_w_deg,
+                                T_climb)
+                self.setAcceleration(a_x, 0.0, 0.0)
 
                 
             # Update Acc, Vel, position
@@ -940,6 +1125,37 @@ class MissionAnalyzer():
 #########################################################
 
 
+def saveAnalyzerSnapshot(analyzer:MissionAnalyzer, path:str, tableDir:str = SNAPSHOT_TABLE_DIR):
+    """Pickles the prepared analyzer (converted aircraft, coefficient tables, current PlaneState and log) to path.
+    The propeller / battery tables are written once to tableDir/<digest>.npy and referenced by digest."""
+    state = analyzer.__getstate__()
+    os.makedirs(tableDir, exist_ok=True)
+    for name, key in analyzer.table_keys.items():
+        tablePath = os.path.join(tableDir, key + ".npy")
+        if not os.path.isfile(tablePath):
+            tmpPath = f"{tablePath}.{os.getpid()}.tmp"
+            with open(tmpPath, 'wb') as f:
+                np.save(f, state[name])
+            os.replace(tmpPath, tablePath)
+        state.pop(name)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmpPath = f"{path}.{os.getpid()}.tmp"
+    with open(tmpPath, 'wb') as f:
+        pickle.dump({'version': 1, 'state': state}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmpPath, path)
+
+def loadAnalyzerSnapshot(path:str, tableDir:str = SNAPSHOT_TABLE_DIR) -> MissionAnalyzer:
+    """Analyzer saved by saveAnalyzerSnapshot; tables already held by this process are not read again"""
+    with open(path, 'rb') as f:
+        state = pickle.load(f)['state']
+    for name, key in state['table_keys'].items():
+        state[name] = _tables[key] if key in _tables else np.load(os.path.join(tableDir, key + ".npy"))
+    analyzer = MissionAnalyzer.__new__(MissionAnalyzer)
+    analyzer.__setstate__(state)
+    return analyzer
+
+
 def RK4_step(v, dt, func):
     """ Given v and a = f(v), solve for (v(t+dt)-v(dt))/dt or approximately a(t+dt/2)"""
 
@@ -950,6 +1166,56 @@ def RK4_step(v, dt, func):
     a4 = func(v + a3 * dt)
     return (a1 + 2*(a2 + a3) + a4) * (1/6)
 
+def RK4_level(vx, vy, vz, dt, m, Sref, CD, alpha_deg, T):
+    """ RK4_step of calculate_acceleration_level on float scalars; returns a_x
+    CD and alpha are fixed within the step, so only the x speed changes between the stages"""
+    k = 0.5 * rho * Sref * CD
+    thrust = T * math.cos(math.radians(alpha_deg))
+    yz = vy*vy + vz*vz
+    dt2 = dt/2
+    a1 = (thrust - k * (vx*vx + yz)) / m
+    x = vx + a1 * dt2
+    a2 = (thrust - k * (x*x + yz)) / m
+    x = vx + a2 * dt2
+    a3 = (thrust - k * (x*x + yz)) / m
+    x = vx + a3 * dt
+    a4 = (thrust - k * (x*x + yz)) / m
+    return (a1 + 2*(a2 + a3) + a4) * (1/6)
+
+def RK4_climb(vx, vy, vz, dt, m, Weight, Sref, CL, CD, alpha_deg, gamma_rad, T_climb):
+    """ RK4_step of calculate_acceleration_climb on float scalars; returns (a_x, a_z)
+    CL / CD are the flap or clean values picked by the caller"""
+    theta_rad = gamma_rad + math.radians(alpha_deg)
+    sin_g = math.sin(gamma_rad)
+    cos_g = math.cos(gamma_rad)
+    q = 0.5 * rho * Sref
+    # a = (c - k * speed^2) / m for both components
+    cx = T_climb * math.cos(theta_rad)
+    cz = T_climb * math.sin(theta_rad) - Weight
+    kx = q * (CL * sin_g + CD * cos_g)
+    kz = q * (CD * sin_g - CL * cos_g)
+    vy2 = vy*vy
+    dt2 = dt/2
+    s = vx*vx + vy2 + vz*vz
+    ax1 = (cx - kx * s) / m
+    az1 = (cz - kz * s) / m
+    x = vx + ax1 * dt2
+    z = vz + az1 * dt2
+    s = x*x + vy2 + z*z
+    ax2 = (cx - kx * s) / m
+    az2 = (cz - kz * s) / m
+    x = vx + ax2 * dt2
+    z = vz + az2 * dt2
+    s = x*x + vy2 + z*z
+    ax3 = (cx - kx * s) / m
+    az3 = (cz - kz * s) / m
+    x = vx + ax3 * dt
+    z = vz + az3 * dt
+    s = x*x + vy2 + z*z
+    ax4 = (cx - kx * s) / m
+    az4 = (cz - kz * s) / m
+    return (ax1 + 2*(ax2 + ax3) + ax4) * (1/6), (az1 + 2*(az2 + az3) + az4) * (1/6)
+
 def fast_norm(v):
     """Faster alternative to np.linalg.norm for 3D vectors"""
     return np.sqrt(v[0]*v[0] + v[1]*v[1] + v[2]*v[2])
@@ -1042,6 +1308,7 @@ def get_state_df(stateLog):
 
 def visualize_mission(stateLog):
     """Generate all visualization plots for the mission in a single window"""
+    import matplotlib.pyplot as plt
     stateLog = get_state_df(stateLog)
 
     fig = plt.figure(figsize=(15, 8))
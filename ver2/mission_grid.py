@@ -2,14 +2,21 @@ import numpy as np
 from itertools import product
 import time
 from setup_dataclass import *
-from vsp_analysis import  loadAnalysisResults
-from mission_analysis import MissionAnalyzer, visualize_mission
+from results_store import loadAnalysisResults
+from mission_analysis import MissionAnalyzer, visualize_mission, M2_MIN_FINAL_ALTITUDE
 from internal_dataclass import *
+from cost_model import writeTimingRecords
+from mission_memo import MissionMemo, missionResultID, analysisDigest
+from telemetry import WorkerTelemetry
 import os 
 import os.path
 import pandas as pd
 import time
 import csv
+import heapq
+import json
+from collections import Counter
+from dataclasses import asdict
 
 def runMissionGridSearch(hashVal:str, 
                         presetValues:PresetValues,
@@ -17,24 +24,32 @@ def runMissionGridSearch(hashVal:str,
                         propulsionSpecs:PropulsionSpecs,
                         csvPath:str = "data/aircraft.csv",
                         mission2Out:str="",
-                        mission3Out:str=""
+                        mission3Out:str="",
+                        timingPath:str="",
+                        memo:MissionMemo = None,
+                        metricsPath:str="",
+                        telemetry:WorkerTelemetry = None
                         ) :
 
 
+    t_load = time.perf_counter()
     analysisResults = loadAnalysisResults(hashVal, csvPath)
+    aeroDigest = analysisDigest(analysisResults)
+    if memo is not None:
+        memo.refresh()
     ## Variable lists using for optimization
     
-    MTOW_list = np.arange(
-            missionParamConstraints.MTOW_min, 
-            missionParamConstraints.MTOW_max + missionParamConstraints.MTOW_analysis_interval/2, 
-            missionParamConstraints.MTOW_analysis_interval        
-    )
-    MTOW_min_condition = max(missionParamConstraints.wing_loading_min * analysisResults.Sref * 1e-6,
-                             analysisResults.m_empty/1000)
-    MTOW_max_condition = missionParamConstraints.wing_loading_max * analysisResults.Sref * 1e-6
-    MTOW_list = MTOW_list[(MTOW_list >= MTOW_min_condition) & (MTOW_list <= MTOW_max_condition)]
+    MTOW_list = getMTOWList(missionParamConstraints, analysisResults.Sref, analysisResults.m_empty)
     if len(MTOW_list) == 0: 
         print(f"All MTOW options exceed wing loading limit")
+        # The hash still shows up in the timing / metrics files, with no combinations run
+        if timingPath:
+            writeTimingRecords([{'stage': 'mission2', 'hash': hashVal, 'MTOW': np.nan, 'max_speed': np.nan,
+                                 'combinations': 0, 'seconds': time.perf_counter() - t_load}], timingPath)
+        if metricsPath:
+            metrics = {}
+            addMetrics(metrics, 'mission2', np.nan, failure_reason='wing_loading')
+            writeMissionMetrics(hashVal, metrics, metricsPath)
         return
 
     M2_max_speed_list = np.arange(
@@ -104,12 +119,28 @@ def runMissionGridSearch(hashVal:str,
     step2 = max(int(M2_total/100) , 1)
     step3 = max(int(M3_total/100) , 1)
 
+    # seconds spent per (mission, MTOW, max_speed) cell, consumed by the cost model
+    timings = {}
+    # reason code -> combinations rejected by MissionAnalyzer.screen_feasibility
+    screened = Counter()
+    # (mission, MTOW) -> (summed MissionStats, outcome counts), written to metricsPath
+    metrics = {}
+
+    def outcome(stage, MTOW, stats=None, failure_reason="", memo=False):
+        addMetrics(metrics, stage, MTOW, stats, failure_reason, memo)
+        if telemetry is not None and failure_reason:
+            telemetry.fail(f"{stage} {'memo_' if memo else ''}{failure_reason}")
+
     # Test each M2_combination
     for i, (MTOW, M2_max_speed, M2_climb_thrust_ratio, M2_turn_thrust_ratio, M2_level_thrust_ratio) in enumerate(M2_combinations):
         
         
         if (i+1)%step2==0:
             print(f"[{time.strftime('%Y-%m-%d %X')}] Mission2 Grid Progress: {i+1}/{M2_total} configurations")
+        if telemetry is not None:
+            telemetry.count('mission2_combinations')
+
+        t_start = time.perf_counter()
 
         # Create mission 2 parameters for this combination
         mission2Params = MissionParameters(
@@ -124,12 +155,35 @@ def runMissionGridSearch(hashVal:str,
             propeller_data_path=propulsionSpecs.M2_propeller_data_path,
         )
 
+        # Combinations computed by any earlier run come from the memo
+        resultID = missionResultID(hashVal, 2, mission2Params, presetValues, propulsionSpecs, aeroDigest)
+        entry = memo.get(resultID) if memo is not None else None
+        if entry is not None:
+            if entry['status'] == 'ok':
+                # replayed rows are stamped with this run, like the rows it computes
+                row = {**entry['row'], 'timestamp': time.strftime("%Y-%m-%d %X")}
+                writeMissionAnalysisResults(hashVal, pd.DataFrame([row]), presetValues, propulsionSpecs, readcsvPath = csvPath, writecsvPath = mission2Out,
+                                            resultID = resultID, m_empty = analysisResults.m_empty)
+            outcome('mission2', MTOW, failure_reason="" if entry['status'] == 'ok' else entry['status'], memo=True)
+            continue
+
         try:
             mission2Analyzer = MissionAnalyzer(analysisResults, mission2Params, presetValues, propulsionSpecs)
-            fuel_weight, flight_time = mission2Analyzer.run_mission2()
+            reason = mission2Analyzer.screen_feasibility(h_final=M2_MIN_FINAL_ALTITUDE)
+            if reason:
+                screened['mission2 ' + reason] += 1
+                outcome('mission2', MTOW, failure_reason='screened_' + reason)
+                addTiming(timings, 'mission2', MTOW, M2_max_speed, t_start)
+                continue
+            (fuel_weight, flight_time), stats = mission2Analyzer.run_mission2(return_stats=True)
+            outcome('mission2', MTOW, stats,
+                    stats.failure_reason if (fuel_weight == -1 and flight_time == -1) else "")
             
             if(fuel_weight == -1 and flight_time == -1):
                 #print("mission2 fail")
+                if memo is not None:
+                    memo.put(resultID, 'fail')
+                addTiming(timings, 'mission2', MTOW, M2_max_speed, t_start)
                 continue
             
             obj2 = fuel_weight * 2.204 / flight_time 
@@ -147,13 +201,19 @@ def runMissionGridSearch(hashVal:str,
                 'mission2_level_thrust_ratio': M2_level_thrust_ratio,
             }
     
+            if memo is not None:
+                memo.put(resultID, 'ok', results)
             results = pd.DataFrame([results])
     
-            writeMissionAnalysisResults(hashVal, results, presetValues, propulsionSpecs, writecsvPath = mission2Out)
+            writeMissionAnalysisResults(hashVal, results, presetValues, propulsionSpecs, readcsvPath = csvPath, writecsvPath = mission2Out,
+                                        resultID = resultID, m_empty = analysisResults.m_empty)
+            addTiming(timings, 'mission2', MTOW, M2_max_speed, t_start)
 
         except Exception as e:
             #print(f"\nFailed with throttles M2 : Climb({M2_climb_thrust_ratio:.2f}) Trun({M2_turn_thrust_ratio:.2f}) Level ({M2_level_thrust_ratio:.2f})")
             print(f"Error : {str(e)}")
+            outcome('mission2', MTOW, failure_reason='error')
+            addTiming(timings, 'mission2', MTOW, M2_max_speed, t_start)
             continue
    
     print("\nDone Mission2 Analysis ^_^")
@@ -164,6 +224,10 @@ def runMissionGridSearch(hashVal:str,
     for i, (M3_max_speed, M3_climb_thrust_ratio, M3_turn_thrust_ratio, M3_level_thrust_ratio) in enumerate(M3_combinations):
         if (i+1)%step3==0:
             print(f"[{time.strftime('%Y-%m-%d %X')}] Mission3 Grid Progress: {i+1}/{M3_total} configurations")
+        if telemetry is not None:
+            telemetry.count('mission3_combinations')
+
+        t_start = time.perf_counter()
 
         # Create mission 3 parameters for this combination
         mission3Params = MissionParameters(
@@ -178,12 +242,36 @@ def runMissionGridSearch(hashVal:str,
             propeller_data_path=propulsionSpecs.M3_propeller_data_path
         )
 
+        resultID = missionResultID(hashVal, 3, mission3Params, presetValues, propulsionSpecs, aeroDigest)
+        entry = memo.get(resultID) if memo is not None else None
+        if entry is not None:
+            if entry['status'] == 'ok':
+                # replayed rows are stamped with this run, like the rows it computes
+                row = {**entry['row'], 'timestamp': time.strftime("%Y-%m-%d %X")}
+                writeMissionAnalysisResults(hashVal, pd.DataFrame([row]), presetValues, propulsionSpecs, readcsvPath = csvPath, writecsvPath = mission3Out,
+                                            resultID = resultID, m_empty = analysisResults.m_empty)
+            outcome('mission3', analysisResults.m_empty/1000, failure_reason="" if entry['status'] == 'ok' else entry['status'], memo=True)
+            continue
+
         try:
             mission3Analyzer = MissionAnalyzer(analysisResults, mission3Params, presetValues, propulsionSpecs)
-            N_laps, phase, final_time = mission3Analyzer.run_mission3()
+            reason = mission3Analyzer.screen_feasibility()
+            if reason:
+                screened['mission3 ' + reason] += 1
+                outcome('mission3', analysisResults.m_empty/1000, failure_reason='screened_' + reason)
+                addTiming(timings, 'mission3', analysisResults.m_empty/1000, M3_max_speed, t_start)
+                continue
+            mission3Result, stats = mission3Analyzer.run_mission3(return_stats=True)
+            outcome('mission3', analysisResults.m_empty/1000, stats,
+                    stats.failure_reason if mission3Result == -1 else "")
+            # run_mission3 returns a bare -1 on failure
+            N_laps, phase, final_time = mission3Result if mission3Result != -1 else (-1, None, None)
             
             if(N_laps==-1):
                 print("mission3 fail (N_laps == 1)")
+                if memo is not None:
+                    memo.put(resultID, 'fail')
+                addTiming(timings, 'mission3', analysisResults.m_empty/1000, M3_max_speed, t_start)
                 continue
             obj3 = N_laps - 1 + 2.5 / (presetValues.m_x1 /1000 * 2.204 )
 
@@ -200,18 +288,79 @@ def runMissionGridSearch(hashVal:str,
                 'final_time' : final_time
             }
     
+            if memo is not None:
+                memo.put(resultID, 'ok', results)
             results = pd.DataFrame([results])
     
-            writeMissionAnalysisResults(hashVal, results, presetValues, propulsionSpecs, writecsvPath = mission3Out)
+            writeMissionAnalysisResults(hashVal, results, presetValues, propulsionSpecs, readcsvPath = csvPath, writecsvPath = mission3Out,
+                                        resultID = resultID, m_empty = analysisResults.m_empty)
+            addTiming(timings, 'mission3', analysisResults.m_empty/1000, M3_max_speed, t_start)
 
         except Exception as e:
             #print(f"\nFailed with throttles M3 : Climb({M3_climb_thrust_ratio:.2f}) Trun({M3_turn_thrust_ratio:.2f}) Level ({M3_level_thrust_ratio:.2f})")
             print(f"Error : {str(e)}")
+            outcome('mission3', analysisResults.m_empty/1000, failure_reason='error')
+            addTiming(timings, 'mission3', analysisResults.m_empty/1000, M3_max_speed, t_start)
             continue
    
     print("\nDone Mission3 Analysis ^_^")
-
-def writeMissionAnalysisResults(hashVal:str, results, presetValues:PresetValues, propulsionSpecs:PropulsionSpecs, readcsvPath:str = "data/aircraft.csv", writecsvPath:str = "data/total_results.csv"):
+    if screened:
+        print("Screened out before simulation: " + ", ".join(f"{reason} {count}" for reason, count in screened.items()))
+
+    if timingPath:
+        writeTimingRecords([
+            {'stage': stage, 'hash': hashVal, 'MTOW': MTOW, 'max_speed': max_speed,
+             'combinations': count, 'seconds': seconds}
+            for (stage, MTOW, max_speed), (count, seconds) in timings.items()
+        ], timingPath)
+    if metricsPath:
+        writeMissionMetrics(hashVal, metrics, metricsPath)
+
+def getMTOWList(missionParamConstraints:MissionParamConstraints, Sref:float, m_empty:float) -> np.ndarray:
+    """MTOW candidates (kg) within the wing loading limits for an aircraft with Sref (mm2) and m_empty (g)"""
+    MTOW_list = np.arange(
+            missionParamConstraints.MTOW_min, 
+            missionParamConstraints.MTOW_max + missionParamConstraints.MTOW_analysis_interval/2, 
+            missionParamConstraints.MTOW_analysis_interval        
+    )
+    MTOW_min_condition = max(missionParamConstraints.wing_loading_min * Sref * 1e-6,
+                             m_empty/1000)
+    MTOW_max_condition = missionParamConstraints.wing_loading_max * Sref * 1e-6
+    return MTOW_list[(MTOW_list >= MTOW_min_condition) & (MTOW_list <= MTOW_max_condition)]
+
+def addTiming(timings:dict, stage:str, MTOW:float, max_speed:float, t_start:float):
+    key = (stage, round(float(MTOW), 3), round(float(max_speed), 3))
+    count, seconds = timings.get(key, (0, 0.0))
+    timings[key] = (count + 1, seconds + time.perf_counter() - t_start)
+
+def addMetrics(metrics:dict, stage:str, MTOW:float, stats:MissionStats = None, failure_reason:str = "", memo:bool = False):
+    """Count one combination; memo hits are counted as memo_ok / memo_<status> and carry no stats"""
+    key = (stage, round(float(MTOW), 3))
+    total, outcomes = metrics.setdefault(key, (MissionStats(), Counter()))
+    if stats is not None:
+        total.add(stats)
+    outcomes[('memo_' if memo else '') + (failure_reason or 'ok')] += 1
+
+def writeMissionMetrics(hashVal:str, metrics:dict, metricsPath:str):
+    """One row per (mission, MTOW, phase) plus a TOTAL row with the outcome counts of the combinations"""
+    records = []
+    for (stage, MTOW), (total, outcomes) in metrics.items():
+        common = {'stage': stage, 'hash': hashVal, 'MTOW': MTOW}
+        for phase, phaseStats in total.phases.items():
+            records.append({**common, 'phase': phase, **asdict(phaseStats),
+                            'laps': 0, 'lap_seconds': 0.0, 'outcomes': ""})
+        records.append({**common, 'phase': 'TOTAL',
+                        'calls': sum(outcomes.values()),
+                        'seconds': sum(p.seconds for p in total.phases.values()),
+                        'steps': sum(p.steps for p in total.phases.values()),
+                        'propulsion_calls': sum(p.propulsion_calls for p in total.phases.values()),
+                        'failures': sum(outcomes.values()) - outcomes['ok'] - outcomes['memo_ok'],
+                        'laps': total.laps, 'lap_seconds': sum(total.lap_seconds),
+                        'outcomes': json.dumps(dict(outcomes))})
+    writeTimingRecords(records, metricsPath)
+
+def writeMissionAnalysisResults(hashVal:str, results, presetValues:PresetValues, propulsionSpecs:PropulsionSpecs, readcsvPath:str = "data/aircraft.csv", writecsvPath:str = "data/total_results.csv",
+                                resultID:str = None, m_empty:float = None):
     # existing_df = pd.read_csv(readcsvPath, sep='|', encoding='utf-8')
     # base_row = existing_df[existing_df['hash'] == hashVal]
     # base_row_dict = base_row.to_dict(orient="records")[0]
@@ -223,18 +372,20 @@ def writeMissionAnalysisResults(hashVal:str, results, presetValues:PresetValues,
  
     # new_row_df = pd.merge(common_row, results, on = 'hash')
 
-    existing_df = pd.read_csv(readcsvPath, sep='|', encoding='utf-8')
-    base_row = existing_df[existing_df['hash'] == hashVal]
-    m_empty_value = base_row['m_empty'].values[0]
+    if m_empty is None:
+        existing_df = pd.read_csv(readcsvPath, sep='|', encoding='utf-8')
+        base_row = existing_df[existing_df['hash'] == hashVal]
+        m_empty = base_row['m_empty'].values[0]
 
-    resultID = pd.util.hash_pandas_object(results, index=False)
+    # Deterministic key from mission_memo.missionResultID; the row hash is only a fallback for other callers
+    if resultID is None:
+        resultID = "'" + str(pd.util.hash_pandas_object(results, index=False).iloc[0]) + "'"
     results = results.assign(
         **vars(presetValues),
         **vars(propulsionSpecs),
-        m_empty=m_empty_value
+        m_empty=m_empty
     )
-    results['resultID'] = str(resultID.iloc[0])
-    results['resultID'] = "'" + results['resultID'] + "'"
+    results['resultID'] = resultID
 
     if not os.path.isfile(writecsvPath):
         df_copy = results.copy()
@@ -248,61 +399,271 @@ def writeMissionAnalysisResults(hashVal:str, results, presetValues:PresetValues,
 def format_number(n: float) -> str:
     return f"{n:.6f}"  # 6 decimal places should be sufficient for most cases
 
+# Columns carried into organized_results from each mission
+M2_RESULT_COLUMNS = ['MTOW', 'fuel_weight', 'span', 'AR', 'taper', 'twist', 'M2_max_speed',
+                     'mission2_climb_thrust_ratio', 'mission2_turn_thrust_ratio', 'mission2_level_thrust_ratio']
+M3_RESULT_COLUMNS = ['M3_max_speed', 'mission3_climb_thrust_ratio', 'mission3_turn_thrust_ratio', 'mission3_level_thrust_ratio']
+ORGANIZED_COLUMNS = ['resultID', 'hash', 'MTOW', 'fuel_weight', 'span', 'AR', 'taper', 'twist', 'M2_max_speed', 'M3_max_speed',
+                     'mission2_climb_thrust_ratio', 'mission2_turn_thrust_ratio', 'mission2_level_thrust_ratio',
+                     'mission3_climb_thrust_ratio', 'mission3_turn_thrust_ratio', 'mission3_level_thrust_ratio',
+                     'flight_time', 'N_laps', 'score2', 'score3', 'SCORE']
+
+def scorePairs(M2_df:pd.DataFrame, M3_df:pd.DataFrame, max_obj2:float, max_obj3:float,
+               score_weight_ratio:float, chunk_size:int = 1000000):
+    """Yields organized_results rows of every M2 x M3 pair of one aircraft, at most ~chunk_size rows at a time"""
+    score3 = M3_df['objective_3'].to_numpy(float) / max_obj3 + 2
+    n3 = len(M3_df)
+    if n3 == 0:
+        return
+    M3_resultID = M3_df['resultID'].astype(str).to_numpy()
+    rows_per_chunk = max(chunk_size // n3, 1)
+
+    for start in range(0, len(M2_df), rows_per_chunk):
+        M2_chunk = M2_df.iloc[start:start + rows_per_chunk]
+        n2 = len(M2_chunk)
+        score2 = M2_chunk['objective_2'].to_numpy(float) / max_obj2 + 1
+        SCORE = score2[:, np.newaxis] * score_weight_ratio + score3[np.newaxis, :] * (1 - score_weight_ratio)
+
+        organized = {
+            'resultID': pd.Series(np.repeat(M2_chunk['resultID'].astype(str).to_numpy(), n3)) + "_" + np.tile(M3_resultID, n2),
+            'hash': np.repeat(M2_chunk['hash'].astype(str).to_numpy(), n3),
+        }
+        for col in M2_RESULT_COLUMNS + ['flight_time']:
+            organized[col] = np.repeat(M2_chunk[col].to_numpy(), n3)
+        for col in M3_RESULT_COLUMNS:
+            organized[col] = np.tile(M3_df[col].to_numpy(), n2)
+        organized['N_laps'] = np.tile(M3_df['N_laps'].to_numpy() - 1, n2)     # N-laps before executing X-1
+        organized['score2'] = np.repeat(score2, n3)
+        organized['score3'] = np.tile(score3, n2)
+        organized['SCORE'] = SCORE.ravel()
+        yield pd.DataFrame(organized)[ORGANIZED_COLUMNS]
+
 def ResultAnalysis(presetValues:PresetValues,
                    readM2csvPath:str = "data/M2_total_results.csv",
                    readM3csvPath:str = "data/M3_total_results.csv",
-                   writecsvPath:str = "data/organized_results.csv"):
-    
-    if not os.path.isfile(writecsvPath):
-        df = pd.DataFrame(columns=['hash'])
-    else:
-        df = pd.read_csv(writecsvPath, sep='|', encoding='utf-8')
-
-    M2_total_df = pd.read_csv(readM2csvPath, sep='|', encoding='utf-8')
-    M3_total_df = pd.read_csv(readM3csvPath, sep='|', encoding='utf-8')
+                   writecsvPath:str = "data/organized_results.csv",
+                   chunk_size:int = 1000000,
+                   top_k:int = None,
+                   top_k_per_hash:bool = False):
+    """Scores M2 x M3 pairs of the same aircraft hash in chunks of ~chunk_size rows.
+    top_k keeps only the K best pairs overall (or per hash with top_k_per_hash) instead of all pairs.
+    Rows already in writecsvPath are kept for aircraft not in this run and replaced for the others.
+    max_SCORE is reported over the merged file, kept rows included."""
+
+    # A combination recomputed by a later run is appended again under the same resultID
+    M2_total_df = pd.read_csv(readM2csvPath, sep='|', encoding='utf-8').drop_duplicates(["resultID"], keep='last')
+    M3_total_df = pd.read_csv(readM3csvPath, sep='|', encoding='utf-8').drop_duplicates(["resultID"], keep='last')
 
     max_obj2 = M2_total_df['objective_2'].max()
     max_obj3 = M3_total_df['objective_3'].max()
 
-    combinations = list(product(M2_total_df.iterrows(), M3_total_df.iterrows()))
-
-    combined_data = []
-    for (_, row2), (_, row3) in combinations:
-        score2 = row2['objective_2'] / max_obj2 + 1
-        score3 = row3['objective_3'] / max_obj3 + 2
-        SCORE = score2 * presetValues.score_weight_ratio + score3 * (1 - presetValues.score_weight_ratio)
-        N_laps_for_score = row3['N_laps']-1     # N-laps before executing X-1
-        combined_data.append({
-            'resultID': f"{row2['resultID']}_{row3['resultID']}",  
-            'hash': f"{row2['hash']}", 
-            'MTOW': row2['MTOW'],
-            'fuel_weight': row2['fuel_weight'],
-            'span': row2['span'],
-            'AR': row2['AR'],
-            'taper': row2['taper'],
-            'twist': row2['twist'],
-            'M2_max_speed': row2['M2_max_speed'],
-            'M3_max_speed': row3['M3_max_speed'],
-            'mission2_climb_thrust_ratio': row2['mission2_climb_thrust_ratio'],
-            'mission2_turn_thrust_ratio': row2['mission2_turn_thrust_ratio'],
-            'mission2_level_thrust_ratio': row2['mission2_level_thrust_ratio'],
-            'mission3_climb_thrust_ratio': row3['mission3_climb_thrust_ratio'],
-            'mission3_turn_thrust_ratio': row3['mission3_turn_thrust_ratio'],
-            'mission3_level_thrust_ratio': row3['mission3_level_thrust_ratio'],
-            'flight_time': row2['flight_time'],
-            'N_laps': N_laps_for_score,
-            'score2': score2,
-            'score3': score3,
-            'SCORE': SCORE
+    hashes = M2_total_df['hash'].unique()
+    M3_groups = dict(tuple(M3_total_df.groupby('hash', sort=False)))
+
+    tmpPath = writecsvPath + ".tmp"
+    if os.path.exists(tmpPath):
+        os.remove(tmpPath)
+    def write(organized_df):
+        organized_df.to_csv(tmpPath, sep='|', encoding='utf-8', index=False, quoting=csv.QUOTE_NONE,
+                            mode='a', header=not os.path.isfile(tmpPath))
+
+    best_SCORE, best_row = -np.inf, None
+    if os.path.isfile(writecsvPath) and os.path.getsize(writecsvPath) > 0:
+        for existing_df in pd.read_csv(writecsvPath, sep='|', encoding='utf-8', chunksize=chunk_size):
+            kept_df = existing_df[~existing_df['hash'].isin(hashes)]
+            if len(kept_df) and kept_df['SCORE'].max() > best_SCORE:
+                best_SCORE, best_row = kept_df['SCORE'].max(), kept_df.loc[[kept_df['SCORE'].idxmax()]]
+            write(kept_df)
+
+    heap = []           # (SCORE, sequence, row) min-heap of the best top_k rows
+    sequence = 0
+    def flush_heap():
+        if heap:
+            write(pd.DataFrame([row for _, _, row in sorted(heap, key=lambda item: -item[0])], columns=ORGANIZED_COLUMNS))
+        heap.clear()
+
+    for hashVal, M2_df in M2_total_df.groupby('hash', sort=False):
+        M3_df = M3_groups.get(hashVal)
+        if M3_df is None:
+            continue
+        for organized_df in scorePairs(M2_df, M3_df, max_obj2, max_obj3, presetValues.score_weight_ratio, chunk_size):
+            SCORE = organized_df['SCORE'].to_numpy()
+            i_best = int(np.argmax(SCORE))
+            if SCORE[i_best] > best_SCORE:
+                best_SCORE, best_row = SCORE[i_best], organized_df.iloc[[i_best]]
+
+            if top_k is None:
+                write(organized_df)
+                continue
+            candidates = np.argpartition(-SCORE, min(top_k, len(SCORE)) - 1)[:top_k]
+            for i in candidates:
+                item = (SCORE[i], sequence, tuple(organized_df.iloc[i]))
+                sequence += 1
+                if len(heap) < top_k:
+                    heapq.heappush(heap, item)
+                elif item[0] > heap[0][0]:
+                    heapq.heapreplace(heap, item)
+        if top_k_per_hash:
+            flush_heap()
+    flush_heap()
+
+    if not os.path.isfile(tmpPath):
+        write(pd.DataFrame(columns=ORGANIZED_COLUMNS))
+    os.replace(tmpPath, writecsvPath)
+
+    # Watermarks for updateResultAnalysis; a top-K file cannot be extended pair by pair
+    statePath = _resultAnalysisStatePath(writecsvPath)
+    if top_k is None:
+        _writeResultAnalysisState(statePath, {
+            'M2': {'path': readM2csvPath, 'rows': len(M2_total_df)},
+            'M3': {'path': readM3csvPath, 'rows': len(M3_total_df)},
+            'max_obj2': float(max_obj2), 'max_obj3': float(max_obj3),
+            'score_weight_ratio': presetValues.score_weight_ratio,
+            'best': None if best_row is None else best_row.iloc[0].to_dict(),
+            'organized': _organizedFileMark(writecsvPath)
         })
-    
-    organized_df = pd.DataFrame(combined_data)
-    organized_df = pd.concat([df, organized_df]).drop_duplicates(["resultID"], keep='last')
-    organized_df.to_csv(writecsvPath, sep='|', encoding='utf-8', index=False, quoting=csv.QUOTE_NONE)
+    elif os.path.isfile(statePath):
+        os.remove(statePath)
+
+    print('\nmax_SCORE info : \n', best_row)
+
+def _resultAnalysisStatePath(writecsvPath:str) -> str:
+    return os.path.splitext(writecsvPath)[0] + "_state.json"
+
+def _organizedFileMark(writecsvPath:str) -> dict:
+    """Size and inode of the organized file when the state is saved. A rewrite (tmp + os.replace) changes
+    the inode, appends of an interrupted update only the size."""
+    stat = os.stat(writecsvPath)
+    return {'bytes': stat.st_size, 'inode': stat.st_ino}
+
+def _writeResultAnalysisState(statePath:str, state:dict):
+    tmpPath = statePath + ".tmp"
+    with open(tmpPath, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=1, default=lambda x: x.item() if isinstance(x, np.generic) else str(x))
+    os.replace(tmpPath, statePath)
+
+def _readResultRows(csvPath:str, start:int = 0, stop:int = None, hashes = None, chunk_size:int = 1000000) -> pd.DataFrame:
+    """Rows [start, stop) of a result file, optionally only those of the given hashes"""
+    selected = []
+    offset = 0
+    for chunk in pd.read_csv(csvPath, sep='|', encoding='utf-8', chunksize=chunk_size):
+        lo, hi = max(start - offset, 0), len(chunk) if stop is None else min(stop - offset, len(chunk))
+        offset += len(chunk)
+        if hi <= lo:
+            continue
+        chunk = chunk.iloc[lo:hi]
+        if hashes is not None:
+            chunk = chunk[chunk['hash'].isin(hashes)]
+        selected.append(chunk)
+        if stop is not None and offset >= stop:
+            break
+    if not selected:
+        return pd.read_csv(csvPath, sep='|', encoding='utf-8', nrows=0)
+    return pd.concat(selected)
+
+def updateResultAnalysis(presetValues:PresetValues,
+                         readM2csvPath:str = "data/M2_total_results.csv",
+                         readM3csvPath:str = "data/M3_total_results.csv",
+                         writecsvPath:str = "data/organized_results.csv",
+                         chunk_size:int = 1000000):
+    """Incremental ResultAnalysis for append-only M2/M3 result files.
+    Only pairs that involve rows added since the last call are scored and appended. When a new row raises
+    max_obj2 / max_obj3, the existing rows are rescaled in one chunked pass instead of being rebuilt.
+    Falls back to a full ResultAnalysis when there is no usable state. The state is saved last, with the
+    size of the organized file, so a killed update is rolled back by the next call."""
+    statePath = _resultAnalysisStatePath(writecsvPath)
+    state = None
+    if os.path.isfile(statePath) and os.path.isfile(writecsvPath):
+        with open(statePath, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+
+    # Pairs appended by an update that died before saving its state are cut off again; a rewrite
+    # the state does not know about (the inode changed) can not be undone, so it is rebuilt
+    recovered = False
+    if state is not None:
+        mark, current = state.get('organized'), _organizedFileMark(writecsvPath)
+        if mark is None or mark['inode'] != current['inode'] or current['bytes'] < mark['bytes']:
+            state = None
+        elif current['bytes'] > mark['bytes']:
+            print(f"Truncating {current['bytes'] - mark['bytes']} bytes appended to {writecsvPath} by an interrupted update")
+            os.truncate(writecsvPath, mark['bytes'])
+            recovered = True
+
+    M2_rows = sum(len(chunk) for chunk in pd.read_csv(readM2csvPath, sep='|', encoding='utf-8', usecols=['hash'], chunksize=chunk_size))
+    M3_rows = sum(len(chunk) for chunk in pd.read_csv(readM3csvPath, sep='|', encoding='utf-8', usecols=['hash'], chunksize=chunk_size))
+    if (state is None
+            or state['M2']['path'] != readM2csvPath or state['M3']['path'] != readM3csvPath
+            or state['score_weight_ratio'] != presetValues.score_weight_ratio
+            or M2_rows < state['M2']['rows'] or M3_rows < state['M3']['rows']
+            or state['M2']['rows'] == 0 or state['M3']['rows'] == 0):   # no normalizer yet
+        ResultAnalysis(presetValues, readM2csvPath, readM3csvPath, writecsvPath, chunk_size)
+        return
+
+    w2, w3 = state['M2']['rows'], state['M3']['rows']
+    if M2_rows == w2 and M3_rows == w3:
+        print('\nmax_SCORE info : \n', state['best'])
+        return
 
-    max_SCORE = organized_df['SCORE'].max()
-    max_SCORE_row = organized_df[organized_df['SCORE'] == max_SCORE]
-    print('\nmax_SCORE info : \n', max_SCORE_row)
+    new_M2_df = _readResultRows(readM2csvPath, start=w2, stop=M2_rows, chunk_size=chunk_size)
+    new_M3_df = _readResultRows(readM3csvPath, start=w3, stop=M3_rows, chunk_size=chunk_size)
+    hashes = set(new_M2_df['hash']) | set(new_M3_df['hash'])
+    old_M2_df = _readResultRows(readM2csvPath, stop=w2, hashes=hashes, chunk_size=chunk_size).drop_duplicates(["resultID"], keep='last')
+    old_M3_df = _readResultRows(readM3csvPath, stop=w3, hashes=hashes, chunk_size=chunk_size).drop_duplicates(["resultID"], keep='last')
+    # Rows appended again under a resultID that is already paired add no new pairs
+    new_M2_df = new_M2_df.drop_duplicates(["resultID"], keep='last')
+    new_M2_df = new_M2_df[~new_M2_df['resultID'].isin(old_M2_df['resultID'])]
+    new_M3_df = new_M3_df.drop_duplicates(["resultID"], keep='last')
+    new_M3_df = new_M3_df[~new_M3_df['resultID'].isin(old_M3_df['resultID'])]
+
+    max_obj2 = max(state['max_obj2'], new_M2_df['objective_2'].max()) if len(new_M2_df) else state['max_obj2']
+    max_obj3 = max(state['max_obj3'], new_M3_df['objective_3'].max()) if len(new_M3_df) else state['max_obj3']
+    ratio = presetValues.score_weight_ratio
+    best = state['best']
+
+    # score = objective / max + offset, so a new maximum only rescales (score - offset)
+    if max_obj2 != state['max_obj2'] or max_obj3 != state['max_obj3']:
+        tmpPath = writecsvPath + ".tmp"
+        best = None
+        for i, organized_df in enumerate(pd.read_csv(writecsvPath, sep='|', encoding='utf-8', chunksize=chunk_size)):
+            organized_df['score2'] = (organized_df['score2'] - 1) * state['max_obj2'] / max_obj2 + 1
+            organized_df['score3'] = (organized_df['score3'] - 2) * state['max_obj3'] / max_obj3 + 2
+            organized_df['SCORE'] = organized_df['score2'] * ratio + organized_df['score3'] * (1 - ratio)
+            if len(organized_df) and (best is None or organized_df['SCORE'].max() > best['SCORE']):
+                best = organized_df.loc[organized_df['SCORE'].idxmax()].to_dict()
+            organized_df.to_csv(tmpPath, sep='|', encoding='utf-8', index=False, quoting=csv.QUOTE_NONE,
+                                mode='w' if i == 0 else 'a', header=(i == 0))
+        os.replace(tmpPath, writecsvPath)
+
+    # After a truncation the file is only trusted up to its resultIDs: pairs already in it are not appended again
+    paired = set()
+    if recovered:
+        for chunk in pd.read_csv(writecsvPath, sep='|', encoding='utf-8', usecols=['resultID', 'hash'], chunksize=chunk_size):
+            paired.update(chunk.loc[chunk['hash'].isin(hashes), 'resultID'].astype(str))
+
+    # new M2 x all M3, then old M2 x new M3
+    all_M3_groups = dict(tuple(pd.concat([old_M3_df, new_M3_df]).groupby('hash', sort=False)))
+    new_M3_groups = dict(tuple(new_M3_df.groupby('hash', sort=False)))
+    pairs = [(new_M2_df, all_M3_groups), (old_M2_df, new_M3_groups)]
+    for M2_df, M3_groups in pairs:
+        for hashVal, M2_hash_df in M2_df.groupby('hash', sort=False):
+            if hashVal not in M3_groups:
+                continue
+            for organized_df in scorePairs(M2_hash_df, M3_groups[hashVal], max_obj2, max_obj3, ratio, chunk_size):
+                if paired:
+                    organized_df = organized_df[~organized_df['resultID'].isin(paired)]
+                    if organized_df.empty:
+                        continue
+                if best is None or organized_df['SCORE'].max() > best['SCORE']:
+                    best = organized_df.loc[organized_df['SCORE'].idxmax()].to_dict()
+                organized_df.to_csv(writecsvPath, sep='|', encoding='utf-8', index=False, quoting=csv.QUOTE_NONE,
+                                    mode='a', header=False)
+
+    state.update({'M2': {'path': readM2csvPath, 'rows': M2_rows}, 'M3': {'path': readM3csvPath, 'rows': M3_rows},
+                  'max_obj2': float(max_obj2), 'max_obj3': float(max_obj3), 'best': best,
+                  'organized': _organizedFileMark(writecsvPath)})
+    _writeResultAnalysisState(statePath, state)
+
+    print('\nmax_SCORE info : \n', best)
 
 if __name__=="__main__":
     presetValues = PresetValues(
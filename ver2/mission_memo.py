@@ -0,0 +1,108 @@
+"""Deterministic mission result keys and a memo of mission outcomes shared across runs"""
+import numpy as np
+import hashlib
+import json
+import os
+import os.path
+from dataclasses import asdict, fields
+from setup_dataclass import PresetValues, PropulsionSpecs
+from internal_dataclass import AircraftAnalysisResults, MissionParameters
+from vsp_cache import fileDigest
+from cache_registry import registerCache
+
+DEFAULT_MEMO_PATH = "data/mission_memo.jsonl"
+
+
+def _normalize(value):
+    """Rounded plain values, so np.arange grids with a different range still produce the same keys"""
+    if isinstance(value, (float, np.floating)):
+        return round(float(value), 9)
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, (np.ndarray, list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    return value
+
+def analysisDigest(analysisResults: AircraftAnalysisResults) -> str:
+    """sha256 of the aero / mass results, so a hash re-analysed at another fidelity gets new keys"""
+    payload = {f.name: _normalize(getattr(analysisResults, f.name))
+               for f in fields(analysisResults) if f.name != 'aircraft'}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+def missionResultID(hashVal: str, mission: int, missionParams: MissionParameters, presetValues: PresetValues,
+                    propulsionSpecs: PropulsionSpecs, aeroDigest: str = "") -> str:
+    """resultID of one mission combination, identical in every run that computes the same thing"""
+    # score_weight_ratio only weights the scores in ResultAnalysis, it does not change the mission
+    preset = {k: v for k, v in asdict(presetValues).items() if k != 'score_weight_ratio'}
+    payload = {
+        'hash': str(hashVal),
+        'mission': mission,
+        'mission_params': _normalize(asdict(missionParams)),
+        'preset': _normalize(preset),
+        'propulsion': _normalize(asdict(propulsionSpecs)),
+        'propeller': fileDigest(missionParams.propeller_data_path),
+        'battery': fileDigest(propulsionSpecs.battery_data_path),
+        'aero': aeroDigest,
+    }
+    digest = hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+    return "'" + digest[:32] + "'"
+
+
+class MissionMemo:
+    """Append-only JSON-lines memo: resultID -> {'status': 'ok' | 'fail', 'row': result row or None}
+
+    Records are appended with one O_APPEND write each, so mission workers on a shared
+    filesystem can use the same file. refresh() picks up what other workers appended.
+    Screened combinations are not memoized: screening is cheap and its thresholds change,
+    so they are re-screened every run. 'screened' records written by older runs read as misses.
+    """
+    def __init__(self, memoPath: str = DEFAULT_MEMO_PATH):
+        self.memoPath = memoPath
+        self.entries = {}
+        self.offset = 0
+        self.stats = registerCache("mission_memo", lambda: self.entries)
+        self.stats.reset()
+        os.makedirs(os.path.dirname(memoPath) or ".", exist_ok=True)
+        self.refresh()
+
+    def refresh(self):
+        if not os.path.isfile(self.memoPath):
+            return
+        with open(self.memoPath, 'rb') as f:
+            f.seek(self.offset)
+            block = f.read()
+        end = block.rfind(b'\n') + 1
+        self.offset += end
+        for line in block[:end].splitlines():
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            self.entries[entry['resultID']] = entry
+
+    def get(self, resultID: str):
+        entry = self.entries.get(resultID)
+        if entry is not None and entry['status'] == 'screened':
+            entry = None
+        if entry is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return entry
+
+    def put(self, resultID: str, status: str, row: dict = None):
+        entry = {'resultID': resultID, 'status': status, 'row': row}
+        line = (json.dumps(entry, default=lambda x: x.item() if isinstance(x, np.generic) else str(x)) + "\n").encode('utf-8')
+        fd = os.open(self.memoPath, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+        self.entries[resultID] = entry
+
+    def summary(self) -> str:
+        lookups = self.stats.hits + self.stats.misses
+        rate = self.stats.hits / lookups * 100 if lookups else 0.0
+        return f"Mission memo: {self.stats.hits}/{lookups} combinations reused ({rate:.1f}%)"
@@ -0,0 +1,109 @@
+"""File queues linking the VSP, mission and scoring stages so they run concurrently"""
+import json
+import glob
+import os
+import os.path
+import shutil
+import time
+
+PIPELINE_DIR = "data/pipeline"
+POLL_SECONDS = 5
+
+
+class FileQueue:
+    """Append-only JSON-lines queue on a shared filesystem
+
+    Every record is appended with a single O_APPEND write, so several servers can publish
+    to the same file without locks. Readers keep a byte offset and only consume complete lines.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.offset = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def publish(self, record: dict):
+        line = (json.dumps(record) + "\n").encode('utf-8')
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def poll(self) -> list:
+        """Records appended since the last poll"""
+        if not os.path.isfile(self.path):
+            return []
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            block = f.read()
+        end = block.rfind(b'\n') + 1
+        self.offset += end
+        return [json.loads(line) for line in block[:end].splitlines() if line.strip()]
+
+
+def vspQueue(pipelineDir: str = PIPELINE_DIR) -> FileQueue:
+    """Hashes committed to a VSP shard: {'hash', 'csvPath', 'server_id'}"""
+    return FileQueue(os.path.join(pipelineDir, "vsp_committed.queue"))
+
+def markDone(stage: str, server_id: int, pipelineDir: str = PIPELINE_DIR):
+    os.makedirs(pipelineDir, exist_ok=True)
+    open(os.path.join(pipelineDir, f"{stage}_done_{server_id}"), 'w').close()
+
+def doneCount(stage: str, pipelineDir: str = PIPELINE_DIR) -> int:
+    return len(glob.glob(os.path.join(pipelineDir, f"{stage}_done_*")))
+
+def resetPipeline(pipelineDir: str = PIPELINE_DIR):
+    """Clear queues and sentinels of an earlier run; call once before the servers start"""
+    shutil.rmtree(pipelineDir, ignore_errors=True)
+    os.makedirs(pipelineDir, exist_ok=True)
+
+
+class ShardFollower:
+    """Appends the complete rows that per-worker result shards gained since the last call to one total file"""
+    def __init__(self, pattern: str, totalPath: str):
+        self.pattern = pattern
+        self.totalPath = totalPath
+        self.offsets = {}
+
+    def follow(self) -> int:
+        """Returns the number of rows appended to totalPath"""
+        rows = 0
+        for shard in sorted(glob.glob(self.pattern)):
+            if os.path.abspath(shard) == os.path.abspath(self.totalPath):
+                continue
+            offset = self.offsets.get(shard, 0)
+            with open(shard, 'rb') as f:
+                f.seek(offset)
+                block = f.read()
+            end = block.rfind(b'\n') + 1
+            if end == 0:
+                continue
+            block = block[:end]
+            if offset == 0:
+                header, _, block = block.partition(b'\n')
+                if not os.path.isfile(self.totalPath):
+                    with open(self.totalPath, 'wb') as out:
+                        out.write(header + b'\n')
+            self.offsets[shard] = offset + end
+            if block:
+                with open(self.totalPath, 'ab') as out:
+                    out.write(block)
+                rows += block.count(b'\n')
+        return rows
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage the pipeline queues in data/pipeline.")
+    parser.add_argument("command", choices=['reset', 'status'])
+    parser.add_argument("--pipeline_dir", type=str, default=PIPELINE_DIR)
+    args = parser.parse_args()
+
+    if args.command == 'reset':
+        resetPipeline(args.pipeline_dir)
+        print(f"Cleared {args.pipeline_dir}")
+    else:
+        committed = vspQueue(args.pipeline_dir).poll()
+        print(f"{len(committed)} hashes committed by VSP, "
+              f"{doneCount('vsp', args.pipeline_dir)} VSP and {doneCount('mission', args.pipeline_dir)} mission servers done")
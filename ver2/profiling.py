@@ -0,0 +1,82 @@
+"""cProfile hooks for the VSP and mission worker loops, turned on with --profile or DBF_PROFILE=1
+
+Every analysed hash gets its own file, data/profile/<stage>/<worker>/<hash>.prof.
+mergeProfiles adds them up into data/profile/<stage>/<worker>.prof and prints the top entries.
+"""
+import cProfile
+import pstats
+import glob
+import os
+import os.path
+import shutil
+from contextlib import contextmanager
+
+PROFILE_ENV = "DBF_PROFILE"
+PROFILE_DIR = "data/profile"
+TOP_N = 30
+
+
+def profilingEnabled() -> bool:
+    return os.environ.get(PROFILE_ENV, "").lower() in ("1", "true", "yes", "on")
+
+def enableProfiling():
+    """Through the environment, so spawned VSP pool workers profile as well"""
+    os.environ[PROFILE_ENV] = "1"
+
+
+@contextmanager
+def profiled(stage: str, worker: str, hashVal, profileDir: str = PROFILE_DIR):
+    """Profiles the block into <profileDir>/<stage>/<worker>/<hash>.prof when profiling is enabled"""
+    if not profilingEnabled():
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        path = os.path.join(profileDir, stage, worker, str(hashVal).strip("'") + ".prof")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        profiler.dump_stats(path)
+
+
+def clearProfiles(stage: str, worker: str, profileDir: str = PROFILE_DIR):
+    """Remove the profiles of an earlier run of worker, so mergeProfiles only sees this run"""
+    stageDir = os.path.join(profileDir, stage)
+    for path in [os.path.join(stageDir, worker)] + glob.glob(os.path.join(stageDir, f"{worker}_job*")):
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def mergeProfiles(stage: str, worker: str, top_n: int = TOP_N, sort: str = "tottime",
+                  profileDir: str = PROFILE_DIR):
+    """Adds up the per-hash profiles of worker (and of its pool jobs, <worker>_job<k>) into <worker>.prof
+    and prints the top_n entries. Returns the merged pstats.Stats, or None without profiles."""
+    stageDir = os.path.join(profileDir, stage)
+    paths = sorted(set(glob.glob(os.path.join(stageDir, worker, "*.prof")) +
+                       glob.glob(os.path.join(stageDir, f"{worker}_job*", "*.prof"))))
+    if not paths:
+        return None
+    stats = pstats.Stats(paths[0])
+    for path in paths[1:]:
+        stats.add(path)
+    mergedPath = os.path.join(stageDir, ("all" if worker == "*" else worker) + ".prof")
+    stats.dump_stats(mergedPath)
+
+    print(f"\nProfile of {stage} {worker}: {len(paths)} hashes, saved to {mergedPath}")
+    stats.sort_stats(sort).print_stats(top_n)
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Merge and print the profiles written with --profile.")
+    parser.add_argument("stage", choices=['vsp', 'mission'])
+    parser.add_argument("--worker", type=str, default="*", help="worker name, e.g. server1 (default: all workers)")
+    parser.add_argument("--top", type=int, default=TOP_N)
+    parser.add_argument("--sort", type=str, default="tottime", help="pstats sort key (tottime, cumulative, ncalls, ...)")
+    parser.add_argument("--profile_dir", type=str, default=PROFILE_DIR)
+    args = parser.parse_args()
+
+    mergeProfiles(args.stage, args.worker, args.top, args.sort, args.profile_dir)
@@ -4,14 +4,19 @@ import traceback
 import numpy as np
 
 import math
-import matplotlib.pyplot as plt
+import hashlib
 from setup_dataclass import PropulsionSpecs
 from scipy.interpolate import interp1d
+from cache_registry import registerCache
+from shared_tables import shareTable, lookupSharedTable
 
-import cProfile
-import pstats
-from pstats import SortKey
+# Calls of the propulsion solvers in this process, read by MissionAnalyzer for its MissionStats
+call_counts = {'determine_max_thrust': 0, 'thrust_reverse_solve': 0, 'thrust_analysis': 0}
 
+fixspeed_cache_stats = registerCache("propulsion.propeller_fixspeed_data_fast",
+                                     lambda: getattr(propeller_fixspeed_data_fast, 'cache', None))
+reverse_solve_cache_stats = registerCache("propulsion.thrust_reverse_solve",
+                                          lambda: getattr(thrust_reverse_solve, '_cache', None))
 
 def determine_max_thrust_fast(speed:float, voltage:float, 
                               propulsionSpecs:PropulsionSpecs, propeller_array:np.ndarray):
@@ -101,21 +106,10 @@ def determine_max_thrust_fast(speed:float, voltage:float,
 def determine_max_thrust(speed:float, voltage:float, 
                          propulsionSpecs:PropulsionSpecs, propeller_array:np.ndarray, 
                          graphFlag:bool):
+    call_counts['determine_max_thrust'] += 1
     #old = determine_max_thrust_old(speed,voltage,propulsionSpecs,propeller_array,graphFlag)
-    new = 0.5
-
-    #profiler = cProfile.Profile()
-
-    #profiler.enable()
     new= determine_max_thrust_fast(speed,voltage,propulsionSpecs,propeller_array)
 
-    #profiler.disable()
-    #   
-    #   # Print stats sorted by cumulative time
-    #stats = pstats.Stats(profiler)
-    #stats.sort_stats(SortKey.TIME)
-    #stats.print_stats(20)  # Show top 20 time-consuming lines
-
     #print(old-new)
 
     return new
@@ -151,56 +145,64 @@ def propeller_fixspeed_data_fast(speed, propeller_array):
         propeller_fixspeed_data_fast.max_speed_rpms = max_speed_rpms
         propeller_fixspeed_data_fast.rpm_starts = np.array([i*10 for i in range(len(rpm_unique))])
 
-        # First interpolation: for each RPM interpolate over speeds
-        rpm_data = {}
-        for rpm in rpm_unique:
-            mask = propeller_array[:, 0] == rpm
-            speeds = propeller_array[mask, 1]
-            torques = propeller_array[mask, 2]
-            thrusts = propeller_array[mask, 3]
-
-            # Create arrays with NaN where speed is out of range
-            interp_torques = np.full_like(v_speeds, np.nan)
-            interp_thrusts = np.full_like(v_speeds, np.nan)
-
-            valid_mask = (v_speeds >= speeds.min()) & (v_speeds <= speeds.max())
-            interp_torques[valid_mask] = np.interp(
-                v_speeds[valid_mask], speeds, torques
-            )
-            interp_thrusts[valid_mask] = np.interp(
-                v_speeds[valid_mask], speeds, thrusts
-            )
-
-            rpm_data[rpm] = (interp_torques, interp_thrusts)
-
-        # Second interpolation: for each speed, interpolate over RPMs
         expanded_rpms = np.arange(int(rpm_unique.min()), int(rpm_unique.max()) + 1, 100)
 
-        n_speeds = len(v_speeds)
-        n_rpms = len(expanded_rpms)
+        # The two grids are most of the memory; with --shared-tables one copy serves the node,
+        # and only the first process to get here builds them
+        fixspeed_key = "fixspeed_" + hashlib.sha1(np.ascontiguousarray(propeller_array).tobytes()).hexdigest()
+        torque_lookup = lookupSharedTable(fixspeed_key + "_torques")
+        thrust_lookup = lookupSharedTable(fixspeed_key + "_thrusts")
+        if torque_lookup is None or thrust_lookup is None:
+            # First interpolation: for each RPM interpolate over speeds
+            rpm_data = {}
+            for rpm in rpm_unique:
+                mask = propeller_array[:, 0] == rpm
+                speeds = propeller_array[mask, 1]
+                torques = propeller_array[mask, 2]
+                thrusts = propeller_array[mask, 3]
+
+                # Create arrays with NaN where speed is out of range
+                interp_torques = np.full_like(v_speeds, np.nan)
+                interp_thrusts = np.full_like(v_speeds, np.nan)
+
+                valid_mask = (v_speeds >= speeds.min()) & (v_speeds <= speeds.max())
+                interp_torques[valid_mask] = np.interp(
+                    v_speeds[valid_mask], speeds, torques
+                )
+                interp_thrusts[valid_mask] = np.interp(
+                    v_speeds[valid_mask], speeds, thrusts
+                )
+
+                rpm_data[rpm] = (interp_torques, interp_thrusts)
+
+            # Second interpolation: for each speed, interpolate over RPMs
+            n_speeds = len(v_speeds)
+            n_rpms = len(expanded_rpms)
         
-        # Pre-allocate arrays for all speeds and RPMs
-        torque_lookup = np.full((n_speeds, n_rpms), np.nan)
-        thrust_lookup = np.full((n_speeds, n_rpms), np.nan)
+            # Pre-allocate arrays for all speeds and RPMs
+            torque_lookup = np.full((n_speeds, n_rpms), np.nan)
+            thrust_lookup = np.full((n_speeds, n_rpms), np.nan)
         
 
-        for i, v in enumerate(v_speeds):
-            torques = np.array([rpm_data[rpm][0][i] for rpm in rpm_unique])
-            thrusts = np.array([rpm_data[rpm][1][i] for rpm in rpm_unique])
+            for i, v in enumerate(v_speeds):
+                torques = np.array([rpm_data[rpm][0][i] for rpm in rpm_unique])
+                thrusts = np.array([rpm_data[rpm][1][i] for rpm in rpm_unique])
 
-            # Only interpolate where we have valid data (not NaN)
-            valid = ~np.isnan(torques)
-            if np.any(valid):
-                interp_torques = np.interp(
-                    expanded_rpms, rpm_unique[valid], torques[valid]
-                )
-                interp_thrusts = np.interp(
-                    expanded_rpms, rpm_unique[valid], thrusts[valid]
-                )
+                # Only interpolate where we have valid data (not NaN)
+                valid = ~np.isnan(torques)
+                if np.any(valid):
+                    interp_torques = np.interp(
+                        expanded_rpms, rpm_unique[valid], torques[valid]
+                    )
+                    interp_thrusts = np.interp(
+                        expanded_rpms, rpm_unique[valid], thrusts[valid]
+                    )
 
-                torque_lookup[i]=interp_torques
-                thrust_lookup[i]=interp_thrusts
+                    torque_lookup[i]=interp_torques
+                    thrust_lookup[i]=interp_thrusts
 
+            torque_lookup = shareTable(fixspeed_key + "_torques", torque_lookup)
+            thrust_lookup = shareTable(fixspeed_key + "_thrusts", thrust_lookup)
 
         propeller_fixspeed_data_fast.v_speeds = v_speeds
         propeller_fixspeed_data_fast.torques = torque_lookup
@@ -217,7 +219,9 @@ def propeller_fixspeed_data_fast(speed, propeller_array):
     cached_speed = idx*interval 
 
     if cached_speed in propeller_fixspeed_data_fast.cache:
+        fixspeed_cache_stats.hits += 1
         return propeller_fixspeed_data_fast.cache[cached_speed]
+    fixspeed_cache_stats.misses += 1
 
     v_speeds = propeller_fixspeed_data_fast.v_speeds
 
@@ -286,19 +290,8 @@ def propeller_fixspeed_data_fast(speed, propeller_array):
 
 
 def propeller_fixspeed_data(speed,propeller_array):
-    
-    #profiler = cProfile.Profile()
-
-    #profiler.enable()
+    # Profile with --profile / DBF_PROFILE=1 (profiling.py) instead of editing this function
     new = propeller_fixspeed_data_fast(speed,propeller_array)
-        #return new
-
-    #profiler.disable()
-        
-        # Print stats sorted by cumulative time
-    #stats = pstats.Stats(profiler)
-    #stats.sort_stats(SortKey.TIME)
-    #stats.print_stats(20)  # Show top 20 time-consuming lines
     
     return new
 
@@ -356,6 +349,7 @@ def propeller_fixspeed_data(speed,propeller_array):
     return propeller_array_fixspeed
 
 def thrust_reverse_solve(T_desired,speed,voltage, Kv, R, propeller_array):
+    call_counts['thrust_reverse_solve'] += 1
     if T_desired == 0 : return 0,0,0,0,0
     # Add function attribute cache
     if not hasattr(thrust_reverse_solve, '_cache'):
@@ -365,7 +359,9 @@ def thrust_reverse_solve(T_desired,speed,voltage, Kv, R, propeller_array):
     key = (int(T_desired*1000+0.5), int(speed*100+0.5), int(voltage*100+0.5))
 
     if key in thrust_reverse_solve._cache:
+        reverse_solve_cache_stats.hits += 1
         return thrust_reverse_solve._cache[key]
+    reverse_solve_cache_stats.misses += 1
 
     propeller_array_fixspeed = propeller_fixspeed_data(speed,propeller_array)
     if (propeller_array_fixspeed==-1).all()==True : return 0,0,0,0,0
@@ -405,6 +401,7 @@ def SoC2Vol(SoC,battery_array):
     
 
 def thrust_analysis(throttle:float, speed:float, voltage:float, propulsionSpecs:PropulsionSpecs, propeller_array:np.ndarray, graphFlag:bool):
+    call_counts['thrust_analysis'] += 1
 
     Kv = propulsionSpecs.Kv
     R = propulsionSpecs.R
@@ -421,7 +418,7 @@ def thrust_analysis(throttle:float, speed:float, voltage:float, propulsionSpecs:
     motor_results_array = np.column_stack((I_list,RPM_list,Torque_list))
 
     if graphFlag == 1:
-    
+        import matplotlib.pyplot as plt
         plt.figure(figsize=(6, 3))
         plt.plot( expanded_results_array[:,0], expanded_results_array[:,1], label='Propeller')
         plt.plot(motor_results_array[:,1],motor_results_array[:,2], label='Motor')
@@ -0,0 +1,109 @@
+"""Reading and writing the aircraft results store (data/aircraft*.csv)
+
+Kept free of OpenVSP and matplotlib so mission workers import only numpy and pandas.
+"""
+import csv
+import numpy as np
+import json
+import ast
+import os 
+import os.path
+import pandas as pd
+from typing import List
+from dataclasses import asdict
+from internal_dataclass import AircraftAnalysisResults
+
+
+def resetAnalysisResults(csvPath:str = "data/aircraft.csv"):
+    df = pd.read_csv(csvPath, sep='|', encoding='utf-8')
+    df_columns_only = pd.DataFrame(columns=df.columns)
+    df_columns_only.to_csv(csvPath, sep='|', encoding='utf-8', index=False, quoting=csv.QUOTE_NONE)
+
+def removeAnalysisResults(csvPath:str = "data/aircraft.csv"):
+    if os.path.exists(csvPath):
+        os.remove(csvPath)
+        #print(f"{csvPath} file has been deleted.")
+
+# A row is only replaced by one of the same or a higher tier; unknown tiers rank as production
+FIDELITY_RANK = {'screening': 0, 'surrogate': 1, 'production': 2, 'adaptive': 2, 'verification': 3}
+
+def fidelityRank(fidelity: str) -> int:
+    return FIDELITY_RANK.get(fidelity, FIDELITY_RANK['production'])
+
+def fillFidelity(df: pd.DataFrame) -> pd.DataFrame:
+    """Rows written before fidelity tiers existed have no fidelity; they are production runs"""
+    df['fidelity'] = df['fidelity'].fillna('production') if 'fidelity' in df.columns else 'production'
+    return df
+
+def writeAnalysisResults(anaResults: AircraftAnalysisResults, csvPath:str = "data/aircraft.csv"):
+    """Adds or replaces the row of the aircraft hash. A row of a higher fidelity tier is kept:
+    a screening run never overwrites a production or verification result of the same aircraft."""
+    hashVal = "'" + str(hash(anaResults.aircraft)) + "'"
+    if not os.path.isfile(csvPath):
+        df = pd.json_normalize(asdict(anaResults))
+        df['hash'] = hashVal
+    else:
+        new_df = pd.json_normalize(asdict(anaResults))
+        new_df['hash'] = hashVal
+        df = fillFidelity(pd.read_csv(csvPath, sep='|', encoding='utf-8'))
+        existing = df.loc[df['hash'] == hashVal, 'fidelity']
+        if not existing.empty and fidelityRank(existing.iloc[-1]) > fidelityRank(anaResults.fidelity):
+            return
+        df= pd.concat([df,new_df]).drop_duplicates(["hash"],keep='last')
+
+    # if selected_outputs is not None:
+    #     df = df.loc[:, [col for col in selected_outputs if col in df.columns]]    
+
+    def convert_cell(x):
+        if isinstance(x, np.ndarray):
+            return f"{json.dumps(x.tolist())}"
+        return x
+
+    df_copy = df.copy()
+    for col in df_copy.columns:
+        df_copy[col] = df_copy[col].apply(convert_cell)
+    
+    # Save the updated DataFrame back to CSV; replaced atomically so pipeline readers never see a half-written store
+    tmpPath = csvPath + ".tmp"
+    df_copy.to_csv(tmpPath, sep='|', encoding='utf-8', index=False, quoting=csv.QUOTE_NONE)
+    os.replace(tmpPath, csvPath)
+
+def loadAnalysisResults(hashValue:str, csvPath:str = "data/aircraft.csv")-> AircraftAnalysisResults:
+    df = fillFidelity(pd.read_csv(csvPath, sep='|', encoding='utf-8'))
+    df = df.loc[df['hash']==hashValue]
+   
+    for col in df.columns:
+       df[col] = df[col].apply(lambda x: 
+                               np.array(ast.literal_eval(x),float) if isinstance(x, str) and x.startswith('[')
+                               else x)
+    df.pop('hash')
+    
+    if df.empty:
+        raise ValueError(f"No data found for hash value: {hashValue}")
+
+    analysisResult=df.to_dict(orient='records')[0]
+    return AircraftAnalysisResults.fromDict(analysisResult)
+
+def loadAllAnalysisResults(csvPath:str = "data/aircraft.csv") -> List[AircraftAnalysisResults]:
+    df = fillFidelity(pd.read_csv(csvPath, sep='|', encoding='utf-8'))
+    
+    for col in df.columns:
+       df[col] = df[col].apply(lambda x: 
+                               np.array(ast.literal_eval(x),float) if isinstance(x, str) and x.startswith('[')
+                               else x)
+    df.pop('hash')
+
+    return [AircraftAnalysisResults.fromDict(analysisResult) for analysisResult in df.to_dict(orient='records')]
+
+def loadAnalysisResultsIndex(csvPath:str = "data/aircraft.csv") -> dict:
+    """hash -> AircraftAnalysisResults of every row, parsed once for long-lived processes"""
+    df = fillFidelity(pd.read_csv(csvPath, sep='|', encoding='utf-8'))
+    
+    for col in df.columns:
+       df[col] = df[col].apply(lambda x: 
+                               np.array(ast.literal_eval(x),float) if isinstance(x, str) and x.startswith('[')
+                               else x)
+    hashes = df.pop('hash')
+
+    return {hashVal: AircraftAnalysisResults.fromDict(analysisResult)
+            for hashVal, analysisResult in zip(hashes, df.to_dict(orient='records'))}
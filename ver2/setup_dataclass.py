@@ -1,4 +1,5 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+import numpy as np
 
 @dataclass
 class PresetValues:
@@ -29,6 +30,38 @@ class PropulsionSpecs:
     max_current : float
     max_power : float
     
+@dataclass
+class FidelityTier:
+    num_wake_nodes : int
+    ncpu : int
+    alpha_npts : int=None       # None : step through the alphas by alpha_step
+    fixed_wake : int=1
+    alpha_step : float=None     # None : use alpha_step of AerodynamicSetup
+    
+    # Adaptive alpha sampling: refine the flaps-up sweep only where interpolation error exceeds the tolerances
+    adaptive_alpha : bool=False
+    CL_tolerance : float=0.005
+    CD_tolerance : float=0.0005
+
+    def alpha_grid(self, alpha_start: float, alpha_end: float, alpha_step: float) -> np.ndarray:
+        """Flaps-up sweep alphas of this tier: alpha_npts evenly spaced, or alpha_start stepped by the tier's
+        (else the setup's) alpha_step up to alpha_end. The sweep must stay evenly spaced, so a coarser
+        step may stop short of alpha_end; its alphas are still on the grid of the finer tiers."""
+        if self.alpha_npts is not None:
+            return np.linspace(alpha_start, alpha_end, self.alpha_npts)
+        step = self.alpha_step or alpha_step
+        return np.arange(alpha_start, alpha_end + step/2, step)
+
+def default_fidelity_tiers() -> dict:
+    return {
+        # every second alpha of the production sweep
+        "screening": FidelityTier(num_wake_nodes=16, ncpu=1, alpha_step=2),
+        "production": FidelityTier(num_wake_nodes=64, ncpu=1),
+        "verification": FidelityTier(num_wake_nodes=128, ncpu=4, alpha_npts=27),
+        # 17 nominal alphas: the bisection strides (4, 2, 1) all end on alpha_end
+        "adaptive": FidelityTier(num_wake_nodes=64, ncpu=1, alpha_npts=17, adaptive_alpha=True),
+    }
+    
 @dataclass
 class AerodynamicSetup:
     
@@ -42,6 +75,10 @@ class AerodynamicSetup:
     AOA_climb_max : str
     AOA_turn_max : str    
     
+    # VSPAERO settings, selected per stage by name
+    fidelity : str="production"
+    fidelity_tiers : dict=field(default_factory=default_fidelity_tiers)
+    
     
 @dataclass
 class AircraftParamConstraints:
@@ -0,0 +1,248 @@
+"""Read-only lookup tables shared by the mission processes of one node, turned on with --shared-tables
+
+The first process that needs a table (propeller / battery array, fixspeed grids) builds it and
+publishes it as a shared memory segment named after its key; later processes attach to it without
+copying. Every attached process keeps a pid file under REFS_DIR/<segment>/, and the last live one
+unlinks the segment when it exits. Taking and dropping a reference hold an flock on
+REFS_DIR/locks/<segment>, so a process attaching never races the last one unlinking.
+Segments left by killed workers are removed with
+
+    python shared_tables.py cleanup
+"""
+import atexit
+import glob
+import hashlib
+import json
+import os
+import os.path
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+from contextlib import contextmanager
+from multiprocessing import shared_memory, resource_tracker
+try:
+    import fcntl
+except ImportError:     # Windows: no flock, references are taken unlocked
+    fcntl = None
+
+SHARED_TABLES_ENV = "DBF_SHARED_TABLES"
+REFS_DIR = os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "dbf_tables")
+HEADER_BYTES = 256
+MAGIC = b"DBFTAB01"
+READY_SECONDS = 5
+
+# segment name -> (SharedMemory, read-only view) of the tables attached by this process
+_attached = {}
+_refs = set()
+
+
+def sharedTablesEnabled() -> bool:
+    return os.environ.get(SHARED_TABLES_ENV, "").lower() in ("1", "true", "yes", "on")
+
+def enableSharedTables():
+    """Through the environment, like enableProfiling, so spawned workers share as well"""
+    os.environ[SHARED_TABLES_ENV] = "1"
+
+def segmentName(key: str) -> str:
+    # Short enough for the 31 character limit of macOS
+    return "dbf_" + hashlib.sha1(key.encode()).hexdigest()[:24]
+
+
+# Before Python 3.13 the resource tracker unlinks every segment a process touched when it exits;
+# the pid files decide that here instead, so segments are taken off the tracker
+_UNTRACKED = sys.version_info >= (3, 13)
+
+def _open(name: str, create: bool = False, size: int = 0) -> shared_memory.SharedMemory:
+    if _UNTRACKED:
+        return shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+    shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+def _unlink(shm: shared_memory.SharedMemory):
+    if not _UNTRACKED:
+        # unlink() unregisters the segment again
+        resource_tracker.register(shm._name, "shared_memory")
+    shm.unlink()
+
+def _view(shm: shared_memory.SharedMemory):
+    """Read-only array in the segment, or None while the publisher is still writing it"""
+    if bytes(shm.buf[:len(MAGIC)]) != MAGIC:
+        return None
+    meta = json.loads(bytes(shm.buf[len(MAGIC):HEADER_BYTES]).rstrip(b'\0'))
+    view = np.ndarray(tuple(meta['shape']), dtype=np.dtype(meta['dtype']), buffer=shm.buf, offset=HEADER_BYTES)
+    view.setflags(write=False)
+    return view
+
+
+def _pidAlive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+@contextmanager
+def _refLock(name: str):
+    """Exclusive flock of one segment's references; closing the file releases it"""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.join(REFS_DIR, "locks"), exist_ok=True)
+    fd = os.open(os.path.join(REFS_DIR, "locks", name), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+def _addRef(name: str):
+    if not _refs:
+        atexit.register(releaseTables)
+    os.makedirs(os.path.join(REFS_DIR, name), exist_ok=True)
+    open(os.path.join(REFS_DIR, name, str(os.getpid())), 'w').close()
+    _refs.add(name)
+
+def liveRefs(name: str) -> list:
+    """pids still attached to the segment; pid files of dead processes are removed"""
+    pids = []
+    for path in glob.glob(os.path.join(REFS_DIR, name, "*")):
+        pid = int(os.path.basename(path))
+        if _pidAlive(pid):
+            pids.append(pid)
+        else:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    return pids
+
+def _unlinkIfUnused(name: str) -> bool:
+    """Called with _refLock(name) held"""
+    if liveRefs(name):
+        return False
+    try:
+        shm = _open(name)
+        shm.close()
+        _unlink(shm)
+    except FileNotFoundError:
+        pass
+    shutil.rmtree(os.path.join(REFS_DIR, name), ignore_errors=True)
+    return True
+
+
+def attachTable(key: str, timeout: float = READY_SECONDS):
+    """Shared table published under key, or None when nobody published it (or it was not ready within timeout)"""
+    name = segmentName(key)
+    if name in _attached:
+        return _attached[name][1]
+    with _refLock(name):
+        _addRef(name)
+        try:
+            shm = _open(name)
+        except FileNotFoundError:
+            return None
+    deadline = time.time() + timeout
+    view = _view(shm)
+    while view is None and time.time() < deadline:
+        time.sleep(0.05)
+        view = _view(shm)
+    if view is None:
+        shm.close()
+        return None
+    _attached[name] = (shm, view)
+    return view
+
+def publishTable(key: str, array: np.ndarray) -> np.ndarray:
+    """Copies array into a segment named after key and returns the shared view; if another process
+    published key first, its table is used. Falls back to array when the segment can not be created."""
+    name = segmentName(key)
+    if name in _attached:
+        return _attached[name][1]
+    array = np.ascontiguousarray(array)
+    meta = json.dumps({'key': key, 'dtype': array.dtype.str, 'shape': list(array.shape)}).encode()
+    if len(meta) > HEADER_BYTES - len(MAGIC):
+        raise ValueError(f"Table key too long for the segment header: {key}")
+    with _refLock(name):
+        _addRef(name)
+        try:
+            shm = _open(name, create=True, size=HEADER_BYTES + max(array.nbytes, 1))
+        except FileExistsError:
+            shm = None
+        except OSError as e:
+            print(f"Shared table {key} not published: {e}")
+            return array
+    if shm is None:
+        view = attachTable(key)
+        return array if view is None else view
+
+    shm.buf[len(MAGIC):len(MAGIC) + len(meta)] = meta
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf, offset=HEADER_BYTES)[...] = array
+    # The magic goes in last, so attaching processes never see a half-written table
+    shm.buf[:len(MAGIC)] = MAGIC
+    view = _view(shm)
+    _attached[name] = (shm, view)
+    return view
+
+
+def lookupSharedTable(key: str):
+    """attachTable when --shared-tables is on, otherwise None"""
+    return attachTable(key) if sharedTablesEnabled() else None
+
+def shareTable(key: str, array: np.ndarray) -> np.ndarray:
+    """publishTable when --shared-tables is on, otherwise array itself"""
+    return publishTable(key, array) if sharedTablesEnabled() else array
+
+
+def releaseTables():
+    """Drop this process's references; the last process attached to a segment unlinks it.
+    Views stay mapped until the process exits, so this only runs at exit."""
+    for name in list(_refs):
+        with _refLock(name):
+            try:
+                os.remove(os.path.join(REFS_DIR, name, str(os.getpid())))
+            except FileNotFoundError:
+                pass
+            _unlinkIfUnused(name)
+        _refs.discard(name)
+
+
+def tableStatus() -> list:
+    """(segment, key, MB, live pids) of every segment with a refs directory"""
+    status = []
+    for refDir in sorted(glob.glob(os.path.join(REFS_DIR, "dbf_*", ""))):
+        refDir = os.path.dirname(refDir)
+        name = os.path.basename(refDir)
+        key, size = "", 0
+        try:
+            shm = _open(name)
+            size = shm.size
+            if bytes(shm.buf[:len(MAGIC)]) == MAGIC:
+                key = json.loads(bytes(shm.buf[len(MAGIC):HEADER_BYTES]).rstrip(b'\0'))['key']
+            shm.close()
+        except FileNotFoundError:
+            key = "(segment missing)"
+        status.append((name, key, size / 1024 / 1024, liveRefs(name)))
+    return status
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or clean up the shared lookup tables of this node.")
+    parser.add_argument("command", choices=['status', 'cleanup'])
+    args = parser.parse_args()
+
+    if args.command == 'cleanup':
+        removed = 0
+        for name, _, _, pids in tableStatus():
+            if not pids:
+                with _refLock(name):
+                    removed += _unlinkIfUnused(name)
+        print(f"Removed {removed} unused segments")
+    for name, key, mb, pids in tableStatus():
+        print(f"{name}  {mb:8.2f} MB  {len(pids)} processes  {key}")
@@ -0,0 +1,90 @@
+"""Streaming merge of per-server result shards with key de-duplication"""
+import numpy as np
+import pandas as pd
+import glob
+import os
+import os.path
+
+CHUNK_SIZE = 100000
+
+
+def completeRows(csvPath: str) -> int:
+    """Data rows before the last newline, so a shard that is still being written is read up to its last full row"""
+    newlines = 0
+    with open(csvPath, 'rb') as f:
+        while True:
+            block = f.read(1 << 20)
+            if not block:
+                break
+            newlines += block.count(b'\n')
+    return max(newlines - 1, 0)
+
+
+class KeyIndex:
+    """Sorted uint64 digests of the keys written so far (8 bytes per key)"""
+    def __init__(self):
+        self.digests = np.empty(0, dtype=np.uint64)
+
+    def filterNew(self, keys: pd.Series) -> np.ndarray:
+        """Mask of first occurrences among keys that are not in the index yet; adds them to the index"""
+        digests = pd.util.hash_array(keys.astype(str).to_numpy())
+        seen = np.zeros(len(digests), bool)
+        if len(self.digests):
+            pos = np.minimum(np.searchsorted(self.digests, digests), len(self.digests) - 1)
+            seen = self.digests[pos] == digests
+        first = ~pd.Series(digests).duplicated().to_numpy()
+        mask = ~seen & first
+        new = np.sort(digests[mask])
+        self.digests = np.insert(self.digests, np.searchsorted(self.digests, new), new)
+        return mask
+
+
+def streamMerge(csv_files: list, output_file: str, key: str, chunk_size: int = CHUNK_SIZE) -> int:
+    """Writes the rows of csv_files to output_file chunk by chunk, keeping the first row of every key.
+    Empty shards are skipped; columns follow the first non-empty shard. Returns the number of rows written."""
+    index = KeyIndex()
+    columns = None
+    written = 0
+    duplicates = 0
+    first_chunk = True
+    tmpPath = output_file + ".tmp"
+
+    for csv_file in csv_files:
+        if os.path.getsize(csv_file) == 0:  # 빈 파일이면 건너뛰기
+            print(f"Skipping empty file: {csv_file}")
+            continue
+        nrows = completeRows(csv_file)
+
+        for chunk in pd.read_csv(csv_file, sep='|', encoding='utf-8', nrows=nrows, chunksize=chunk_size):
+            if columns is None:
+                columns = list(chunk.columns)
+            chunk = chunk.reindex(columns=columns)
+            chunk = chunk[chunk[key].notna()]
+            mask = index.filterNew(chunk[key])
+            duplicates += len(chunk) - int(mask.sum())
+            chunk[mask].to_csv(tmpPath, sep='|', index=False, encoding='utf-8',
+                               mode='w' if first_chunk else 'a', header=first_chunk)
+            first_chunk = False
+            written += int(mask.sum())
+
+    if columns is None:
+        print("No valid CSV files found. Merging skipped.")
+        return 0
+
+    os.replace(tmpPath, output_file)
+    print(f"Merged CSV file saved: {output_file} ({written} rows, {duplicates} duplicate {key} skipped)")
+    return written
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Merge result shards without loading them into memory at once.")
+    parser.add_argument("pattern", type=str, help="shard glob, e.g. 'data/aircraft_*.csv'")
+    parser.add_argument("--out", type=str, required=True)
+    parser.add_argument("--key", type=str, required=True, help="dedupe column (hash / resultID)")
+    parser.add_argument("--chunk_size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    streamMerge(sorted(f for f in glob.glob(args.pattern) if os.path.abspath(f) != os.path.abspath(args.out)),
+                args.out, args.key, args.chunk_size)
@@ -0,0 +1,222 @@
+"""Stand-in for the OpenVSP Python API, so the mission / propulsion code imports and the VSP pool runs
+without an OpenVSP install.
+
+benchmark.py and test_vsp_pool.py put this directory on sys.path when `import openvsp` fails (the test
+always does). It keeps the wing parms VSPAnalyzer sets and answers the parm, mass and VSPAEROSweep
+queries with closed-form values: deterministic, so pool and serial runs give identical results.
+
+FAKE_CRASH_ENV names a marker file: the first sweep of any process that finds it missing creates it
+and kills its process, to test the pool losing a worker mid-configuration.
+"""
+import json
+import math
+import os
+import zlib
+
+FAKE_CRASH_ENV = "DBF_FAKE_VSP_CRASH"
+
+SET_ALL = 0
+VORTEX_LATTICE = 0
+XS_FILE_AIRFOIL = 12
+SS_CONTROL = 3
+AR_WSECT_DRIVER = 0
+SPAN_WSECT_DRIVER = 1
+AREA_WSECT_DRIVER = 2
+TAPER_WSECT_DRIVER = 3
+ROOTC_WSECT_DRIVER = 5
+
+_model = {'parms': {}, 'airfoils': {}, 'geoms': [], 'groups': 0, 'ref_wing': None}
+_results = {}
+_inputs = {}
+exec_count = 0
+
+
+def _parm_key(container: str, name: str, group: str) -> str:
+    return f"{container}:{group}:{name}"
+
+
+## Model
+
+def VSPCheckSetup():
+    pass
+
+def VSPRenew():
+    pass
+
+def ClearVSPModel():
+    _model.update(parms={}, airfoils={}, geoms=[], groups=0, ref_wing=None)
+    _results.clear()
+
+def Update():
+    pass
+
+def WriteVSPFile(path: str, set_index: int = SET_ALL):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(_model, f)
+
+def ReadVSPFile(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        _model.update(json.load(f))
+
+def AddGeom(geom_type: str, parent: str = "") -> str:
+    geom_id = f"GEOM_{len(_model['geoms'])}"
+    _model['geoms'].append(geom_id)
+    return geom_id
+
+def SetGeomName(geom_id: str, name: str):
+    pass
+
+def SetDriverGroup(geom_id: str, section: int, *drivers):
+    pass
+
+def GetXSecSurf(geom_id: str, index: int) -> str:
+    return f"{geom_id}:surf{index}"
+
+def GetXSec(surf_id: str, index: int) -> str:
+    return f"{surf_id}:xsec{index}"
+
+def ChangeXSecShape(surf_id: str, index: int, shape: int):
+    pass
+
+def ReadFileAirfoil(xsec_id: str, path: str):
+    _model['airfoils'][xsec_id.split(":")[0]] = os.path.basename(path)
+
+def AddSubSurf(geom_id: str, sub_type: int) -> str:
+    return f"{geom_id}:SS_{_model['groups']}"
+
+def SetSubSurfName(geom_id: str, sub_id: str, name: str):
+    pass
+
+def CreateVSPAEROControlSurfaceGroup() -> int:
+    _model['groups'] += 1
+    return _model['groups'] - 1
+
+def SetVSPAEROControlGroupName(name: str, group: int):
+    pass
+
+def AddSelectedToCSGroup(selected: list, group: int):
+    pass
+
+def SetVSPAERORefWingID(geom_id: str):
+    _model['ref_wing'] = geom_id
+
+def FindContainer(name: str, index: int) -> str:
+    return name
+
+
+## Parms
+
+def GetParm(container: str, name: str, group: str) -> str:
+    return _parm_key(container, name, group)
+
+def FindParm(container: str, name: str, group: str) -> str:
+    return _parm_key(container, name, group)
+
+def SetParmVal(*args):
+    """SetParmVal(parm_id, value) or SetParmVal(container, name, group, value)"""
+    if len(args) == 2:
+        parm_id, value = args
+    else:
+        parm_id, value = _parm_key(*args[:3]), args[3]
+    _model['parms'][parm_id] = float(value)
+    return float(value)
+
+def _wing(geom_id: str) -> dict:
+    """Half span, mean and root chord of a one-section wing from the parms its driver group sets"""
+    parms = _model['parms']
+    get = lambda name, default=0.0: parms.get(_parm_key(geom_id, name, "XSec_1"), default)
+    taper = get("Taper", 1.0)
+    if _parm_key(geom_id, "Aspect", "XSec_1") in parms:
+        half_span = get("Span", 1.0)
+        chord = half_span / get("Aspect", 1.0)
+        root = 2 * chord / (1 + taper)
+    elif _parm_key(geom_id, "Area", "XSec_1") in parms:
+        root = get("Root_Chord", 1.0)
+        chord = root * (1 + taper) / 2
+        half_span = get("Area") / chord
+    else:
+        root = get("Root_Chord", 1.0)
+        chord = (root + get("Tip_Chord", root)) / 2
+        half_span = get("Span", 1.0)
+    return {'span': 2 * half_span, 'chord': chord, 'root': root}
+
+def GetParmVal(parm_id: str) -> float:
+    container, group, name = parm_id.split(":")
+    if group == "WingGeom" or (group == "XSec_1" and name == "Root_Chord"):
+        wing = _wing(container)
+        return {'TotalSpan': wing['span'], 'TotalProjectedSpan': wing['span'], 'TotalChord': wing['chord'],
+                'TotalArea': wing['span'] * wing['chord'], 'TotalAR': wing['span'] / wing['chord'],
+                'Root_Chord': wing['root']}.get(name, 0.0)
+    return _model['parms'].get(parm_id, 0.0)
+
+
+## Analyses and results
+
+def DeleteAllResults():
+    _results.clear()
+
+def SetAnalysisInputDefaults(analysis: str):
+    for key in [k for k in _inputs if k[0] == analysis]:
+        del _inputs[key]
+
+def SetIntAnalysisInput(analysis: str, name: str, values, index: int = 0):
+    _inputs[(analysis, name)] = list(values)
+
+def SetDoubleAnalysisInput(analysis: str, name: str, values, index: int = 0):
+    _inputs[(analysis, name)] = list(values)
+
+def SetStringAnalysisInput(analysis: str, name: str, values, index: int = 0):
+    _inputs[(analysis, name)] = values
+
+def _store(name: str, data: dict) -> str:
+    result_id = f"{name}_{len(_results)}"
+    _results[result_id] = {'name': name, **data}
+    return result_id
+
+def ComputeMassProps(set_index: int, num_slices: int, mode: int = 0):
+    mass = sum(_model['parms'].get(_parm_key(g, "Density", "Mass_Props"), 0.0) * GetParmVal(_parm_key(g, "TotalArea", "WingGeom"))
+               for g in _model['geoms'])
+    _store("Mass_Properties", {'Total_Mass': [mass]})
+
+def FindLatestResultsID(name: str) -> str:
+    return [k for k, v in _results.items() if v['name'] == name][-1]
+
+def _polar(alpha_deg: float) -> tuple:
+    """CL, CDtot of the reference wing: lifting line slope, a soft stall and the first flap group"""
+    wing_id = _model['ref_wing'] or _model['geoms'][0]
+    parms = _model['parms']
+    AR = GetParmVal(_parm_key(wing_id, "TotalAR", "WingGeom"))
+    incidence = (parms.get(_parm_key(wing_id, "Twist", "XSec_0"), 0.0) + parms.get(_parm_key(wing_id, "Twist", "XSec_1"), 0.0)) / 2
+    camber = zlib.crc32(_model['airfoils'].get(wing_id, "").encode()) % 1000 / 1000 * 3      # deg, per airfoil
+    flap = abs(parms.get(_parm_key("VSPAEROSettings", "DeflectionAngle", "ControlSurfaceGroup_0"), 0.0))
+    x = math.radians(alpha_deg + incidence + camber + 0.4 * flap)
+    CL = 2 * math.pi * AR / (AR + 2) * x - 1.5 * max(x - math.radians(10), 0.0) ** 2 * 10
+    CD = 0.008 + 0.002 * flap / 10 + CL ** 2 / (math.pi * 0.85 * AR)
+    return CL, CD
+
+def ExecAnalysis(analysis: str) -> str:
+    global exec_count
+    exec_count += 1
+    if analysis != "VSPAEROSweep":
+        return _store(analysis, {})
+
+    marker = os.environ.get(FAKE_CRASH_ENV)
+    if marker and not os.path.exists(marker):
+        open(marker, 'w').close()
+        os._exit(1)
+
+    start = _inputs[(analysis, "AlphaStart")][0]
+    end = _inputs[(analysis, "AlphaEnd")][0]
+    npts = int(_inputs[(analysis, "AlphaNpts")][0])
+    points = []
+    for i in range(npts):
+        alpha = start if npts == 1 else start + (end - start) * i / (npts - 1)
+        CL, CD = _polar(alpha)
+        points.append(_store("VSPAERO_Polar", {'Alpha': [alpha], 'CL': [CL], 'CDtot': [CD]}))
+    return _store(analysis, {'ResultsVec': points})
+
+def GetStringResults(result_id: str, name: str) -> list:
+    return _results[result_id][name]
+
+def GetDoubleResults(result_id: str, name: str) -> list:
+    return _results[result_id][name]
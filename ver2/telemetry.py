@@ -0,0 +1,185 @@
+"""JSON-lines progress and throughput records of the grid workers, and a CLI that watches all of them
+
+Every worker writes <dir>/<stage>_<worker>.jsonl on the shared filesystem; the last line is its
+current state. Nothing but plain files is needed:
+
+    python telemetry.py watch                  # refresh every 10 s
+    python telemetry.py watch --once --stale 300
+"""
+import json
+import glob
+import os
+import os.path
+import socket
+import time
+from collections import Counter
+
+TELEMETRY_DIR = "data/telemetry"
+EMIT_SECONDS = 10
+STRAGGLER_RATIO = 1.5
+
+
+def rssMB() -> float:
+    """Resident set size of this process, from /proc where available, otherwise the peak RSS"""
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class WorkerTelemetry:
+    """Counters of one worker, appended as a JSON line at most every interval seconds
+
+    'done' counts the unit the ETA is based on (configurations for VSP, hashes for mission workers);
+    other counters (e.g. mission combinations) only get rates. A failed unit is counted as done too,
+    so the ETA reaches zero. Failures are counted by a stable reason code, with the last message of each
+    reason kept separately.
+    """
+    def __init__(self, stage: str, worker: str, total: int = 0, unit: str = "configurations",
+                 telemetryDir: str = TELEMETRY_DIR, interval: float = EMIT_SECONDS):
+        self.stage = stage
+        self.worker = worker
+        self.total = total
+        self.unit = unit
+        self.interval = interval
+        self.path = os.path.join(telemetryDir, f"{stage}_{worker}.jsonl")
+        self.counts = Counter()
+        self.failures = Counter()
+        self.failure_messages = {}
+        self.t_start = time.time()
+        self.t_last = self.t_start
+        self.last_counts = Counter()
+        os.makedirs(telemetryDir, exist_ok=True)
+        open(self.path, 'w').close()
+        self.emit()
+
+    def count(self, key: str = "done", n: int = 1):
+        self.counts[key] += n
+        if time.time() - self.t_last >= self.interval:
+            self.emit()
+
+    def fail(self, reason: str, message: str = ""):
+        """reason: stable code such as an exception class name; message: free text of this occurrence"""
+        self.failures[reason] += 1
+        if message:
+            self.failure_messages[reason] = message
+
+    def emit(self, final: bool = False):
+        now = time.time()
+        window = max(now - self.t_last, 1e-9)
+        elapsed = max(now - self.t_start, 1e-9)
+        rates = {k: (v - self.last_counts[k]) / window for k, v in self.counts.items()}
+        avg_rates = {k: v / elapsed for k, v in self.counts.items()}
+        done = self.counts['done']
+        eta = None
+        if self.total and avg_rates.get('done'):
+            eta = max(self.total - done, 0) / avg_rates['done']
+        record = {
+            'time': now, 'stage': self.stage, 'worker': self.worker,
+            'host': socket.gethostname(), 'pid': os.getpid(),
+            'unit': self.unit, 'done': done, 'total': self.total,
+            'counts': dict(self.counts), 'rates': rates, 'avg_rates': avg_rates,
+            'eta_seconds': eta, 'failures': dict(self.failures), 'failure_messages': self.failure_messages,
+            'rss_mb': rssMB(), 'elapsed': elapsed, 'final': final,
+        }
+        line = (json.dumps(record) + "\n").encode('utf-8')
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+        self.t_last = now
+        self.last_counts = Counter(self.counts)
+
+    def close(self):
+        self.emit(final=True)
+
+
+def lastRecord(path: str, tail_bytes: int = 65536):
+    """Last complete line of a telemetry file, or None"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(size - tail_bytes, 0))
+        block = f.read()
+    for line in reversed(block[:block.rfind(b'\n') + 1].splitlines()):
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+def clusterStatus(telemetryDir: str = TELEMETRY_DIR, stale_seconds: float = 120) -> dict:
+    """stage -> {'workers': last records, 'rates': summed rates, 'eta_seconds', 'failures', 'stragglers'}"""
+    now = time.time()
+    stages = {}
+    for path in sorted(glob.glob(os.path.join(telemetryDir, "*.jsonl"))):
+        record = lastRecord(path)
+        if record is None:
+            continue
+        record['age'] = now - record['time']
+        record['stale'] = not record['final'] and record['age'] > stale_seconds
+        stages.setdefault(record['stage'], []).append(record)
+
+    status = {}
+    for stage, workers in stages.items():
+        rates = Counter()
+        failures = Counter()
+        messages = {}
+        for record in workers:
+            if not record['final']:
+                rates.update(record['rates'])
+            failures.update(record['failures'])
+            messages.update(record.get('failure_messages', {}))
+        etas = [record['eta_seconds'] for record in workers if not record['final'] and record['eta_seconds'] is not None]
+        median_eta = sorted(etas)[len(etas) // 2] if etas else None
+        stragglers = [record['worker'] for record in workers
+                      if record['stale'] or (median_eta and record['eta_seconds'] is not None and not record['final']
+                                             and record['eta_seconds'] > STRAGGLER_RATIO * median_eta)]
+        status[stage] = {'workers': workers, 'rates': dict(rates), 'failures': dict(failures), 'failure_messages': messages,
+                         'eta_seconds': max(etas) if etas else None, 'stragglers': stragglers}
+    return status
+
+
+def _hours(seconds) -> str:
+    return "-" if seconds is None else f"{seconds/3600:.2f} h"
+
+def printStatus(status: dict):
+    print(f"[{time.strftime('%Y-%m-%d %X')}]")
+    for stage, summary in status.items():
+        rates = ", ".join(f"{k} {v:.2f}/s" for k, v in summary['rates'].items())
+        print(f"\n{stage}: {len(summary['workers'])} workers, {rates or 'idle'}, ETA {_hours(summary['eta_seconds'])}")
+        print(f"{'worker':15s} {'host':15s} {'done':>15s} {'rate/s':>9s} {'ETA':>9s} {'RSS MB':>8s} {'age s':>7s}")
+        for record in summary['workers']:
+            state = "done" if record['final'] else ("STALE" if record['stale'] else
+                                                    ("straggler" if record['worker'] in summary['stragglers'] else ""))
+            print(f"{record['worker']:15s} {record['host'][:15]:15s} {record['done']:>7d}/{record['total']:<7d} "
+                  f"{record['rates'].get('done', 0.0):9.3f} {_hours(record['eta_seconds']):>9s} "
+                  f"{record['rss_mb']:8.1f} {record['age']:7.0f} {state}")
+        if summary['failures']:
+            print("failures: " + ", ".join(f"{k} {v}" for k, v in Counter(summary['failures']).most_common()))
+            for reason, message in summary['failure_messages'].items():
+                print(f"  {reason}: {message[:200]}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Cluster-wide throughput and stragglers from the worker telemetry files.")
+    parser.add_argument("command", choices=['watch'])
+    parser.add_argument("--telemetry_dir", type=str, default=TELEMETRY_DIR)
+    parser.add_argument("--interval", type=float, default=EMIT_SECONDS, help="seconds between refreshes")
+    parser.add_argument("--stale", type=float, default=120, help="seconds without a record before a worker counts as stale")
+    parser.add_argument("--once", action="store_true", help="print the status once and exit")
+    args = parser.parse_args()
+
+    while True:
+        status = clusterStatus(args.telemetry_dir, args.stale)
+        if not args.once:
+            print("\033[2J\033[H", end="")
+        printStatus(status)
+        if args.once or (status and all(r['final'] for s in status.values() for r in s['workers'])):
+            break
+        time.sleep(args.interval)
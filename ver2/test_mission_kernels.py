@@ -0,0 +1,73 @@
+"""RK4_level / RK4_climb against RK4_step over calculate_acceleration_level / _climb, on randomized states
+
+    python -m pytest -q test_mission_kernels.py
+
+Runs offline: the sample aircraft test goes through benchmark.py, which falls back to the stand-in openvsp in stubs/.
+"""
+import os
+import os.path
+
+import numpy as np
+import pytest
+from scipy.interpolate import interp1d
+
+from mission_analysis import RK4_step, RK4_level, RK4_climb, calculate_acceleration_level, calculate_acceleration_climb
+import benchmark
+from benchmark import KERNEL_RTOL, KERNEL_DT
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Polar of a generic wing, so the kernels are checked independently of data/aircraft.csv
+ALPHAS = np.arange(-3, 11)
+CL_func = interp1d(ALPHAS, 0.35 + 0.09 * ALPHAS, kind="quadratic", fill_value="extrapolate")
+CD_func = interp1d(ALPHAS, 0.03 + 0.0008 * (ALPHAS - 1)**2, kind="quadratic", fill_value="extrapolate")
+CL_FLAP_MAX, CD_FLAP_MAX = 1.45, 0.11
+M, SREF = 8.0, 0.55
+WEIGHT = M * 9.81
+
+
+def randomStates(seed: int, n: int = 200) -> list:
+    """(v, alpha_deg, gamma_rad, T, flap) over the climb / level flight envelope"""
+    rng = np.random.default_rng(seed)
+    states = []
+    for _ in range(n):
+        speed, heading, gamma_rad = rng.uniform(1, 45), rng.uniform(0, 2*np.pi), rng.uniform(0, np.radians(30))
+        v = np.array([speed*np.cos(gamma_rad)*np.cos(heading), speed*np.cos(gamma_rad)*np.sin(heading),
+                      speed*np.sin(gamma_rad)])
+        states.append((v, float(rng.uniform(-5, 13)), float(gamma_rad), float(rng.uniform(0, 60)),
+                       bool(rng.integers(2))))
+    return states
+
+def assertClose(new, reference):
+    # Same measure as benchmark.checkKernels: relative to max(1, |a|)
+    error = np.max(np.abs(np.asarray(new) - reference)) / max(1.0, float(np.max(np.abs(reference))))
+    assert error <= KERNEL_RTOL, f"{new} != {reference.tolist()} (relative error {error:.2e})"
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_RK4_level_matches_RK4_step(seed):
+    for v, alpha_deg, _, T, _ in randomStates(seed):
+        reference = RK4_step(v, KERNEL_DT, lambda v: calculate_acceleration_level(v, M, SREF, CD_func, alpha_deg, T))
+        vx, vy, vz = v.tolist()
+        a_x = RK4_level(vx, vy, vz, KERNEL_DT, M, SREF, float(CD_func(alpha_deg)), alpha_deg, T)
+        assertClose([a_x, 0, 0], reference)
+
+@pytest.mark.parametrize("seed", range(5))
+def test_RK4_climb_matches_RK4_step(seed):
+    for v, alpha_deg, gamma_rad, T, flap in randomStates(seed):
+        reference = RK4_step(v, KERNEL_DT, lambda v: calculate_acceleration_climb(
+            v, M, WEIGHT, SREF, CL_func, CD_func, CL_FLAP_MAX, CD_FLAP_MAX, alpha_deg, gamma_rad, T, not flap))
+        if flap:
+            CL, CD = CL_FLAP_MAX, CD_FLAP_MAX
+        else:
+            CL, CD = float(CL_func(alpha_deg)), float(CD_func(alpha_deg))
+        vx, vy, vz = v.tolist()
+        a_x, a_z = RK4_climb(vx, vy, vz, KERNEL_DT, M, WEIGHT, SREF, CL, CD, alpha_deg, gamma_rad, T)
+        assertClose([a_x, 0, a_z], reference)
+
+def test_kernels_on_sample_aircraft(monkeypatch):
+    monkeypatch.chdir(HERE)
+    if not os.path.isfile("data/aircraft.csv"):
+        pytest.skip("no data/aircraft.csv")
+    result = benchmark.checkKernels(benchmark.makeContext(), n=500)
+    assert not result['mismatches'], result['mismatches'][:5]
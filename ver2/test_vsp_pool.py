@@ -0,0 +1,89 @@
+"""runVSPPool against the serial analyzeVSPConfiguration path, on the stand-in openvsp in stubs/
+
+    python -m pytest -q test_vsp_pool.py
+"""
+import os
+import os.path
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "stubs"))
+
+import numpy as np
+import pytest
+import openvsp
+
+if os.path.dirname(os.path.abspath(openvsp.__file__)) != os.path.join(HERE, "stubs"):
+    pytest.skip("the real openvsp was imported before the stand-in", allow_module_level=True)
+
+from main import get_config
+from vsp_analysis import VSPAnalyzer
+from vsp_grid import runVSPPool, analyzeVSPConfiguration, makeGridAircraft
+from telemetry import WorkerTelemetry
+
+CONFIGS = [(1800.0, 5.45, 0.45, 0.0, 'E852'), (1800.0, 5.50, 0.45, 0.0, 'E852'),
+           (1700.0, 5.45, 0.50, 1.0, 'MH122'), (1900.0, 5.60, 0.45, 0.0, 'S4062'),
+           (1800.0, 5.45, 0.45, 0.0, 'S9027')]
+FIELDS = ['alpha_list', 'CL', 'CD_total', 'm_empty', 'Sref', 'Lh', 'CL_flap_max', 'CD_flap_max', 'CD_flap_zero']
+
+
+@pytest.fixture
+def setup(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "out").mkdir()
+    presetValues, _, _, aerodynamicSetup, baseAircraft, _ = get_config()
+    alpha = np.arange(aerodynamicSetup.alpha_start, aerodynamicSetup.alpha_end + aerodynamicSetup.alpha_step/2,
+                      aerodynamicSetup.alpha_step)
+    CD_fuse = 0.01 + 2e-4 * alpha**2
+    tasks = [(i, makeGridAircraft(baseAircraft, *config)) for i, config in enumerate(CONFIGS)]
+
+    serial = {}
+    vspAnalyzer = VSPAnalyzer(presetValues)
+    for i, aircraft in tasks:
+        serial[i] = analyzeVSPConfiguration(vspAnalyzer, aircraft, aerodynamicSetup, CD_fuse, "aircraft.vsp3")
+    vspAnalyzer.clean()
+    return presetValues, aerodynamicSetup, CD_fuse, tasks, serial
+
+
+def runPool(presetValues, aerodynamicSetup, CD_fuse, tasks, **kwargs) -> list:
+    recorded = []
+    runVSPPool(tasks, aerodynamicSetup, presetValues, CD_fuse, 2, "aircraft.vsp3",
+               lambda i, analResults, seconds: recorded.append((i, analResults)), lambda done, i: None, **kwargs)
+    return recorded
+
+def assertMatchesSerial(recorded, serial):
+    assert sorted(i for i, _ in recorded) == sorted(serial)
+    for i, analResults in recorded:
+        assert analResults.aircraft == serial[i].aircraft
+        for field in FIELDS:
+            np.testing.assert_allclose(getattr(analResults, field), getattr(serial[i], field), rtol=1e-12, err_msg=field)
+
+
+def test_pool_matches_serial(setup):
+    presetValues, aerodynamicSetup, CD_fuse, tasks, serial = setup
+    assertMatchesSerial(runPool(presetValues, aerodynamicSetup, CD_fuse, tasks), serial)
+
+def test_pool_requeues_configuration_of_dead_worker(setup, tmp_path, monkeypatch, capsys):
+    presetValues, aerodynamicSetup, CD_fuse, tasks, serial = setup
+    marker = tmp_path / "crashed"
+    monkeypatch.setenv(openvsp.FAKE_CRASH_ENV, str(marker))
+
+    recorded = runPool(presetValues, aerodynamicSetup, CD_fuse, tasks)
+
+    assert marker.exists()
+    assert "requeued" in capsys.readouterr().out
+    assertMatchesSerial(recorded, serial)
+
+def test_pool_gives_up_without_retries(setup, tmp_path, monkeypatch, capsys):
+    presetValues, aerodynamicSetup, CD_fuse, tasks, serial = setup
+    monkeypatch.setenv(openvsp.FAKE_CRASH_ENV, str(tmp_path / "crashed"))
+
+    telemetry = WorkerTelemetry("vsp", "test", total=len(tasks), telemetryDir=str(tmp_path / "telemetry"))
+    recorded = runPool(presetValues, aerodynamicSetup, CD_fuse, tasks, max_retries=0, telemetry=telemetry)
+
+    assert "giving up" in capsys.readouterr().out
+    assert len(recorded) == len(tasks) - 1
+    # runPool's record does not count successes; the given-up configuration still counts as done for the ETA
+    assert telemetry.failures == {'worker_exited': 1}
+    assert telemetry.counts['done'] == 1
+    assertMatchesSerial(recorded, {i: serial[i] for i, _ in recorded})
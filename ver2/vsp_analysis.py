@@ -3,16 +3,18 @@ import csv
 import numpy as np
 import json
 from typing import List
-from dataclasses import asdict
+from dataclasses import asdict, replace
 import ast
 import os 
 import os.path
 import math
-import matplotlib.pyplot as plt
+import time
 import pandas as pd
-from matplotlib.ticker import MultipleLocator
-from internal_dataclass import PhysicalConstants, Aircraft, AircraftAnalysisResults
-from setup_dataclass import PresetValues
+from internal_dataclass import PhysicalConstants, Aircraft, AircraftAnalysisResults, AdaptiveAlphaSweep
+from setup_dataclass import PresetValues, FidelityTier, default_fidelity_tiers
+# Results store I/O lives in results_store.py, so mission workers can read it without importing OpenVSP
+from results_store import (resetAnalysisResults, removeAnalysisResults, writeAnalysisResults,
+                           loadAnalysisResults, loadAllAnalysisResults)
 
 
 class VSPAnalyzer:
@@ -22,14 +24,18 @@ class VSPAnalyzer:
         self.presets = presets
         self.dataPath = dataPath
         self.outputPath = outputPath
+        self.model_aircraft = None      # aircraft the loaded model was built for
+        # VSPAERO sweeps run by this analyzer: ExecAnalysis calls, alpha points and wall time
+        self.sweep_stats = {'runs': 0, 'points': 0, 'seconds': 0.0}
         vsp.VSPCheckSetup()
 
     def clean(self) -> None:
         vsp.ClearVSPModel()
         vsp.VSPRenew()
+        self.model_aircraft = None
           
         
-    def setup_vsp_model(self, aircraft: Aircraft,vspPath:str = "Mothership.vsp3") -> None:
+    def setup_vsp_model(self, aircraft: Aircraft,vspPath:str = "Mothership.vsp3", writeFile:bool=True) -> None:
         """Creates or updates OpenVSP model based on aircraft parameters"""
         self.aircraft = aircraft
         self.wing_id = self.createMainWing(aircraft)
@@ -39,7 +45,54 @@ class VSPAnalyzer:
         self.vertical_tail_R_id,self.vertical_tail_L_id = self.createVerticalTailWings(aircraft)
         
         vsp.Update()
-        vsp.WriteVSPFile(os.path.join(self.outputPath,vspPath),vsp.SET_ALL)
+        self.model_aircraft = aircraft
+        if writeFile:
+            vsp.WriteVSPFile(os.path.join(self.outputPath,vspPath),vsp.SET_ALL)
+
+    def update_vsp_model(self, aircraft: Aircraft, vspPath:str = "Mothership.vsp3", writeFile:bool=False) -> None:
+        """Keeps the loaded model as a session and only changes the main wing sweep parameters.
+
+        Span, AR, taper, twist and the main wing airfoil are set in place and the tails are
+        resized from the new main wing. Any other change rebuilds the model from scratch.
+        Use calculateCoefficients(fileName=None) to analyze the model in memory.
+        """
+        old = self.model_aircraft
+        same_frame = old is not None and replace(aircraft,
+                                                 mainwing_span=old.mainwing_span,
+                                                 mainwing_AR=old.mainwing_AR,
+                                                 mainwing_taper=old.mainwing_taper,
+                                                 mainwing_twist=old.mainwing_twist,
+                                                 mainwing_airfoil_datapath=old.mainwing_airfoil_datapath) == old
+        if not same_frame:
+            if old is not None:
+                self.clean()
+            self.setup_vsp_model(aircraft, vspPath=vspPath, writeFile=writeFile)
+            return
+
+        self.aircraft = aircraft
+        vsp.DeleteAllResults()
+
+        if aircraft.mainwing_span != old.mainwing_span:
+            vsp.SetParmVal(self.wing_id, "Span", "XSec_1", aircraft.mainwing_span / 2)
+        if aircraft.mainwing_AR != old.mainwing_AR:
+            vsp.SetParmVal(self.wing_id, "Aspect", "XSec_1", aircraft.mainwing_AR / 2)
+        if aircraft.mainwing_taper != old.mainwing_taper:
+            vsp.SetParmVal(self.wing_id, "Taper", "XSec_1", aircraft.mainwing_taper)
+        if aircraft.mainwing_twist != old.mainwing_twist:
+            vsp.SetParmVal(self.wing_id, "Twist", "XSec_1", aircraft.mainwing_incidence - aircraft.mainwing_twist)
+        if aircraft.mainwing_airfoil_datapath != old.mainwing_airfoil_datapath:
+            for i in range(2):
+                vsp.ReadFileAirfoil(vsp.GetXSec(vsp.GetXSecSurf(self.wing_id,0),i), aircraft.mainwing_airfoil_datapath)
+        vsp.Update()
+
+        # Tail sizes follow the main wing chord and span
+        self.sizeHorizontalTailWing(aircraft)
+        self.sizeVerticalTailWings(aircraft)
+
+        vsp.Update()
+        self.model_aircraft = aircraft
+        if writeFile:
+            vsp.WriteVSPFile(os.path.join(self.outputPath,vspPath),vsp.SET_ALL)
         
     def calculateCoefficients(self, fileName:str = "Mothership.vsp3", 
                               alpha_start: float=0, alpha_end: float=1, alpha_step:float=0.5, 
@@ -55,22 +108,38 @@ class VSPAnalyzer:
                               boom_density_1008:float = 0.049,
                               boom_density_0604:float = 0.042,
                               boom_density_boom:float=0.121,
-                              clearModel:bool=True):
+                              clearModel:bool=True,
+                              fidelity:str="production",
+                              fidelityTier:FidelityTier=None,
+                              flap_cases:list=None):
+        """flap_cases: [(flap_angle, alphas), ...], default flaps up over the alpha sweep
+        and flaps down at alpha 0 and AOA_takeoff_max, all solved in one model session.
+        The first two cases are read as the flaps-up sweep and the flaps-down (0, AOA_takeoff_max) pair;
+        further cases are solved but not used."""
         #print("Starting Analysis")
-        # Calculate coefficients with flaps at zero
-        results_no_flap = self._calculate_coeffs_helper(fileName, alpha_start, alpha_end, alpha_step,
-                                                        Re, Mach, wing_area_blocked_by_fuselage,boom_density_2624, boom_density_1008,
-                                                        boom_density_0604, boom_density_boom, clearModel, 0.0)
+        if fidelityTier is None:
+            fidelityTier = default_fidelity_tiers()[fidelity]
+        alpha_nominal = fidelityTier.alpha_grid(alpha_start, alpha_end, alpha_step)
+        if flap_cases is None:
+            alphas = alpha_nominal
+            if fidelityTier.adaptive_alpha:
+                alphas = AdaptiveAlphaSweep(alpha_start, alpha_end, len(alphas),
+                                            fidelityTier.CL_tolerance, fidelityTier.CD_tolerance)
+            flap_cases = [(0.0, alphas),
+                          (self.aircraft.flap_angle[0], [0, AOA_takeoff_max])]
+        if len(flap_cases) < 2:
+            raise ValueError(f"flap_cases needs the flaps-up sweep and the flaps-down (0, AOA_takeoff_max) case, "
+                             f"got {len(flap_cases)} case(s)")
+        if len(flap_cases[1][1]) != 2:
+            raise ValueError(f"The flaps-down case needs the alphas [0, AOA_takeoff_max], got {flap_cases[1][1]}")
+
+        cases = self.calculateFlapCases(fileName, flap_cases, Re, Mach, wing_area_blocked_by_fuselage,
+                                        boom_density_2624, boom_density_1008, boom_density_0604, boom_density_boom,
+                                        clearModel, fidelityTier)
+        results_no_flap, results_flap_max = cases[0], cases[1]
         
-        # Find index closest to AOA_stall and zero
         alpha_list = results_no_flap['alpha_list']
 
-        # Calculate coefficients with flaps at max angle
-        results_flap_max = self._calculate_coeffs_helper(fileName, 0, AOA_takeoff_max, AOA_takeoff_max,
-                                                        Re, Mach, wing_area_blocked_by_fuselage, boom_density_2624, boom_density_1008,
-                                                        boom_density_0604, boom_density_boom, False, self.aircraft.flap_angle[0],
-                                                        do_mass_analysis=False)
-
         # Get corresponding CL/CD values
         CL_flap_max = results_flap_max['CL'][1]
         CD_flap_max = results_flap_max['CD'][1]
@@ -78,7 +147,13 @@ class VSPAnalyzer:
         CD_flap_zero = results_flap_max['CD'][0]
     
         CD_fuse = CD_fuse * (fuselage_cross_section_area / results_no_flap['Sref']) 
-        zero_index = int((0-alpha_start)/alpha_step)
+        # CD_fuse is given on the tier's nominal grid; adaptive sweeps evaluate other alphas
+        if len(CD_fuse) != len(alpha_nominal):
+            alpha_nominal = np.linspace(alpha_start, alpha_end, len(CD_fuse))
+        if len(alpha_list) != len(CD_fuse) or not np.allclose(alpha_list, alpha_nominal):
+            CD_fuse = np.interp(alpha_list, alpha_nominal, CD_fuse)
+        # alpha=0 is not on the grid for every tier's point count
+        CD_fuse_zero = np.interp(0, alpha_list, CD_fuse)
         
         #print("Finished Analysis for this configuration.")
         
@@ -106,18 +181,87 @@ class VSPAnalyzer:
                 CL_flap_max=CL_flap_max,
                 CL_flap_zero=CL_flap_zero,
                 CD_flap_max=CD_flap_max + CD_fuse[-1],
-                CD_flap_zero=CD_flap_zero + CD_fuse[zero_index],
-                max_load=self.presets.max_load
+                CD_flap_zero=CD_flap_zero + CD_fuse_zero,
+                max_load=self.presets.max_load,
+                fidelity=fidelity
         )
 
-    def _calculate_coeffs_helper(self, fileName, alpha_start, alpha_end, alpha_step,
-                                Re, Mach, wing_area_blocked_by_fuselage, boom_density_2624, boom_density_1008,
-                                boom_density_0604, boom_density_boom, clearModel, flap_angle, 
-                                do_mass_analysis=True, do_geom_analysis=True):
-        """Helper method to calculate coefficients for a given flap angle"""
-        
-        point_number = round(int((alpha_end - alpha_start) / alpha_step) + 1)
-        
+    def calculateFlapCases(self, fileName, flap_cases, Re, Mach, wing_area_blocked_by_fuselage,
+                           boom_density_2624, boom_density_1008, boom_density_0604, boom_density_boom,
+                           clearModel, fidelityTier:FidelityTier=None) -> list:
+        """Solves every (flap_angle, alphas) case on one loaded model.
+        Geometry, mass and the VSPAEROSweep settings are set up once; each case only changes
+        the control group deflection and the alpha range. alphas must be evenly spaced
+        or an AdaptiveAlphaSweep.
+        fileName=None analyzes the model loaded in memory instead of reading it back from the file.
+        The first case also carries the geometry and mass results."""
+        
+        if fidelityTier is None:
+            fidelityTier = default_fidelity_tiers()["production"]
+        if not flap_cases:
+            raise ValueError("flap_cases is empty")
+        
+        if fileName is not None:
+            self._load_model(fileName, clearModel)
+        
+        geometry = self._geometry_analysis()
+        mass = self._mass_analysis(geometry, boom_density_2624, boom_density_1008, boom_density_0604, boom_density_boom)
+        self._configure_sweep(Re, Mach, fidelityTier)
+        
+        Sref = geometry['Sref']
+        effective_wing_area_factor = (Sref - wing_area_blocked_by_fuselage) / Sref
+
+        cases = []
+        for k, (flap_angle, alphas) in enumerate(flap_cases):
+            # Set flap angle
+            for flap_id in self.flap_id:
+                vsp.SetParmVal(flap_id[0], flap_angle)
+                vsp.SetParmVal(flap_id[1], -flap_angle)
+
+            if isinstance(alphas, AdaptiveAlphaSweep):
+                alpha_list, CL_list, CDwing_list = self._adaptive_sweep(alphas)
+            else:
+                alphas = np.asarray(alphas, float)
+                if len(alphas) > 2 and not np.allclose(np.diff(alphas), alphas[1] - alphas[0]):
+                    raise ValueError(f"Flap case {k} alphas are not evenly spaced: {alphas}")
+                alpha_list, CL_list, CDwing_list = self._exec_sweep(alphas[0], alphas[-1], len(alphas))
+
+            # Only the first (flaps up) sweep is corrected for the tail, as before
+            tail_effect = mass['tail_effect'] if k == 0 else 1
+            cases.append({
+                'flap_angle': flap_angle,
+                'alpha_list': alpha_list,
+                'CL': CL_list * tail_effect * effective_wing_area_factor,
+                'CD': CDwing_list * effective_wing_area_factor
+            })
+
+        cases[0].update({
+            'm_empty': mass['m_empty'],
+            'm_boom': mass['m_boom'],
+            'm_wing': mass['m_wing'],
+            'span': geometry['span'],
+            'AR': geometry['AR'],
+            'taper': geometry['taper'],
+            'twist': geometry['twist'],
+            'Sref': Sref,
+            'Lw': mass['Lw'],
+            'Lh': mass['Lh']
+        })
+        return cases
+
+    def calculateGeometryMass(self, fileName:str = None,
+                              boom_density_2624:float = 0.121, 
+                              boom_density_1008:float = 0.049,
+                              boom_density_0604:float = 0.042,
+                              boom_density_boom:float=0.121) -> dict:
+        """Geometry and mass only (no VSPAERO sweep), for the pre-pass before the aerodynamic stage"""
+        if fileName is not None:
+            self._load_model(fileName, True)
+        geometry = self._geometry_analysis(vspaero_geometry=False)
+        mass = self._mass_analysis(geometry, boom_density_2624, boom_density_1008, boom_density_0604, boom_density_boom)
+        return {**geometry, **mass}
+
+    def _load_model(self, fileName, clearModel):
         if(clearModel):
             vsp.ClearVSPModel()
         vsp.VSPRenew()
@@ -127,15 +271,11 @@ class VSPAnalyzer:
                 raise FileNotFoundError(f"Model file {fileName} not found.")
                 
         vsp.ReadVSPFile(os.path.join(self.outputPath,fileName))
-        
-        # Set flap angle
-        for i, flap_id in enumerate(self.flap_id):
-            vsp.SetParmVal(flap_id[0], flap_angle)
-            vsp.SetParmVal(flap_id[1], -flap_angle)
-        # Geometric analysis
-        
-        if do_geom_analysis:
-            #print("> Starting Geometric Analysis")
+
+    def _geometry_analysis(self, vspaero_geometry:bool=True) -> dict:
+        """Wing parms of the loaded model; vspaero_geometry also builds the VSPAERO geometry for a sweep"""
+        #print("> Starting Geometric Analysis")
+        if vspaero_geometry:
             geom_analysis = "VSPAEROComputeGeometry"
             vsp.SetAnalysisInputDefaults(geom_analysis)
             vsp.ExecAnalysis(geom_analysis)
@@ -143,58 +283,49 @@ class VSPAnalyzer:
             # Configure VSPAERO
             vsp.SetVSPAERORefWingID(self.wing_id) ##### wing_id 확인할것
 
-            span = vsp.GetParmVal(vsp.GetParm(self.wing_id,"TotalSpan","WingGeom"))
-            AR = vsp.GetParmVal(vsp.GetParm(self.wing_id,"TotalAR","WingGeom"))
-            taper = vsp.GetParmVal(vsp.GetParm(self.wing_id,"Taper","XSec_1"))
-            twist = self.aircraft.mainwing_incidence - vsp.GetParmVal(vsp.GetParm(self.wing_id,"Twist","XSec_1"))
-            Sref = vsp.GetParmVal(vsp.GetParm(self.wing_id,"TotalArea","WingGeom"))
-            wing_c_root = vsp.GetParmVal(vsp.GetParm(self.wing_id,"Root_Chord","XSec_1"))
-            tail_c_root = vsp.GetParmVal(vsp.GetParm(self.horizontal_tail_id,"Root_Chord","XSec_1"))
-            #print("> Finished Geometric Analysis")
-        else:
-            #print("> Skipping Geometric Analysis")
-            span = 0
-            AR = 0
-            taper = 0
-            twist = 0
-            Sref = 0
-            wing_c_root = 0
-            tail_c_root = 0
-        
-        if do_mass_analysis:
-            # Mass Analysis
-            #print("> Starting Mass Analysis")
-            vsp.ComputeMassProps(0, 100, 0)
-            mass_results_id = vsp.FindLatestResultsID("Mass_Properties")
-            mass_data = vsp.GetDoubleResults(mass_results_id, "Total_Mass")
-
-            span_Projected = vsp.GetParmVal(vsp.GetParm(self.wing_id,"TotalProjectedSpan","WingGeom"))
-            chord_Mean = vsp.GetParmVal(vsp.GetParm(self.wing_id,"TotalChord","WingGeom"))
-            lh = self.aircraft.horizontal_volume_ratio * chord_Mean / self.aircraft.horizontal_area_ratio
-            horizontal_distance = chord_Mean/4 + lh - tail_c_root/4
-
-            m_wing = mass_data[0] + span * (boom_density_1008 + boom_density_2624 + boom_density_0604)
-            
-            m_boom = horizontal_distance * boom_density_boom * 2
-            
-            m_empty = m_wing + m_boom + self.aircraft.m_fuselage + self.presets.m_x1
-            
-            mass_center_x = 120 # Calculated by CG Calculater, static margin 10%
-
-            # Aerodynamic Center
-            w_ac = 0.25 * 2/3 * wing_c_root * (1 + taper + taper ** 2) / (1 + taper)
-            h_ac = w_ac + lh
-            Lw = w_ac - mass_center_x
-            Lh = h_ac - mass_center_x
-            tail_effect = float((Lh-Lw)/Lh)
-
-            #print("> Finished Mass Analysis")
-        else:
-            #print("> Skipping Mass Analysis")
-            m_empty, m_boom, m_wing = 0, 0, 0
-            Lw, Lh = 0, 0
-            tail_effect = 1
+        #print("> Finished Geometric Analysis")
+        return {
+            'span': vsp.GetParmVal(vsp.GetParm(self.wing_id,"TotalSpan","WingGeom")),
+            'AR': vsp.GetParmVal(vsp.GetParm(self.wing_id,"TotalAR","WingGeom")),
+            'taper': vsp.GetParmVal(vsp.GetParm(self.wing_id,"Taper","XSec_1")),
+            'twist': self.aircraft.mainwing_incidence - vsp.GetParmVal(vsp.GetParm(self.wing_id,"Twist","XSec_1")),
+            'Sref': vsp.GetParmVal(vsp.GetParm(self.wing_id,"TotalArea","WingGeom")),
+            'wing_c_root': vsp.GetParmVal(vsp.GetParm(self.wing_id,"Root_Chord","XSec_1")),
+            'tail_c_root': vsp.GetParmVal(vsp.GetParm(self.horizontal_tail_id,"Root_Chord","XSec_1"))
+        }
+
+    def _mass_analysis(self, geometry, boom_density_2624, boom_density_1008, boom_density_0604, boom_density_boom) -> dict:
+        # Mass Analysis
+        #print("> Starting Mass Analysis")
+        vsp.ComputeMassProps(0, 100, 0)
+        mass_results_id = vsp.FindLatestResultsID("Mass_Properties")
+        mass_data = vsp.GetDoubleResults(mass_results_id, "Total_Mass")
 
+        chord_Mean = vsp.GetParmVal(vsp.GetParm(self.wing_id,"TotalChord","WingGeom"))
+        lh = self.aircraft.horizontal_volume_ratio * chord_Mean / self.aircraft.horizontal_area_ratio
+        horizontal_distance = chord_Mean/4 + lh - geometry['tail_c_root']/4
+
+        m_wing = mass_data[0] + geometry['span'] * (boom_density_1008 + boom_density_2624 + boom_density_0604)
+        
+        m_boom = horizontal_distance * boom_density_boom * 2
+        
+        m_empty = m_wing + m_boom + self.aircraft.m_fuselage + self.presets.m_x1
+        
+        mass_center_x = 120 # Calculated by CG Calculater, static margin 10%
+
+        # Aerodynamic Center
+        taper = geometry['taper']
+        w_ac = 0.25 * 2/3 * geometry['wing_c_root'] * (1 + taper + taper ** 2) / (1 + taper)
+        h_ac = w_ac + lh
+        Lw = w_ac - mass_center_x
+        Lh = h_ac - mass_center_x
+        tail_effect = float((Lh-Lw)/Lh)
+
+        #print("> Finished Mass Analysis")
+        return {'m_empty': m_empty, 'm_boom': m_boom, 'm_wing': m_wing, 'Lw': Lw, 'Lh': Lh, 'tail_effect': tail_effect}
+
+    def _configure_sweep(self, Re, Mach, fidelityTier:FidelityTier):
+        """VSPAEROSweep settings shared by every case of a configuration"""
         # Configure sweep analysis for coefficient
         #print("> Starting Sweep Analysis")
         
@@ -206,14 +337,11 @@ class VSPAnalyzer:
         # **Set the reference geometry set**
         vsp.SetDoubleAnalysisInput(sweep_analysis, "MachStart", [Mach])
         vsp.SetDoubleAnalysisInput(sweep_analysis, "ReCref", [Re])
-        vsp.SetDoubleAnalysisInput(sweep_analysis, "AlphaStart", [alpha_start])
-        vsp.SetDoubleAnalysisInput(sweep_analysis, "AlphaEnd", [alpha_end])
-        vsp.SetIntAnalysisInput(sweep_analysis, "AlphaNpts", [point_number])
         
-        # Number of CPUs
-        vsp.SetIntAnalysisInput(sweep_analysis, "NCPU", [1])
-        vsp.SetIntAnalysisInput(sweep_analysis,"FixedWakeFlag",[1])
-        vsp.SetIntAnalysisInput(sweep_analysis,"NumWakeNodes",[64])
+        # Number of CPUs and wake model, set by the fidelity tier
+        vsp.SetIntAnalysisInput(sweep_analysis, "NCPU", [fidelityTier.ncpu])
+        vsp.SetIntAnalysisInput(sweep_analysis,"FixedWakeFlag",[fidelityTier.fixed_wake])
+        vsp.SetIntAnalysisInput(sweep_analysis,"NumWakeNodes",[fidelityTier.num_wake_nodes])
         
         
         # Redirect log to null
@@ -222,18 +350,70 @@ class VSPAnalyzer:
         # Disable CpSlice
         aero_id = vsp.FindContainer("VSPAEROSettings",0);
         vsp.SetParmVal(aero_id,"CpSliceFlag","VSPAERO",0);
+
+    def _adaptive_sweep(self, sweep:AdaptiveAlphaSweep):
+        """Bisection on the nominal grid linspace(alpha_start, alpha_end, max_npts): a coarse sweep over every
+        stride-th nominal alpha, then per level the intervals whose estimated linear interpolation error
+        |f''| h^2 / 8 of CL or CD exceeds the tolerance get their midpoint. Every ExecAnalysis is evenly
+        spaced: one per level and run of adjacent refined intervals, plus one for the nominal alphas past
+        the last coarse one when the stride does not divide max_npts - 1."""
+        N = sweep.max_npts
+        alpha_nominal = np.linspace(sweep.alpha_start, sweep.alpha_end, N)
+        stride = 1
+        while (N - 1) // (stride * 2) + 1 >= sweep.initial_npts:
+            stride *= 2
+        if stride < 2:
+            return self._exec_sweep(sweep.alpha_start, sweep.alpha_end, N)
+
+        CL_list, CDwing_list = np.full(N, np.nan), np.full(N, np.nan)
+        def solve(indices):
+            _, CL_list[indices], CDwing_list[indices] = self._exec_sweep(alpha_nominal[indices[0]], alpha_nominal[indices[-1]], len(indices))
+
+        coarse = np.arange(0, N, stride)
+        solve(coarse)
+        if coarse[-1] < N - 1:
+            solve(np.arange(coarse[-1] + 1, N))
+
+        while stride > 1:
+            known = np.flatnonzero(~np.isnan(CL_list))
+            h = np.diff(alpha_nominal[known])
+            error = np.maximum(_intervalCurvature(alpha_nominal[known], CL_list[known]) * h**2 / 8 / sweep.CL_tolerance,
+                               _intervalCurvature(alpha_nominal[known], CDwing_list[known]) * h**2 / 8 / sweep.CD_tolerance)
+            # Only intervals of the current stride can be bisected on the nominal grid
+            midpoints = [known[j] + stride // 2 for j in np.flatnonzero((error > 1) & (np.diff(known) == stride))]
+            stride //= 2
+            run = []
+            for m in midpoints:
+                if run and m - run[-1] != 2 * stride:
+                    solve(np.array(run))
+                    run = []
+                run.append(m)
+            if run:
+                solve(np.array(run))
+
+        solved = ~np.isnan(CL_list)
+        return alpha_nominal[solved], CL_list[solved], CDwing_list[solved]
+
+    def _exec_sweep(self, alpha_start, alpha_end, point_number):
+        """Runs the configured VSPAEROSweep and returns raw (alpha, CL, CDtot) arrays"""
+        sweep_analysis = "VSPAEROSweep"
+        vsp.SetDoubleAnalysisInput(sweep_analysis, "AlphaStart", [alpha_start])
+        vsp.SetDoubleAnalysisInput(sweep_analysis, "AlphaEnd", [alpha_end])
+        vsp.SetIntAnalysisInput(sweep_analysis, "AlphaNpts", [point_number])
         vsp.Update()
         
         # Execute sweep analysis
+        t_start = time.perf_counter()
         sweep_results_id = vsp.ExecAnalysis(sweep_analysis)
+        self.sweep_stats['runs'] += 1
+        self.sweep_stats['points'] += point_number
+        self.sweep_stats['seconds'] += time.perf_counter() - t_start
         
         #print("> Finished Sweep Analysis")
 
         # Extract coefficient data
         sweepResults = vsp.GetStringResults(sweep_results_id, "ResultsVec")
         
-        effective_wing_area_factor = (Sref - wing_area_blocked_by_fuselage) / Sref
-        
         alpha_list = np.zeros(point_number)
         CL_list = np.zeros(point_number)
         CDwing_list =np.zeros(point_number)
@@ -245,26 +425,7 @@ class VSPAnalyzer:
 
             CDwing_list[i] = vsp.GetDoubleResults(sweepResults[i], "CDtot")[-1]
 
-        CL_list = [cl * tail_effect * effective_wing_area_factor for cl in CL_list]
-        CL_list = np.array(CL_list)
-        CDwing_list = [cd * effective_wing_area_factor for cd in CDwing_list] 
-        CDwing_list = np.array(CDwing_list)
-
-        return {
-            'alpha_list': alpha_list,
-            'm_empty': m_empty,
-            'm_boom': m_boom,
-            'm_wing': m_wing,
-            'span': span,
-            'AR': AR,
-            'taper': taper,
-            'twist': twist,
-            'Sref': Sref,
-            'Lw': Lw,
-            'Lh': Lh,
-            'CL': CL_list,
-            'CD': CDwing_list
-        }
+        return alpha_list, CL_list, CDwing_list
 
     def createMainWing(self, aircraft: Aircraft) -> str:
 
@@ -369,6 +530,15 @@ class VSPAnalyzer:
         vsp.ReadFileAirfoil(xsec_h_0,aircraft.horizontal_airfoil_datapath)
         vsp.ReadFileAirfoil(xsec_h_1,aircraft.horizontal_airfoil_datapath)
         vsp.Update()
+
+        self.horizontal_tail_id = tailwing_id
+        self.sizeHorizontalTailWing(aircraft)
+
+        return tailwing_id
+
+    def sizeHorizontalTailWing(self, aircraft:Aircraft) -> None:
+        """ Size and place the Horizontal Tail from the current Main Wing """
+        tailwing_id = self.horizontal_tail_id
         
         # Fixed Parameters
         tailwing_sweep = 0
@@ -408,8 +578,6 @@ class VSPAnalyzer:
 
         vsp.Update()
 
-        return tailwing_id
-
     def createVerticalTailWings(self,aircraft:Aircraft,airfoilName:str="naca0009.dat") -> List[str]:
 
         """ Create Vertical Wing (Right), Included Parameters are FIXED """
@@ -426,6 +594,28 @@ class VSPAnalyzer:
         vsp.ReadFileAirfoil(xsec_vr_1,aircraft.vertical_airfoil_datapath)
         vsp.Update()
         
+        """ Create Vertical Wing (Left), Included Parameters are FIXED """
+        # Vertical Wing (Left) ID
+        verwing_left_id = vsp.AddGeom("WING", "")
+        vsp.SetGeomName(verwing_left_id,"Vertical Wing Left")
+        
+        # Airfoil Selection
+        vsp.ChangeXSecShape(vsp.GetXSecSurf(verwing_left_id,0),0,vsp.XS_FILE_AIRFOIL)
+        vsp.ChangeXSecShape(vsp.GetXSecSurf(verwing_left_id,0),1,vsp.XS_FILE_AIRFOIL)
+        xsec_vl_0 = vsp.GetXSec(vsp.GetXSecSurf(verwing_left_id,0),0)
+        xsec_vl_1 = vsp.GetXSec(vsp.GetXSecSurf(verwing_left_id,0),1)
+        vsp.ReadFileAirfoil(xsec_vl_0,aircraft.vertical_airfoil_datapath)
+        vsp.ReadFileAirfoil(xsec_vl_1,aircraft.vertical_airfoil_datapath)
+        vsp.Update()
+
+        self.vertical_tail_R_id, self.vertical_tail_L_id = verwing_right_id, verwing_left_id
+        self.sizeVerticalTailWings(aircraft)
+
+        return [verwing_right_id,verwing_left_id]
+
+    def sizeVerticalTailWings(self, aircraft:Aircraft) -> None:
+        """ Size and place both Vertical Wings from the current Main Wing and Horizontal Tail """
+        
         # Fixed Parameters
         verwing_sweep = 0
         verwing_yoffset = 290
@@ -450,113 +640,39 @@ class VSPAnalyzer:
         vertical_c_root = chord_Mean_horizontal
         horizontal_distance = chord_Mean/4 + lh - horizontal_root/4
         
-        # Vertical Tail settings
-        vsp.SetDriverGroup(verwing_right_id, 1, vsp.AREA_WSECT_DRIVER, vsp.TAPER_WSECT_DRIVER, vsp.ROOTC_WSECT_DRIVER)
-        vsp.SetParmVal(verwing_right_id, "Area", "XSec_1", vertical_area / 2)  # Span of the each wing (Half of span)
-        vsp.SetParmVal(verwing_right_id, "Taper", "XSec_1", aircraft.vertical_taper)  
-        vsp.SetParmVal(verwing_right_id, "Root_Chord", "XSec_1", vertical_c_root) 
-        vsp.SetParmVal(verwing_right_id, "Sweep", "XSec_1", verwing_sweep) #Sweep Angle
-        vsp.SetParmVal(verwing_right_id, "Sweep_Location", "XSec_1", 0.99)
-        vsp.SetParmVal(verwing_right_id, "X_Rel_Location", "XForm", horizontal_distance)  # Position along X-axis
-        vsp.SetParmVal(verwing_right_id, "Y_Rel_Location", "XForm", verwing_yoffset)  # Position along Y-axis
-        vsp.SetParmVal(verwing_right_id, "Z_Rel_Location", "XForm", verwing_zoffset)  # Position vertically
-        vsp.SetParmVal(verwing_right_id, "X_Rel_Rotation", "XForm", verwing_xRotate)  # X-axis Rotation
-        vsp.SetParmVal(verwing_right_id, "CapUMaxOption", "EndCap" , verwing_option_tip)
-        vsp.SetParmVal(verwing_right_id, "CapUMaxLength", "EndCap" , verwing_length_tip)
-        vsp.SetParmVal(verwing_right_id, "CapUMaxOffset", "EndCap" , verwing_offset_tip)
-        vsp.SetParmVal(verwing_right_id, "Sym_Planar_Flag","Sym", 0)
-        vsp.SetParmVal(verwing_right_id, "Density", "Mass_Props", aircraft.wing_density)
-        vsp.Update()
-        
-        """ Create Vertical Wing (Left), Included Parameters are FIXED """
-        # Vertical Wing (Left) ID
-        verwing_left_id = vsp.AddGeom("WING", "")
-        vsp.SetGeomName(verwing_left_id,"Vertical Wing Left")
-        
-        # Airfoil Selection
-        vsp.ChangeXSecShape(vsp.GetXSecSurf(verwing_left_id,0),0,vsp.XS_FILE_AIRFOIL)
-        vsp.ChangeXSecShape(vsp.GetXSecSurf(verwing_left_id,0),1,vsp.XS_FILE_AIRFOIL)
-        xsec_vl_0 = vsp.GetXSec(vsp.GetXSecSurf(verwing_left_id,0),0)
-        xsec_vl_1 = vsp.GetXSec(vsp.GetXSecSurf(verwing_left_id,0),1)
-        vsp.ReadFileAirfoil(xsec_vl_0,aircraft.vertical_airfoil_datapath)
-        vsp.ReadFileAirfoil(xsec_vl_1,aircraft.vertical_airfoil_datapath)
-        vsp.Update()
-        
-        # Vertical Tail settings
-        vsp.SetDriverGroup(verwing_left_id, 1, vsp.AREA_WSECT_DRIVER, vsp.TAPER_WSECT_DRIVER, vsp.ROOTC_WSECT_DRIVER)
-        vsp.SetParmVal(verwing_left_id, "Area", "XSec_1", vertical_area / 2)  # Span of the each wing (Half of span)
-        vsp.SetParmVal(verwing_left_id, "Taper", "XSec_1", aircraft.vertical_taper)  
-        vsp.SetParmVal(verwing_left_id, "Root_Chord", "XSec_1", vertical_c_root) 
-        vsp.SetParmVal(verwing_left_id, "Sweep", "XSec_1", verwing_sweep) #Sweep Angle
-        vsp.SetParmVal(verwing_left_id, "Sweep_Location", "XSec_1", 0.99)
-        vsp.SetParmVal(verwing_left_id, "X_Rel_Location", "XForm", horizontal_distance)  # Position along X-axis
-        vsp.SetParmVal(verwing_left_id, "Y_Rel_Location", "XForm", -1 * verwing_yoffset)  # Position along Y-axis
-        vsp.SetParmVal(verwing_left_id, "Z_Rel_Location", "XForm", verwing_zoffset)  # Position vertically
-        vsp.SetParmVal(verwing_left_id, "X_Rel_Rotation", "XForm", verwing_xRotate)  # X-axis Rotation
-        vsp.SetParmVal(verwing_left_id, "CapUMaxOption", "EndCap" , verwing_option_tip)
-        vsp.SetParmVal(verwing_left_id, "CapUMaxLength", "EndCap" , verwing_length_tip)
-        vsp.SetParmVal(verwing_left_id, "CapUMaxOffset", "EndCap" , verwing_offset_tip)
-        vsp.SetParmVal(verwing_left_id, "Sym_Planar_Flag","Sym", 0)
-        vsp.SetParmVal(verwing_left_id, "Density", "Mass_Props", aircraft.wing_density) 
-        vsp.Update()  
-
-        return [verwing_right_id,verwing_left_id]
-
-
-def resetAnalysisResults(csvPath:str = "data/aircraft.csv"):
-    df = pd.read_csv(csvPath, sep='|', encoding='utf-8')
-    df_columns_only = pd.DataFrame(columns=df.columns)
-    df_columns_only.to_csv(csvPath, sep='|', encoding='utf-8', index=False, quoting=csv.QUOTE_NONE)
-
-def removeAnalysisResults(csvPath:str = "data/aircraft.csv"):
-    if os.path.exists(csvPath):
-        os.remove(csvPath)
-        #print(f"{csvPath} file has been deleted.")
-
-def writeAnalysisResults(anaResults: AircraftAnalysisResults, csvPath:str = "data/aircraft.csv"):
-
-    if not os.path.isfile(csvPath):
-        df = pd.json_normalize(asdict(anaResults))
-        df['hash'] = "'" + str(hash(anaResults.aircraft)) + "'"
-    else:
-        new_df = pd.json_normalize(asdict(anaResults))
-        new_df['hash'] = "'" + str(hash(anaResults.aircraft)) + "'"
-        df = pd.read_csv(csvPath, sep='|', encoding='utf-8')
-        df= pd.concat([df,new_df]).drop_duplicates(["hash"],keep='last')
-
-    # if selected_outputs is not None:
-    #     df = df.loc[:, [col for col in selected_outputs if col in df.columns]]    
-
-    def convert_cell(x):
-        if isinstance(x, np.ndarray):
-            return f"{json.dumps(x.tolist())}"
-        return x
+        # Vertical Tail settings (Right: +y, Left: -y)
+        for verwing_id, side in ((self.vertical_tail_R_id, 1), (self.vertical_tail_L_id, -1)):
+            vsp.SetDriverGroup(verwing_id, 1, vsp.AREA_WSECT_DRIVER, vsp.TAPER_WSECT_DRIVER, vsp.ROOTC_WSECT_DRIVER)
+            vsp.SetParmVal(verwing_id, "Area", "XSec_1", vertical_area / 2)  # Span of the each wing (Half of span)
+            vsp.SetParmVal(verwing_id, "Taper", "XSec_1", aircraft.vertical_taper)  
+            vsp.SetParmVal(verwing_id, "Root_Chord", "XSec_1", vertical_c_root) 
+            vsp.SetParmVal(verwing_id, "Sweep", "XSec_1", verwing_sweep) #Sweep Angle
+            vsp.SetParmVal(verwing_id, "Sweep_Location", "XSec_1", 0.99)
+            vsp.SetParmVal(verwing_id, "X_Rel_Location", "XForm", horizontal_distance)  # Position along X-axis
+            vsp.SetParmVal(verwing_id, "Y_Rel_Location", "XForm", side * verwing_yoffset)  # Position along Y-axis
+            vsp.SetParmVal(verwing_id, "Z_Rel_Location", "XForm", verwing_zoffset)  # Position vertically
+            vsp.SetParmVal(verwing_id, "X_Rel_Rotation", "XForm", verwing_xRotate)  # X-axis Rotation
+            vsp.SetParmVal(verwing_id, "CapUMaxOption", "EndCap" , verwing_option_tip)
+            vsp.SetParmVal(verwing_id, "CapUMaxLength", "EndCap" , verwing_length_tip)
+            vsp.SetParmVal(verwing_id, "CapUMaxOffset", "EndCap" , verwing_offset_tip)
+            vsp.SetParmVal(verwing_id, "Sym_Planar_Flag","Sym", 0)
+            vsp.SetParmVal(verwing_id, "Density", "Mass_Props", aircraft.wing_density)
+            vsp.Update()
 
-    df_copy = df.copy()
-    for col in df_copy.columns:
-        df_copy[col] = df_copy[col].apply(convert_cell)
-    
-    # Save the updated DataFrame back to CSV
-    df_copy.to_csv(csvPath, sep='|', encoding='utf-8', index=False, quoting=csv.QUOTE_NONE)
-
-def loadAnalysisResults(hashValue:str, csvPath:str = "data/aircraft.csv")-> AircraftAnalysisResults:
-    df = pd.read_csv(csvPath, sep='|', encoding='utf-8')
-    df = df.loc[df['hash']==hashValue]
-   
-    for col in df.columns:
-       df[col] = df[col].apply(lambda x: 
-                               np.array(ast.literal_eval(x),float) if isinstance(x, str) and x.startswith('[')
-                               else x)
-    df.pop('hash')
-    
-    if df.empty:
-        raise ValueError(f"No data found for hash value: {hashValue}")
 
-    analysisResult=df.to_dict(orient='records')[0]
-    return AircraftAnalysisResults.fromDict(analysisResult)
+def _intervalCurvature(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """|f''| per interval from the three-point divided differences at both ends"""
+    point = np.zeros(len(x))
+    if len(x) >= 3:
+        slope = np.diff(y) / np.diff(x)
+        point[1:-1] = np.abs(2 * np.diff(slope) / (x[2:] - x[:-2]))
+    return np.maximum(point[:-1], point[1:])
 
 def visualize_results(results: AircraftAnalysisResults):
     """Visualize CL and CD data with flap points"""
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import MultipleLocator
+
     fig = plt.figure(figsize=(16,6))
     grid = fig.add_gridspec(1, 3, width_ratios=[1, 1, 1])
     
@@ -632,7 +748,6 @@ def visualize_results(results: AircraftAnalysisResults):
     plt.tight_layout()
     plt.show()
 
-import matplotlib.pyplot as plt
 import numpy as np
 from typing import List, Optional, Dict
 from internal_dataclass import AircraftAnalysisResults
@@ -0,0 +1,193 @@
+"""Content-addressed store of VSP analysis results shared across sweeps"""
+import numpy as np
+import hashlib
+import json
+import os
+import os.path
+import stat
+import time
+from dataclasses import asdict, fields
+from setup_dataclass import AerodynamicSetup, PresetValues
+from internal_dataclass import Aircraft, AircraftAnalysisResults
+from cache_registry import registerCache
+
+DEFAULT_CACHE_DIR = "data/vsp_cache"
+
+
+_file_digests = {}     # path -> (st_mtime_ns, st_size, digest)
+file_digest_stats = registerCache("vsp_cache.fileDigest", lambda: _file_digests)
+
+def fileDigest(path: str) -> str:
+    """sha256 of a data file, so edited airfoil / fuselage data does not hit old entries.
+    Memoized on the file's mtime and size; a missing file ("") is not memoized."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return ""
+    if not stat.S_ISREG(st.st_mode):
+        return ""
+    entry = _file_digests.get(path)
+    if entry is not None and entry[:2] == (st.st_mtime_ns, st.st_size):
+        file_digest_stats.hits += 1
+        return entry[2]
+    file_digest_stats.misses += 1
+    if entry is not None:
+        file_digest_stats.evictions += 1
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    _file_digests[path] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+def vspCacheKey(aircraft: Aircraft, aerodynamicSetup: AerodynamicSetup, presetValues: PresetValues,
+                fidelity: str) -> str:
+    """Key = aircraft hash + everything else that changes calculateCoefficients output"""
+    aero = {k: v for k, v in asdict(aerodynamicSetup).items() if k not in ('fidelity', 'fidelity_tiers')}
+    payload = {
+        'aircraft': str(hash(aircraft)),
+        'airfoils': [fileDigest(aircraft.mainwing_airfoil_datapath),
+                     fileDigest(aircraft.horizontal_airfoil_datapath),
+                     fileDigest(aircraft.vertical_airfoil_datapath)],
+        'fuselage_Cd': fileDigest(aerodynamicSetup.fuselage_Cd_datapath),
+        'aero': aero,
+        'fidelity': fidelity,
+        'tier': asdict(aerodynamicSetup.fidelity_tiers[fidelity]),
+        'm_x1': presetValues.m_x1,
+        'max_load': presetValues.max_load,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class VSPResultCache:
+    """One JSON file per key under cacheDir/<key[:2]>/<key>.json
+
+    Entries are written atomically so several servers can share the directory.
+    A hit touches the entry, so age-based eviction removes least recently used entries.
+    """
+    def __init__(self, cacheDir: str = DEFAULT_CACHE_DIR):
+        self.cacheDir = cacheDir
+        self.hits = 0
+        self.misses = 0
+        self.puts = 0
+        os.makedirs(cacheDir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cacheDir, key[:2], key + ".json")
+
+    def get(self, key: str, aircraft: Aircraft):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        os.utime(path)
+
+        results = {k: np.array(v, float) if isinstance(v, list) else v for k, v in entry['results'].items()}
+        return AircraftAnalysisResults(aircraft=aircraft, **results)
+
+    def put(self, key: str, analResults: AircraftAnalysisResults):
+        results = {}
+        for f in fields(analResults):
+            if f.name == 'aircraft':
+                continue
+            v = getattr(analResults, f.name)
+            if isinstance(v, np.ndarray):
+                v = v.tolist()
+            elif isinstance(v, np.generic):
+                v = v.item()
+            results[f.name] = v
+        entry = {'key': key, 'hash': "'" + str(hash(analResults.aircraft)) + "'",
+                 'created': time.time(), 'results': results}
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmpPath = f"{path}.{os.getpid()}.tmp"
+        with open(tmpPath, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmpPath, path)
+        self.puts += 1
+
+    def flushStats(self):
+        """Append this run's counters to the cumulative stats log"""
+        if self.hits + self.misses == 0:
+            return
+        with open(os.path.join(self.cacheDir, "stats.jsonl"), 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'time': time.time(), 'hits': self.hits,
+                                'misses': self.misses, 'puts': self.puts}) + "\n")
+
+    def summary(self) -> str:
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups * 100 if lookups else 0.0
+        return f"VSP cache: {self.hits}/{lookups} hits ({rate:.1f}%), {self.puts} new entries"
+
+
+def _cacheEntries(cacheDir: str) -> list:
+    """(path, size, mtime) of every entry"""
+    entries = []
+    for root, _, files in os.walk(cacheDir):
+        for name in files:
+            if name.endswith(".json"):
+                path = os.path.join(root, name)
+                st = os.stat(path)
+                entries.append((path, st.st_size, st.st_mtime))
+    return entries
+
+def cacheStats(cacheDir: str = DEFAULT_CACHE_DIR) -> dict:
+    entries = _cacheEntries(cacheDir)
+    stats = {'entries': len(entries), 'bytes': sum(e[1] for e in entries),
+             'oldest': min((e[2] for e in entries), default=None),
+             'newest': max((e[2] for e in entries), default=None),
+             'hits': 0, 'misses': 0}
+    statsPath = os.path.join(cacheDir, "stats.jsonl")
+    if os.path.isfile(statsPath):
+        with open(statsPath, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    run = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                stats['hits'] += run['hits']
+                stats['misses'] += run['misses']
+    return stats
+
+def evictCache(cacheDir: str = DEFAULT_CACHE_DIR, max_age_days: float = None, max_bytes: int = None) -> int:
+    """Remove entries unused for max_age_days, then least recently used entries above max_bytes"""
+    entries = sorted(_cacheEntries(cacheDir), key=lambda e: e[2])
+    removed = 0
+    if max_age_days is not None:
+        cutoff = time.time() - max_age_days * 86400
+        while entries and entries[0][2] < cutoff:
+            os.remove(entries.pop(0)[0])
+            removed += 1
+    if max_bytes is not None:
+        total = sum(e[1] for e in entries)
+        while entries and total > max_bytes:
+            path, size, _ = entries.pop(0)
+            os.remove(path)
+            total -= size
+            removed += 1
+    return removed
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or evict the shared VSP result cache.")
+    parser.add_argument("command", choices=['stats', 'evict'])
+    parser.add_argument("--cache_dir", type=str, default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--max_age_days", type=float, default=None, help="evict entries unused for this many days")
+    parser.add_argument("--max_mb", type=float, default=None, help="evict least recently used entries above this size")
+    args = parser.parse_args()
+
+    if args.command == 'evict':
+        max_bytes = None if args.max_mb is None else int(args.max_mb * 1024 * 1024)
+        removed = evictCache(args.cache_dir, args.max_age_days, max_bytes)
+        print(f"Removed {removed} entries")
+
+    stats = cacheStats(args.cache_dir)
+    lookups = stats['hits'] + stats['misses']
+    print(f"{stats['entries']} entries, {stats['bytes']/1024/1024:.2f} MB in {args.cache_dir}")
+    if lookups:
+        print(f"{stats['hits']}/{lookups} hits ({stats['hits']/lookups*100:.1f}%) over all recorded runs")
@@ -2,15 +2,353 @@ import numpy as np
 from itertools import product
 from dataclasses import replace
 import time
+import os
+import queue
+import glob
+import csv
+import multiprocessing as mp
+from collections import deque, Counter
 import pandas as pd
 from scipy.interpolate import interp1d
 from setup_dataclass import *
-from vsp_analysis import VSPAnalyzer, writeAnalysisResults
+from vsp_analysis import VSPAnalyzer
+from results_store import writeAnalysisResults, loadAllAnalysisResults
 from internal_dataclass import *
+from cost_model import writeTimingRecords
+from vsp_cache import VSPResultCache, vspCacheKey
+from aero_surrogate import fitAeroSurrogate
+from profiling import profiled
+from telemetry import WorkerTelemetry
 
+# Default times a configuration is run again after the worker running it died (runVSPPool max_retries)
+MAX_VSP_RETRIES = 1
 
-def runVSPGridAnalysis(aircraftParamConstraint: AircraftParamConstraints,aerodynamicSetup: AerodynamicSetup, presetValues: PresetValues, baseAircraft: Aircraft, server_id : int=1, total_server : int=1,csvPath: str = "",vspPath: str=""):
+
+def runVSPGridAnalysis(aircraftParamConstraint: AircraftParamConstraints,aerodynamicSetup: AerodynamicSetup, presetValues: PresetValues, baseAircraft: Aircraft, server_id : int=1, total_server : int=1,csvPath: str = "",vspPath: str="",
+                       grid_combinations: list = None, timingPath: str = "", vsp_jobs: int = 1,
+                       fidelity: str = None, vsp_session: bool = True, writeVSPFile: bool = False,
+                       cacheDir: str = "", surrogateData: str = "", surrogate_threshold: float = None,
+                       commitQueue = None, telemetry: WorkerTelemetry = None):
         
+        # Configurations come either from a shard manifest or from an even split of the grid
+        if grid_combinations is None:
+                total_grid_combinations = getVSPGridCombinations(aircraftParamConstraint)
+                grid_chunks = list(split_into_chunks(total_grid_combinations,total_server))
+                vsp_grid_combinations = grid_chunks[server_id-1]
+        else:
+                vsp_grid_combinations = grid_combinations
+
+        # Each stage (screening / production / verification) selects its VSPAERO fidelity tier
+        if fidelity is None:
+                fidelity = aerodynamicSetup.fidelity
+        fidelityTier = aerodynamicSetup.fidelity_tiers[fidelity]
+
+        total = len(vsp_grid_combinations)
+        if telemetry is not None:
+                telemetry.total = total
+        print(f"\nTotal number of Aircraft combinations: {total} (fidelity: {fidelity})")
+         
+        CD_fuse = get_fuselageCD_list(aerodynamicSetup.alpha_start,aerodynamicSetup.alpha_end,aerodynamicSetup.alpha_step,aerodynamicSetup.fuselage_Cd_datapath,
+                                      fidelityTier=fidelityTier)
+
+        aircraft_list = [makeGridAircraft(baseAircraft, span, AR, taper, twist, airfoil_name)
+                         for (span, AR, taper, twist, airfoil_name) in vsp_grid_combinations]
+
+        step = max(int(total/100) , 1)
+
+        # Pipeline mode: every hash is announced to the mission workers as soon as it is in the store
+        def commit(analResults):
+                writeAnalysisResults(analResults,csvPath=csvPath)
+                if commitQueue is not None:
+                        commitQueue.publish({'hash': "'" + str(hash(analResults.aircraft)) + "'",
+                                             'csvPath': csvPath, 'server_id': server_id})
+                if telemetry is not None:
+                        telemetry.count()
+
+        # Configurations already evaluated by an earlier sweep come from the shared cache
+        cache = VSPResultCache(cacheDir) if cacheDir else None
+        cache_keys = []
+        tasks = []
+        for i, aircraft in enumerate(aircraft_list):
+                if cache is None:
+                        tasks.append((i, aircraft))
+                        continue
+                cache_keys.append(vspCacheKey(aircraft, aerodynamicSetup, presetValues, fidelity))
+                analResults = cache.get(cache_keys[i], aircraft)
+                if analResults is None:
+                        tasks.append((i, aircraft))
+                else:
+                        commit(analResults)
+        if cache is not None:
+                print(f"{cache.hits} of {total} configurations found in the VSP cache")
+
+        # Surrogate fitted to earlier VSP results of this fidelity; VSP runs only where it is uncertain.
+        # Off unless both the training data and a threshold are given
+        use_surrogate = bool(surrogateData) and surrogate_threshold is not None
+        if use_surrogate and not os.path.isfile(surrogateData):
+                print(f"No surrogate training data at {surrogateData}, running VSP for every configuration")
+        elif use_surrogate and tasks:
+                alpha_grid = fidelityTier.alpha_grid(aerodynamicSetup.alpha_start,aerodynamicSetup.alpha_end,aerodynamicSetup.alpha_step)
+                surrogate = fitAeroSurrogate(loadAllAnalysisResults(surrogateData), fidelity, alpha_grid)
+                vsp_tasks = []
+                for i, aircraft in tasks:
+                        analResults, uncertainty = surrogate.predict(aircraft, CD_fuse, aerodynamicSetup, presetValues,
+                                                                     aerodynamicSetup.fuselage_cross_section_area)
+                        if uncertainty <= surrogate_threshold:
+                                commit(analResults)
+                        else:
+                                vsp_tasks.append((i, aircraft))
+                print(f"{len(tasks)-len(vsp_tasks)} of {len(tasks)} configurations predicted by the surrogate "
+                      f"({len(surrogate.surfaces)} airfoil surfaces), {len(vsp_tasks)} left for VSP")
+                tasks = vsp_tasks
+
+        def record(i, analResults, seconds):
+                span, AR, taper, twist, airfoil_name = vsp_grid_combinations[i]
+                commit(analResults)
+                if cache is not None:
+                        cache.put(cache_keys[i], analResults)
+                if timingPath:
+                        writeTimingRecords([{
+                                'stage': 'vsp',
+                                'server_id': server_id,
+                                'hash': "'" + str(hash(aircraft_list[i])) + "'",
+                                'airfoil': airfoil_name,
+                                'span': span,
+                                'AR': AR,
+                                'taper': taper,
+                                'twist': twist,
+                                'fidelity': fidelity,
+                                'seconds': seconds
+                        }], timingPath)
+
+        def progress(done, i):
+                if done%step==0:
+                        span, AR, taper, twist, airfoil_name = vsp_grid_combinations[i]
+                        print(f"\n[{time.strftime('%Y-%m-%d %X')}] VSP Grid Progress: {done}/{total} configurations: [{span:.2f}, {AR:.2f}, {taper:.2f}, {twist:.1f}, {airfoil_name}]")
+
+        if vsp_jobs > 1:
+                runVSPPool(tasks, aerodynamicSetup, presetValues, CD_fuse, vsp_jobs, vspPath, record, progress, fidelity,
+                           vsp_session, writeVSPFile, profileWorker=f"server{server_id}", telemetry=telemetry)
+        elif tasks:
+                vspAnalyzer = VSPAnalyzer(presetValues)
+
+                for done, (i, aircraft) in enumerate(tasks, 1):
+                        
+                        progress(done, i)
+
+                        t_start = time.perf_counter()
+                        with profiled('vsp', f"server{server_id}", hash(aircraft)):
+                                analResults = analyzeVSPConfiguration(vspAnalyzer, aircraft, aerodynamicSetup, CD_fuse, vspPath, fidelity,
+                                                                      vsp_session, writeVSPFile)
+                        record(i, analResults, time.perf_counter() - t_start)
+
+        if cache is not None:
+                cache.flushStats()
+                print(cache.summary())
+
+
+def runVSPPrepass(aircraftParamConstraint: AircraftParamConstraints, missionParamConstraints: MissionParamConstraints,
+                  presetValues: PresetValues, baseAircraft: Aircraft, server_id: int=1, total_server: int=1,
+                  outPath: str = "", grid_combinations: list = None) -> list:
+        """Geometry and mass only: keeps configurations with at least one MTOW inside the wing loading limits.
+        The pruned (span, AR, taper, twist, airfoil) list is written to outPath for the aero stage."""
+        from mission_grid import getMTOWList
+
+        if grid_combinations is None:
+                grid_combinations = list(split_into_chunks(getVSPGridCombinations(aircraftParamConstraint),total_server))[server_id-1]
+        print(f"\nPre-pass over {len(grid_combinations)} Aircraft combinations")
+
+        vspAnalyzer = VSPAnalyzer(presetValues)
+        rows = []
+        for (span, AR, taper, twist, airfoil_name) in grid_combinations:
+                aircraft = makeGridAircraft(baseAircraft, span, AR, taper, twist, airfoil_name)
+                vspAnalyzer.update_vsp_model(aircraft)
+                massProps = vspAnalyzer.calculateGeometryMass()
+                MTOW_list = getMTOWList(missionParamConstraints, massProps['Sref'], massProps['m_empty'])
+                if len(MTOW_list) == 0:
+                        continue
+                rows.append({'span': span, 'AR': AR, 'taper': taper, 'twist': twist, 'airfoil': airfoil_name,
+                             'hash': "'" + str(hash(aircraft)) + "'",
+                             'Sref': massProps['Sref'], 'm_empty': massProps['m_empty'], 'MTOW_count': len(MTOW_list)})
+        vspAnalyzer.clean()
+
+        print(f"Pre-pass kept {len(rows)}/{len(grid_combinations)} configurations")
+        if outPath:
+                pd.DataFrame(rows, columns=['span','AR','taper','twist','airfoil','hash','Sref','m_empty','MTOW_count']).to_csv(
+                        outPath, sep='|', encoding='utf-8', index=False, quoting=csv.QUOTE_NONE)
+        return [(r['span'], r['AR'], r['taper'], r['twist'], r['airfoil']) for r in rows]
+
+def loadPrepassConfigs(pattern: str) -> list:
+        """(span, AR, taper, twist, airfoil) tuples from one or more pre-pass files"""
+        configs = []
+        for csv_file in sorted(glob.glob(pattern)):
+                df = pd.read_csv(csv_file, sep='|', encoding='utf-8')
+                configs += list(zip(df['span'], df['AR'], df['taper'], df['twist'], df['airfoil']))
+        return configs
+
+def makeGridAircraft(baseAircraft: Aircraft, span, AR, taper, twist, airfoil_name: str) -> Aircraft:
+        airfoil_datapath = "data/airfoilDAT/" + airfoil_name + ".dat"
+        return replace(baseAircraft, mainwing_span = span, mainwing_AR = AR , mainwing_taper = taper, mainwing_twist = twist, mainwing_airfoil_datapath = airfoil_datapath)   
+
+def analyzeVSPConfiguration(vspAnalyzer: VSPAnalyzer, aircraft: Aircraft, aerodynamicSetup: AerodynamicSetup, 
+                            CD_fuse: np.ndarray, vspPath: str, fidelity: str = "production",
+                            vsp_session: bool = True, writeVSPFile: bool = False) -> AircraftAnalysisResults:
+        """vsp_session keeps the model loaded between configurations and only updates the changed wing parms.
+        Otherwise the model is rebuilt, written to vspPath and read back for every configuration."""
+        if vsp_session:
+                vspAnalyzer.update_vsp_model(aircraft,vspPath=vspPath,writeFile=writeVSPFile)
+        else:
+                vspAnalyzer.setup_vsp_model(aircraft,vspPath=vspPath)
+        analResults = vspAnalyzer.calculateCoefficients(
+                alpha_start = aerodynamicSetup.alpha_start, alpha_end = aerodynamicSetup.alpha_end, alpha_step = aerodynamicSetup.alpha_step,
+                CD_fuse = CD_fuse, fuselage_cross_section_area = aerodynamicSetup.fuselage_cross_section_area, 
+                wing_area_blocked_by_fuselage = aircraft.wing_area_blocked_by_fuselage,
+
+                fileName=None if vsp_session else vspPath,
+                
+                AOA_stall = aerodynamicSetup.AOA_stall,
+                AOA_takeoff_max = aerodynamicSetup.AOA_takeoff_max,
+                AOA_climb_max = aerodynamicSetup.AOA_climb_max,
+                AOA_turn_max = aerodynamicSetup.AOA_turn_max,
+                
+                clearModel=False,
+                fidelity=fidelity,
+                fidelityTier=aerodynamicSetup.fidelity_tiers[fidelity]
+                )
+        if not vsp_session:
+                vspAnalyzer.clean()
+        return analResults
+
+def runVSPPool(tasks: list, aerodynamicSetup: AerodynamicSetup, presetValues: PresetValues, 
+               CD_fuse: np.ndarray, vsp_jobs: int, vspPath: str, record, progress, fidelity: str = "production",
+               vsp_session: bool = True, writeVSPFile: bool = False, profileWorker: str = "server1",
+               telemetry: WorkerTelemetry = None, max_retries: int = MAX_VSP_RETRIES):
+        """Runs the (index, aircraft) tasks on vsp_jobs worker processes, each owning its own OpenVSP model.
+
+        The OpenVSP API keeps one global model per process, so every worker keeps its own
+        model session and gets its own vsp3 file (aircraft_{id}_{k}.vsp3) and out/ subdirectory. Workers are spawned (not forked)
+        and import openvsp themselves, so a stand-in openvsp module on sys.path is picked up by them.
+        Results are sent back to this process, which is the only one writing the results store.
+
+        Every worker gets one configuration at a time, so the configuration of a worker that dies is known:
+        it is reported and run again on a new worker, up to max_retries times.
+        """
+        ctx = mp.get_context("spawn")
+        result_queue = ctx.Queue()
+        root, ext = os.path.splitext(vspPath or "aircraft.vsp3")
+
+        def startWorker(k):
+                outputPath = os.path.join("out", f"worker_{k}")
+                os.makedirs(outputPath, exist_ok=True)
+                task_queue = ctx.Queue()
+                worker = ctx.Process(target=_vspPoolWorker,
+                                     args=(k, task_queue, result_queue, presetValues, aerodynamicSetup, CD_fuse,
+                                           f"{os.path.basename(root)}_{k}{ext}", outputPath, fidelity,
+                                           vsp_session, writeVSPFile, f"{profileWorker}_job{k}"),
+                                     daemon=True)
+                worker.start()
+                return worker, task_queue
+
+        pending = deque(tasks)
+        workers = {k: startWorker(k) for k in range(1, vsp_jobs+1)}
+        assigned = {}           # worker k -> task it is running
+        completed = Counter()   # configurations finished by the current process of worker k
+        retries = Counter()
+        restarted = set()
+        finished = set()
+
+        def dispatch(k):
+                if pending:
+                        assigned[k] = pending.popleft()
+                        workers[k][1].put(assigned[k])
+
+        for k in workers:
+                dispatch(k)
+
+        done = 0
+        while done < len(tasks):
+                try:
+                        k, i, analResults, seconds, error = result_queue.get(timeout=1)
+                except queue.Empty:
+                        pass
+                else:
+                        if assigned.get(k, (None,))[0] == i:
+                                del assigned[k]
+                                completed[k] += 1
+                                dispatch(k)
+                        # A configuration requeued after its worker died may still report from the dead worker
+                        if i not in finished:
+                                finished.add(i)
+                                done += 1
+                                progress(done, i)
+                                if error:
+                                        reason, message = error
+                                        print(f"Error : {reason}: {message}")
+                                        if telemetry is not None:
+                                                telemetry.fail(reason, message)
+                                                telemetry.count()
+                                else:
+                                        record(i, analResults, seconds)
+
+                for k, (worker, _) in list(workers.items()):
+                        if worker.is_alive():
+                                continue
+                        task = assigned.pop(k, None)
+                        if task is not None and task[0] not in finished:
+                                i = task[0]
+                                retries[i] += 1
+                                if retries[i] > max_retries:
+                                        print(f"VSP worker {k} exited (code {worker.exitcode}) on configuration {i} after {retries[i]-1} retries, giving up on it")
+                                        finished.add(i)
+                                        done += 1
+                                        progress(done, i)
+                                        if telemetry is not None:
+                                                telemetry.fail("worker_exited", f"VSP worker {k} exited with code {worker.exitcode}")
+                                                telemetry.count()
+                                else:
+                                        print(f"VSP worker {k} exited (code {worker.exitcode}) during configuration {i}, requeued")
+                                        pending.appendleft(task)
+                        del workers[k]
+                        # A restarted worker that dies before finishing anything would keep dying, e.g. on a broken install
+                        if k in restarted and completed[k] == 0:
+                                print(f"Restarted VSP worker {k} exited without finishing a configuration, not restarted again")
+                        elif pending:
+                                workers[k] = startWorker(k)
+                                restarted.add(k)
+                                completed[k] = 0
+                                dispatch(k)
+
+                if not workers and done < len(tasks):
+                        print(f"All VSP workers exited with {len(tasks)-done} configurations left")
+                        break
+
+        for worker, task_queue in workers.values():
+                task_queue.put(None)
+        for worker, _ in workers.values():
+                worker.join()
+
+def _vspPoolWorker(k, task_queue, result_queue, presetValues: PresetValues, aerodynamicSetup: AerodynamicSetup,
+                   CD_fuse: np.ndarray, vspPath: str, outputPath: str, fidelity: str,
+                   vsp_session: bool = True, writeVSPFile: bool = False, profileWorker: str = ""):
+        vspAnalyzer = VSPAnalyzer(presetValues, outputPath=outputPath)
+        while True:
+                task = task_queue.get()
+                if task is None:
+                        break
+                i, aircraft = task
+                t_start = time.perf_counter()
+                try:
+                        with profiled('vsp', profileWorker, hash(aircraft)):
+                                analResults = analyzeVSPConfiguration(vspAnalyzer, aircraft, aerodynamicSetup, CD_fuse, vspPath, fidelity,
+                                                                      vsp_session, writeVSPFile)
+                        result_queue.put((k, i, analResults, time.perf_counter() - t_start, None))
+                except Exception as e:
+                        vspAnalyzer.clean()
+                        result_queue.put((k, i, None, time.perf_counter() - t_start, (type(e).__name__, str(e))))
+
+
+def getVSPGridCombinations(aircraftParamConstraint: AircraftParamConstraints) -> list:
+        """(span, AR, taper, twist, airfoil) tuples of the full VSP grid, in sweep order"""
         ## Variable lists using for optimization
         span_list = np.arange(
                 aircraftParamConstraint.span_min, 
@@ -34,57 +372,18 @@ def runVSPGridAnalysis(aircraftParamConstraint: AircraftParamConstraints,aerodyn
                 )
         airfoil_list = aircraftParamConstraint.airfoil_list
         
-        total_grid_combinations = list(product(span_list,AR_list,taper_list,twist_list,airfoil_list))
-        grid_chunks = list(split_into_chunks(total_grid_combinations,total_server))
-        vsp_grid_combinations = grid_chunks[server_id-1]
-
-        total = len(vsp_grid_combinations)
-        print(f"\nTotal number of Aircraft combinations: {total}")
-         
-        alpha_start = aerodynamicSetup.alpha_start
-        alpha_end = aerodynamicSetup.alpha_end
-        alpha_step = aerodynamicSetup.alpha_step
-        CD_fuse = get_fuselageCD_list(alpha_start,alpha_end,alpha_step,aerodynamicSetup.fuselage_Cd_datapath)
-        fuselage_cross_section_area = aerodynamicSetup.fuselage_cross_section_area
-        
-        vspAnalyzer = VSPAnalyzer(presetValues)
-
-        step = max(int(total/100) , 1)
-
-        for i, (span, AR, taper, twist, airfoil_name) in enumerate(vsp_grid_combinations):
-                
-                if (i+1)%step==0:
-                        print(f"\n[{time.strftime('%Y-%m-%d %X')}] VSP Grid Progress: {i+1}/{total} configurations: [{span:.2f}, {AR:.2f}, {taper:.2f}, {twist:.1f}, {airfoil_name}]")
-
-                airfoil_datapath = "data/airfoilDAT/" + airfoil_name + ".dat"
-                aircraft = replace(baseAircraft, mainwing_span = span, mainwing_AR = AR , mainwing_taper = taper, mainwing_twist = twist, mainwing_airfoil_datapath = airfoil_datapath)   
-
-                vspAnalyzer.setup_vsp_model(aircraft,vspPath=vspPath)
-                analResults = vspAnalyzer.calculateCoefficients(
-                        alpha_start = alpha_start, alpha_end = alpha_end, alpha_step = alpha_step,
-                        CD_fuse = CD_fuse, fuselage_cross_section_area = fuselage_cross_section_area, 
-                        wing_area_blocked_by_fuselage = baseAircraft.wing_area_blocked_by_fuselage,
-
-                        fileName=vspPath,
-                        
-                        AOA_stall = aerodynamicSetup.AOA_stall,
-                        AOA_takeoff_max = aerodynamicSetup.AOA_takeoff_max,
-                        AOA_climb_max = aerodynamicSetup.AOA_climb_max,
-                        AOA_turn_max = aerodynamicSetup.AOA_turn_max,
-                        
-                        clearModel=False
-                        )
-
-                writeAnalysisResults(analResults,csvPath=csvPath)
-                vspAnalyzer.clean()
+        return list(product(span_list,AR_list,taper_list,twist_list,airfoil_list))
 
 
-def get_fuselageCD_list(alpha_start,alpha_end,alpha_step,csvPath):
+def get_fuselageCD_list(alpha_start,alpha_end,alpha_step,csvPath,fidelityTier:FidelityTier=None):
         df = pd.read_csv(csvPath)
         alpha_list = df['AOA(degree)'].to_numpy()
         Cd_fuse_list = df['CD fuselage'].to_numpy()
         Cd_fuse_func = interp1d(alpha_list, Cd_fuse_list, kind="quadratic", fill_value="extrapolate") 
-        alpha = np.arange(alpha_start,alpha_end + alpha_step/2, alpha_step)  
+        if fidelityTier is None:
+                alpha = np.arange(alpha_start,alpha_end + alpha_step/2, alpha_step)  
+        else:
+                alpha = fidelityTier.alpha_grid(alpha_start,alpha_end,alpha_step)
         CD_fuse = Cd_fuse_func(alpha)
         return CD_fuse
         
@@ -0,0 +1,284 @@
+"""Long-lived worker that keeps the stack imported and the aircraft rows / propulsion tables loaded,
+and runs mission or VSP-sweep jobs sent as JSON lines over a local Unix socket
+
+    python worker_daemon.py serve &
+    python worker_daemon.py mission "'1161201821293098006'" --mission 2 --MTOW 10 --max_speed 32
+    python worker_daemon.py send '{"op": "ping"}'
+    python worker_daemon.py shutdown
+
+Jobs run one at a time (the mission code keeps module-level caches), in the order they arrive.
+A connection that sends nothing for IDLE_SECONDS is closed, so an idle client does not hold up the others.
+"""
+import json
+import os
+import os.path
+import socket
+import socketserver
+import sys
+import time
+import traceback
+from collections import OrderedDict
+from dataclasses import asdict, replace
+
+import numpy as np
+
+DEFAULT_SOCKET = "data/worker_daemon.sock"
+# Prepared MissionAnalyzers kept for rehydrate(), least recently used dropped first
+MAX_ANALYZERS = 64
+# Seconds a connection may wait between requests before the daemon closes it
+IDLE_SECONDS = 30
+
+
+def _jsonDefault(x):
+    if isinstance(x, np.ndarray):
+        return x.tolist()
+    if isinstance(x, np.generic):
+        return x.item()
+    return str(x)
+
+
+class WorkerState:
+    """What the daemon keeps warm between jobs"""
+    def __init__(self, csvPath: str):
+        from main import get_config
+        from results_store import loadAnalysisResultsIndex
+        self.config = get_config()
+        self.csvPath = csvPath
+        self.loadIndex = loadAnalysisResultsIndex
+        self.indexes = {}       # csvPath -> (mtime, {hash: AircraftAnalysisResults})
+        self.analyzers = OrderedDict()
+        self.t_start = time.time()
+        self.jobs = 0
+
+    def aircraft(self, hashVal: str, csvPath: str = ""):
+        csvPath = csvPath or self.csvPath
+        mtime = os.path.getmtime(csvPath)
+        cached = self.indexes.get(csvPath)
+        if cached is None or cached[0] != mtime:
+            cached = self.indexes[csvPath] = (mtime, self.loadIndex(csvPath))
+        if hashVal not in cached[1]:
+            raise ValueError(f"No data found for hash value: {hashVal}")
+        return cached[1][hashVal]
+
+    def preload(self):
+        """Aircraft rows of the default store and the mission 2 / 3 propeller and battery tables"""
+        from mission_analysis import MissionAnalyzer
+        from internal_dataclass import MissionParameters
+        if not os.path.isfile(self.csvPath):
+            return
+        presetValues, propulsionSpecs = self.config[0], self.config[1]
+        index = self.indexes.setdefault(self.csvPath, (os.path.getmtime(self.csvPath), self.loadIndex(self.csvPath)))[1]
+        if not index:
+            return
+        analysisResults = next(iter(index.values()))
+        for propeller in (propulsionSpecs.M2_propeller_data_path, propulsionSpecs.M3_propeller_data_path):
+            MissionAnalyzer(analysisResults, MissionParameters(
+                m_takeoff=analysisResults.m_empty / 1000, max_speed=30, max_load_factor=1,
+                climb_thrust_ratio=1, level_thrust_ratio=1, turn_thrust_ratio=1, propeller_data_path=propeller),
+                presetValues, propulsionSpecs)
+        print(f"Preloaded {len(index)} aircraft from {self.csvPath}")
+
+    def analyzer(self, analysisResults, missionParams, presetValues, propulsionSpecs, key):
+        from mission_analysis import MissionAnalyzer
+        prepared = self.analyzers.get(key)
+        if prepared is None:
+            prepared = self.analyzers[key] = MissionAnalyzer(analysisResults, missionParams, presetValues, propulsionSpecs)
+            if len(self.analyzers) > MAX_ANALYZERS:
+                self.analyzers.popitem(last=False)
+            return prepared
+        self.analyzers.move_to_end(key)
+        return prepared.rehydrate(missionParams)
+
+
+def runMissionJob(worker: WorkerState, request: dict) -> dict:
+    """{'hash', 'mission': 2|3, 'MTOW' (mission 2), 'max_speed', 'climb_thrust_ratio', 'level_thrust_ratio',
+    'turn_thrust_ratio', optional 'csvPath', 'preset' / 'propulsion' overrides and 'log': true for the state log}"""
+    from internal_dataclass import MissionParameters
+    from mission_analysis import get_state_df
+    presetValues = replace(worker.config[0], **request.get('preset', {}))
+    propulsionSpecs = replace(worker.config[1], **request.get('propulsion', {}))
+    hashVal = request['hash']
+    mission = int(request.get('mission', 2))
+    analysisResults = worker.aircraft(hashVal, request.get('csvPath', ""))
+
+    if mission == 2:
+        if request.get('MTOW') is None:
+            raise ValueError("MTOW is required for mission 2")
+        m_takeoff = float(request['MTOW'])
+        max_load_factor = presetValues.max_load / m_takeoff
+        propeller = propulsionSpecs.M2_propeller_data_path
+    else:
+        m_takeoff = analysisResults.m_empty / 1000
+        max_load_factor = presetValues.max_load * 1000 / analysisResults.m_empty
+        propeller = propulsionSpecs.M3_propeller_data_path
+    missionParams = MissionParameters(
+        m_takeoff=m_takeoff, max_speed=float(request['max_speed']), max_load_factor=max_load_factor,
+        climb_thrust_ratio=float(request['climb_thrust_ratio']), level_thrust_ratio=float(request['level_thrust_ratio']),
+        turn_thrust_ratio=float(request['turn_thrust_ratio']), propeller_data_path=propeller)
+
+    csvPath = request.get('csvPath', "") or worker.csvPath
+    key = (csvPath, worker.indexes[csvPath][0], hashVal, mission,
+           json.dumps(asdict(presetValues), sort_keys=True, default=str),
+           json.dumps(asdict(propulsionSpecs), sort_keys=True, default=str))
+    analyzer = worker.analyzer(analysisResults, missionParams, presetValues, propulsionSpecs, key)
+    result, stats = analyzer.run_mission2(return_stats=True) if mission == 2 else analyzer.run_mission3(return_stats=True)
+    success = not (result == -1 or result == (-1, -1))
+
+    response = {
+        'success': success,
+        'failure_reason': stats.failure_reason,
+        'm_fuel': analyzer.m_fuel if mission == 2 else 0.0,
+        'N_laps': analyzer.state.N_laps,
+        'time': analyzer.state.time,
+        'phase': analyzer.state.phase,
+        'stats': asdict(stats),
+    }
+    if request.get('log'):
+        response['log'] = get_state_df(analyzer.stateLog).to_dict(orient='list')
+    return response
+
+
+def runVSPJob(worker: WorkerState, request: dict) -> dict:
+    """{'configs': [[span, AR, taper, twist, airfoil], ...], 'csvPath', optional 'fidelity' and
+    'surrogate_threshold' (surrogate trained on 'surrogateData', default data/aircraft.csv)}; returns the hashes"""
+    from vsp_grid import runVSPGridAnalysis, makeGridAircraft
+    presetValues, _, aircraftParamConstraints, aerodynamicSetup, baseAircraft, _ = worker.config
+    configs = [tuple(c) for c in request['configs']]
+    csvPath = request['csvPath']
+    runVSPGridAnalysis(aircraftParamConstraints, aerodynamicSetup, presetValues, baseAircraft,
+                       csvPath=csvPath, vspPath=request.get('vspPath', "aircraft_daemon.vsp3"),
+                       grid_combinations=configs, fidelity=request.get('fidelity'),
+                       surrogateData=request.get('surrogateData', "data/aircraft.csv")
+                       if request.get('surrogate_threshold') is not None else "",
+                       surrogate_threshold=request.get('surrogate_threshold'))
+    return {'hashes': ["'" + str(hash(makeGridAircraft(baseAircraft, *c))) + "'" for c in configs],
+            'csvPath': csvPath}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def setup(self):
+        # socket timeout of the connection; a job itself is not limited by it
+        self.timeout = self.server.idle_timeout
+        super().setup()
+
+    def handle(self):
+        try:
+            self._serveRequests()
+        except (socket.timeout, ConnectionError):
+            pass
+
+    def _serveRequests(self):
+        worker = self.server.worker
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            t_start = time.perf_counter()
+            try:
+                request = json.loads(line)
+                op = request.get('op')
+                if op == 'ping':
+                    response = {'pid': os.getpid(), 'uptime': time.time() - worker.t_start, 'jobs': worker.jobs,
+                                'analyzers': len(worker.analyzers)}
+                elif op == 'mission':
+                    response = runMissionJob(worker, request)
+                elif op == 'vsp':
+                    response = runVSPJob(worker, request)
+                elif op == 'reload':
+                    worker.indexes.clear()
+                    worker.analyzers.clear()
+                    response = {}
+                elif op == 'shutdown':
+                    response = {}
+                    self.server.stopping = True
+                else:
+                    raise ValueError(f"Unknown op: {op}")
+                response = {'ok': True, **response}
+            except Exception as e:
+                response = {'ok': False, 'error': str(e), 'traceback': traceback.format_exc()}
+            worker.jobs += 1
+            response['seconds'] = time.perf_counter() - t_start
+            self.wfile.write((json.dumps(response, default=_jsonDefault) + "\n").encode('utf-8'))
+            self.wfile.flush()
+            if self.server.stopping:
+                return
+
+
+def serve(socketPath: str = DEFAULT_SOCKET, csvPath: str = "data/aircraft.csv", idle_timeout: float = IDLE_SECONDS):
+    if os.path.exists(socketPath):
+        try:
+            request({'op': 'ping'}, socketPath)
+            print(f"A worker daemon is already listening on {socketPath}")
+            return
+        except OSError:
+            os.remove(socketPath)
+    worker = WorkerState(csvPath)
+    worker.preload()
+
+    os.makedirs(os.path.dirname(socketPath) or ".", exist_ok=True)
+    server = socketserver.UnixStreamServer(socketPath, _Handler)
+    server.worker = worker
+    server.stopping = False
+    server.idle_timeout = idle_timeout
+    print(f"Worker daemon {os.getpid()} listening on {socketPath}")
+    try:
+        while not server.stopping:
+            server.handle_request()
+    finally:
+        server.server_close()
+        os.remove(socketPath)
+        print("Worker daemon stopped")
+
+
+def request(payload: dict, socketPath: str = DEFAULT_SOCKET, timeout: float = None) -> dict:
+    """Sends one request and waits for its response"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socketPath)
+        sock.sendall((json.dumps(payload, default=_jsonDefault) + "\n").encode('utf-8'))
+        with sock.makefile('rb') as f:
+            return json.loads(f.readline())
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Warm worker daemon for mission / VSP jobs over a Unix socket.")
+    parser.add_argument("--socket", type=str, default=DEFAULT_SOCKET)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve", help="start the daemon")
+    serve_parser.add_argument("--csv", type=str, default="data/aircraft.csv", help="results store to preload")
+    serve_parser.add_argument("--idle_timeout", type=float, default=IDLE_SECONDS,
+                              help="seconds without a request before a connection is closed")
+    subparsers.add_parser("ping")
+    subparsers.add_parser("reload", help="drop the loaded aircraft rows and prepared analyzers")
+    subparsers.add_parser("shutdown")
+    send_parser = subparsers.add_parser("send", help="send a raw JSON request")
+    send_parser.add_argument("payload", type=str)
+    mission_parser = subparsers.add_parser("mission", help="run one mission combination")
+    mission_parser.add_argument("hash", type=str, help="aircraft hash including the quotes, e.g. \"'123'\"")
+    mission_parser.add_argument("--mission", type=int, choices=[2, 3], default=2)
+    mission_parser.add_argument("--MTOW", type=float, default=None, help="takeoff mass (kg), mission 2 only")
+    mission_parser.add_argument("--max_speed", type=float, required=True)
+    mission_parser.add_argument("--climb", type=float, default=0.9, help="climb thrust ratio")
+    mission_parser.add_argument("--level", type=float, default=0.5, help="level flight thrust ratio")
+    mission_parser.add_argument("--turn", type=float, default=0.5, help="turn thrust ratio")
+    mission_parser.add_argument("--csv", type=str, default="", help="results store of the hash (default: the preloaded one)")
+    args = parser.parse_args()
+    if args.command == "mission" and args.mission == 2 and args.MTOW is None:
+        mission_parser.error("--MTOW is required for --mission 2")
+
+    if args.command == "serve":
+        serve(args.socket, args.csv, args.idle_timeout)
+        sys.exit(0)
+    if args.command == "send":
+        payload = json.loads(args.payload)
+    elif args.command == "mission":
+        payload = {'op': 'mission', 'hash': args.hash, 'mission': args.mission, 'MTOW': args.MTOW,
+                   'max_speed': args.max_speed, 'climb_thrust_ratio': args.climb,
+                   'level_thrust_ratio': args.level, 'turn_thrust_ratio': args.turn, 'csvPath': args.csv}
+    else:
+        payload = {'op': args.command}
+    response = request(payload, args.socket)
+    response.pop('stats', None)
+    print(json.dumps(response, indent=1, default=_jsonDefault))
+    sys.exit(0 if response['ok'] else 1)